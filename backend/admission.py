@@ -0,0 +1,160 @@
+"""
+Priority admission control and load shedding.
+
+Requests are sorted into lanes by method and path. Each lane has its own
+concurrency limit, a bounded wait queue and a queue-time budget, so a surge
+of price reads can only fill the price lane while portfolio writes keep
+their reserved slots. A request that finds its lane's queue full, or that
+waits longer than the budget, is answered immediately with 503 and a
+Retry-After header instead of piling up behind the others.
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from typing import Dict, Optional, Sequence, Tuple
+
+from metrics import Counter, Gauge, Histogram, registry
+
+# (methods, paths, lane); first match wins, everything else goes to 'default'. Paths match exactly
+# unless they end in '*', which matches as a prefix. Price history reads Mongo and the archive, so it
+# stays out of the cheap prices lane.
+LANE_RULES = (
+    (('GET',), ('/api/prices', '/api/prices/stats'), 'prices'),
+    (('POST', 'PUT', 'PATCH', 'DELETE'), ('/api/portfolio*',), 'writes'),
+)
+# Probes and scrapes must answer even when the app is saturated
+EXEMPT_PATHS = ('/metrics', '/healthz', '/readyz')
+
+# lane=concurrency:queue:max wait seconds
+DEFAULT_LANES = 'prices=32:128:0.25,writes=8:32:2,default=16:64:1'
+
+
+class Lane:
+    """Concurrency limit with a bounded FIFO queue and a queue-time budget"""
+
+    def __init__(self, name: str, limit: int, queue_limit: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._waiters = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> Optional[str]:
+        """Take a slot; returns None when admitted, else the reason the request was shed"""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return None
+        if len(self._waiters) >= self.queue_limit:
+            return 'queue_full'
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed over just as we gave up; pass it on
+                self.release()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return 'timeout'
+        finally:
+            queue_wait.observe(time.perf_counter() - started, self.name)
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        return None
+
+    def release(self):
+        # Hand the slot straight to the oldest live waiter so in_flight stays constant
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+def parse_lanes(spec: str) -> Dict[str, Lane]:
+    lanes = {}
+    for entry in spec.split(','):
+        name, _, settings = entry.strip().partition('=')
+        limit, queue_limit, max_wait = settings.split(':')
+        lanes[name] = Lane(name, int(limit), int(queue_limit), float(max_wait))
+    lanes.setdefault('default', Lane('default', 16, 64, 1.0))
+    return lanes
+
+
+def classify(method: str, path: str, rules: Sequence[Tuple] = LANE_RULES) -> str:
+    for methods, paths, lane in rules:
+        if method in methods and any(_path_matches(path, pattern) for pattern in paths):
+            return lane
+    return 'default'
+
+
+def _path_matches(path: str, pattern: str) -> bool:
+    if pattern.endswith('*'):
+        return path.startswith(pattern[:-1])
+    return path == pattern
+
+
+admission_shed = registry.register(Counter(
+    'admission_shed_total', 'Requests rejected with 503 by admission control', ('lane', 'reason')))
+queue_wait = registry.register(Histogram(
+    'admission_queue_wait_seconds', 'Time queued requests waited for a slot', ('lane',)))
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying per-lane admission control"""
+
+    def __init__(self, app, lanes: Dict[str, Lane]):
+        self.app = app
+        self.lanes = lanes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        lane = self.lanes.get(classify(scope['method'], scope['path'])) or self.lanes['default']
+        reason = await lane.acquire()
+        if reason is not None:
+            admission_shed.inc(lane.name, reason)
+            await self._reject(send, lane)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release()
+
+    @staticmethod
+    async def _reject(send, lane: Lane):
+        body = json.dumps({'detail': 'Server is busy, please retry'}).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': 503,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'retry-after', str(max(1, math.ceil(lane.max_wait))).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+admission_lanes = parse_lanes(os.environ.get('ADMISSION_LANES', DEFAULT_LANES))
+registry.register(Gauge(
+    'admission_queue_depth', 'Requests waiting for a slot', ('lane',),
+    callback=lambda: {(name,): lane.queue_depth for name, lane in admission_lanes.items()}))
+registry.register(Gauge(
+    'admission_in_flight', 'Requests holding a slot', ('lane',),
+    callback=lambda: {(name,): lane.in_flight for name, lane in admission_lanes.items()}))
@@ -0,0 +1,118 @@
+"""
+Replay above/below price alerts against recorded price history.
+
+Rules on the same instrument are sorted by target price, so the rules
+crossed between two consecutive ticks form a contiguous index range found
+with ``searchsorted``. Counting triggers is then a handful of array
+operations per instrument, independent of the number of rules crossed;
+collecting the first trigger timestamps stops expanding a rule once it
+has ``maxTriggers`` of them.
+"""
+
+from typing import Dict, List, Mapping, Sequence
+
+import numpy as np
+
+from price_history import PriceSeries
+from price_normalizer import instrument_key
+
+DEFAULT_MAX_TRIGGERS = 100
+# Crossing transitions, and at most this many (rule, tick) pairs, expanded at once when collecting triggers
+TICK_CHUNK = 4096
+PAIR_BUDGET = 1 << 16
+
+
+def _crossing_ranges(prices: np.ndarray, targets: np.ndarray, condition: str):
+    """Per tick transition, the [lo, hi) range of sorted targets whose rule starts to hold"""
+    prev, curr = prices[:-1], prices[1:]
+    if condition == 'above':
+        # price >= target becomes true: prev < target <= curr
+        lo = np.searchsorted(targets, prev, side='right')
+        hi = np.searchsorted(targets, curr, side='right')
+    else:
+        # price <= target becomes true: curr <= target < prev
+        lo = np.searchsorted(targets, curr, side='left')
+        hi = np.searchsorted(targets, prev, side='left')
+    moved = hi > lo
+    return np.nonzero(moved)[0] + 1, lo[moved], hi[moved]
+
+
+def backtest_instrument(series: PriceSeries, targets: np.ndarray, condition: str, start_ms: int, max_triggers: int):
+    """Trigger counts (and first trigger timestamps) for rules of one instrument and condition.
+
+    ``targets`` must be sorted ascending. Returns ``(counts, triggers)`` where
+    ``triggers[i]`` lists epoch-ms timestamps for ``targets[i]``.
+    """
+    n_rules = len(targets)
+    ts = series.ts
+    ticks, lo, hi = _crossing_ranges(series.sell, targets, condition)
+
+    # Ticks before the requested range only establish the starting state
+    in_range = ts[ticks] >= start_ms
+    ticks, lo, hi = ticks[in_range], lo[in_range], hi[in_range]
+
+    counts = np.cumsum(np.bincount(lo, minlength=n_rules + 1) - np.bincount(hi, minlength=n_rules + 1))[:n_rules]
+
+    if max_triggers <= 0:
+        return counts, [[] for _ in range(n_rules)]
+    return counts, _first_triggers(ts[ticks], lo, hi, n_rules, max_triggers)
+
+
+def _first_triggers(fired_ts: np.ndarray, lo: np.ndarray, hi: np.ndarray, n_rules: int, max_triggers: int) -> List[List[int]]:
+    """First ``max_triggers`` timestamps per rule from chronological [lo, hi) crossing ranges.
+
+    Ranges are expanded into (rule, tick) pairs a chunk at a time and only
+    over the rules still short of ``max_triggers``, so dense rules over a
+    long history never materialize every crossing at once.
+    """
+    triggers: List[List[int]] = [[] for _ in range(n_rules)]
+    taken = np.zeros(n_rules, dtype=np.int64)
+    open_rules = np.arange(n_rules)
+    pos = 0
+    while pos < len(lo) and len(open_rules):
+        end = min(pos + TICK_CHUNK, len(lo))
+        # A contiguous range of sorted targets stays contiguous among the open rules
+        first = np.searchsorted(open_rules, lo[pos:end])
+        lengths = np.searchsorted(open_rules, hi[pos:end]) - first
+        stop = max(int(np.searchsorted(np.cumsum(lengths), PAIR_BUDGET, side='right')), 1)
+        first, lengths = first[:stop], lengths[:stop]
+
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        rules = open_rules[np.repeat(first, lengths) + offsets]
+        fired_at = np.repeat(fired_ts[pos:pos + stop], lengths)
+        order = np.argsort(rules, kind='stable')  # ticks stay chronological within a rule
+        rules, fired_at = rules[order], fired_at[order]
+        rank = taken[rules] + np.arange(len(rules)) - np.searchsorted(rules, rules, side='left')
+        keep = rank < max_triggers
+        for rule, stamp in zip(rules[keep].tolist(), fired_at[keep].tolist()):
+            triggers[rule].append(stamp)
+
+        taken += np.bincount(rules[keep], minlength=n_rules)
+        open_rules = open_rules[taken[open_rules] < max_triggers]
+        pos += stop
+    return triggers
+
+
+def run_backtest(rules: Sequence[Dict], series: Mapping[str, PriceSeries], start_ms: int, max_triggers: int = DEFAULT_MAX_TRIGGERS) -> List[Dict]:
+    """Backtest every rule, grouping them by instrument and condition"""
+    groups: Dict[tuple, List[int]] = {}
+    for i, rule in enumerate(rules):
+        groups.setdefault((instrument_key(rule['type'], rule['name']), rule['condition']), []).append(i)
+
+    results = [None] * len(rules)
+    for (key, condition), members in groups.items():
+        targets = np.fromiter((rules[i]['targetPrice'] for i in members), dtype=np.float64, count=len(members))
+        order = np.argsort(targets, kind='stable')
+        s = series.get(key)
+        if s is None or len(s.ts) < 2:
+            counts, triggers = np.zeros(len(members), dtype=np.int64), [[] for _ in members]
+        else:
+            counts, triggers = backtest_instrument(s, targets[order], condition, start_ms, max_triggers)
+        for sorted_pos, member_pos in enumerate(order.tolist()):
+            i = members[member_pos]
+            results[i] = {
+                **rules[i],
+                'count': int(counts[sorted_pos]),
+                'triggers': triggers[sorted_pos],
+            }
+    return results
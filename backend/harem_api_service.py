@@ -1,12 +1,34 @@
 import os
-import requests
-from typing import Dict, List
+import time
+from collections import deque
+from typing import Dict, List, Optional
 import logging
 
+from metrics import Gauge, price_format_duration, registry, snapshot_cache, upstream_errors
+from price_normalizer import normalize_harem_payload
+from price_sources import CachedSource, register
+from price_snapshot import PriceSnapshot
+from price_stats import price_stats
+from upstream import clock, fetch
+
 logger = logging.getLogger(__name__)
 
 RAPIDAPI_KEY = os.environ.get('RAPIDAPI_KEY', '')
 RAPIDAPI_HOST = "harem-altin-live-gold-price-data.p.rapidapi.com"
+# Overridable so benchmarks can point the service at a local stand-in
+RAPIDAPI_BASE_URL = os.environ.get('RAPIDAPI_BASE_URL', f"https://{RAPIDAPI_HOST}")
+EXCHANGERATE_API_URL = os.environ.get('EXCHANGERATE_API_URL', "https://api.exchangerate-api.com/v4/latest/USD")
+# Seconds Harem data is served from memory before hitting the upstream again
+SNAPSHOT_TTL = float(os.environ.get('PRICE_SNAPSHOT_TTL', '5'))
+# Seconds a failing Harem feed is covered by its last good data before falling back to static prices
+HAREM_MAX_STALE = float(os.environ.get('HAREM_MAX_STALE', '60'))
+# The exchangerate feed updates about once a day: refresh hourly, retry failures after 5 minutes
+# and keep serving the last rates for up to two days
+FX_RATES_TTL = float(os.environ.get('FX_RATES_TTL', '3600'))
+FX_RATES_RETRY = float(os.environ.get('FX_RATES_RETRY', '300'))
+FX_RATES_MAX_STALE = float(os.environ.get('FX_RATES_MAX_STALE', '172800'))
+# Previous snapshots kept for answering "what changed since version N"
+SNAPSHOT_RETENTION = int(os.environ.get('PRICE_SNAPSHOT_RETENTION', '720'))
 
 class HaremAPIService:
     def __init__(self):
@@ -14,165 +36,167 @@ class HaremAPIService:
             "x-rapidapi-key": RAPIDAPI_KEY,
             "x-rapidapi-host": RAPIDAPI_HOST
         }
-        self.base_url = f"https://{RAPIDAPI_HOST}"
+        self.base_url = RAPIDAPI_BASE_URL
+        # Harem moves every few seconds, the exchangerate feed about once a day
+        self.harem = register(CachedSource('harem', self._load_harem, ttl=SNAPSHOT_TTL,
+                                           max_stale=HAREM_MAX_STALE, retry_after=SNAPSHOT_TTL))
+        self.fx = register(CachedSource('exchangerate', self._load_fx_rates, ttl=FX_RATES_TTL,
+                                        max_stale=FX_RATES_MAX_STALE, retry_after=FX_RATES_RETRY, background=True))
+        self._snapshot: Optional[PriceSnapshot] = None
+        self._sources = None
+        self._version = 0
+        self._retained = deque(maxlen=SNAPSHOT_RETENTION)
     
     def get_all_prices(self) -> Dict:
+        """Get gold and currency prices, rebuilding the snapshot whenever one of the sources has refreshed"""
+        harem = self.harem.get()
+        fx_items = self.fx.get()
+        if harem is None:
+            return self._get_fallback_data()
+        if self._snapshot is not None and self._sources == (self.harem.version, self.fx.version):
+            snapshot_cache.inc('hit')
+            return self._snapshot.as_prices()
+        
+        snapshot_cache.inc('miss')
+        prices = self._merge_prices(harem, fx_items or [])
+        # The version lets callers tell whether two reads came from the same refresh
+        self._version += 1
+        snapshot = PriceSnapshot.from_prices(prices, self._version, time.time())
+        if self._snapshot is not None:
+            self._snapshot.release()
+            self._retained.append(self._snapshot)
+        self._snapshot = snapshot
+        self._sources = (self.harem.version, self.fx.version)
+        return snapshot.as_prices()
+    
+    def changes_since(self, version: int) -> Optional[Dict]:
+        """Rows that changed after snapshot ``version``, None when it is no longer retained"""
+        current = self._snapshot
+        if current is None:
+            return None
+        if version == current.version:
+            return current.changes_since(current)
+        for snapshot in self._retained:
+            if snapshot.version == version:
+                return current.changes_since(snapshot)
+        return None
+    
+    def retained_bytes(self) -> int:
+        """Memory held by the current and retained snapshots, excluding shared metadata"""
+        current = [self._snapshot] if self._snapshot is not None else []
+        return sum(snapshot.nbytes for snapshot in current + list(self._retained))
+    
+    def snapshot_age(self) -> Optional[float]:
+        """Seconds since the last successful Harem refresh, None while only fallback data is served"""
+        return self.harem.age()
+    
+    def snapshot_state(self) -> str:
+        """``live``, ``stale`` once Harem data outlived a refresh and its retry, ``fallback`` when none is held"""
+        age = self.harem.age()
+        if age is None:
+            return "fallback"
+        return "live" if age <= self.harem.ttl + self.harem.retry_after else "stale"
+    
+    def _merge_prices(self, harem: Dict, fx_items: List[Dict]) -> Dict:
+        """Combine the latest Harem rows with the exchangerate currencies"""
+        gold_items = [dict(item) for item in harem['gold'][:10]]  # Return top 10
+        currency_items = [dict(item) for item in (harem['currency'] + fx_items)[:11]]  # Return top 11
+        for items in (gold_items, currency_items):
+            for idx, item in enumerate(items, 1):
+                item['id'] = idx
+        
+        return {
+            'gold': gold_items,
+            'currency': currency_items
+        }
+    
+    def _load_harem(self) -> Optional[Dict]:
         """Fetch all gold and currency prices from Harem Altın API"""
         try:
             url = f"{self.base_url}/harem_altin/prices"
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = fetch('harem', url, headers=self.headers, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
                 if data.get('success'):
                     return self._format_prices(data.get('data', []))
                 else:
-                    logger.error(f"Harem API error: {data.get('message')}")
-                    return self._get_fallback_data()
+                    upstream_errors.inc('harem', 'api_error')
+                    logger.error("Harem API error: %s", data.get('message'), extra={'source': 'harem'})
+                    return None
             else:
-                logger.error(f"Harem API HTTP error: {response.status_code}")
-                return self._get_fallback_data()
+                logger.error("Harem API HTTP error: %s", response.status_code, extra={'source': 'harem'})
+                return None
         except Exception as e:
-            logger.error(f"Error fetching Harem prices: {str(e)}")
-            return self._get_fallback_data()
-    
-    def _parse_turkish_number(self, value: str, is_percent: bool = False) -> float:
-        """Parse Turkish formatted numbers (5.777,76 -> 5777.76)"""
-        try:
-            if not value or value == '':
-                return 0.0
-            
-            # For percentages, API uses dot as decimal separator
-            if is_percent:
-                # Percent values like "34.72" or "0.50" - already in correct format
-                return float(value)
-            
-            # For prices: Turkish format with dot as thousands separator and comma as decimal
-            # Example: "5.777,76" -> 5777.76
-            cleaned = value.replace('.', '').replace(',', '.')
-            return float(cleaned)
-        except:
-            return 0.0
+            logger.error("Error fetching Harem prices: %s", e, extra={'source': 'harem'})
+            return None
     
     def _format_prices(self, raw_data: List[Dict]) -> Dict:
         """Format Harem API data into gold and currency categories"""
-        gold_items = []
-        currency_items = []
+        with price_format_duration.time('harem'):
+            normalized = normalize_harem_payload(raw_data)
+        if normalized.errors:
+            logger.warning("Harem API returned %d malformed values: %s", len(normalized.errors), normalized.errors, extra={'source': 'harem'})
         
-        # Gold price mappings
-        gold_mapping = {
-            'Has Altın': ('HAS ALTIN', 'PURE GOLD'),
-            'ONS': ('ONS', 'OUNCE'),
-            'GRAM ALTIN': ('GRAM ALTIN', 'GRAM GOLD'),
-            '22 AYAR': ('22 AYAR', '22 CARAT'),
-            '14 AYAR': ('14 AYAR', '14 CARAT'),
-            'ALTIN GÜMÜŞ': ('ALTIN GÜMÜŞ', 'GOLD SILVER'),
-            'YENİ ÇEYREK': ('ÇEYREK ALTIN', 'QUARTER GOLD'),
-            'YENİ YARIM': ('YARIM ALTIN', 'HALF GOLD'),
-            'YENİ TAM': ('TAM ALTIN', 'FULL GOLD'),
-            'YENİ ATA': ('ATA ALTIN', 'ATA GOLD'),
-            'ESKİ ÇEYREK': ('ESKİ ÇEYREK', 'OLD QUARTER'),
-            'ESKİ YARIM': ('ESKİ YARIM', 'OLD HALF'),
-            'ESKİ TAM': ('ESKİ TAM', 'OLD FULL'),
-            'ESKİ ATA': ('ESKİ ATA', 'OLD ATA')
-        }
+        # Harem reports its own daily change; only feed the statistics
+        now = clock()
+        for category, items in (('gold', normalized.gold), ('currency', normalized.currency)):
+            for item in items:
+                price_stats.observe(category, item['name'], item['sell'], now)
         
-        # Currency mappings
-        currency_mapping = {
-            'USD/KG': ('USD/KG', 'USD/KG', '$'),
-            'EUR/KG': ('EUR/KG', 'EUR/KG', '€')
+        return {
+            'gold': normalized.gold,
+            'currency': normalized.currency
         }
+    
+    def _load_fx_rates(self) -> Optional[List[Dict]]:
+        """Major currencies in TRY from the free exchangerate API"""
+        currency_response = fetch('exchangerate', EXCHANGERATE_API_URL, timeout=5)
+        if currency_response.status_code != 200:
+            return None
+        rates = currency_response.json().get('rates', {})
+        try_rate = rates.get('TRY', 42.0)
         
-        gold_counter = 1
-        currency_counter = 1
+        fx_items = []
+        currencies = [
+            ('USD', 'USD', '$', 1.0),
+            ('EUR', 'EUR', '€', rates.get('EUR', 0.92)),
+            ('GBP', 'GBP', '£', rates.get('GBP', 0.79)),
+            ('CHF', 'CHF', 'Fr', rates.get('CHF', 0.88)),
+            ('AUD', 'AUD', '$', rates.get('AUD', 1.54)),
+            ('CAD', 'CAD', '$', rates.get('CAD', 1.41)),
+            ('SAR', 'SAR', 'ر.س', rates.get('SAR', 3.75)),
+            ('JPY', 'JPY', '¥', rates.get('JPY', 151.0)),
+            ('KWD', 'KWD', 'KD', rates.get('KWD', 0.31))
+        ]
         
-        for item in raw_data:
-            key = item.get('key', '')
-            buy = self._parse_turkish_number(item.get('buy', '0'), is_percent=False)
-            sell = self._parse_turkish_number(item.get('sell', '0'), is_percent=False)
-            percent = self._parse_turkish_number(item.get('percent', '0'), is_percent=True)
-            
-            # Check if it's a gold item
-            if key in gold_mapping:
-                name_tr, name_en = gold_mapping[key]
-                gold_items.append({
-                    'id': gold_counter,
-                    'name': name_tr,
-                    'nameEn': name_en,
-                    'buy': buy,
-                    'sell': sell,
-                    'change': percent,
-                    'unit': 'TRY'
-                })
-                gold_counter += 1
+        for code, name, symbol, usd_rate in currencies:
+            if code == 'USD':
+                try_buy = try_rate * 0.995
+                try_sell = try_rate * 1.005
+            else:
+                usd_per_currency = 1 / usd_rate if usd_rate > 0 else 1
+                try_buy = (usd_per_currency * try_rate) * 0.995
+                try_sell = (usd_per_currency * try_rate) * 1.005
             
-            # Check if it's a currency item
-            elif key in currency_mapping:
-                name_tr, name_en, symbol = currency_mapping[key]
-                currency_items.append({
-                    'id': currency_counter,
-                    'name': name_tr,
-                    'nameEn': name_en,
-                    'buy': buy,
-                    'sell': sell,
-                    'change': percent,
-                    'symbol': symbol,
-                    'unit': 'TRY'
-                })
-                currency_counter += 1
-        
-        # Add major currencies from free API
-        try:
-            currency_response = requests.get("https://api.exchangerate-api.com/v4/latest/USD", timeout=5)
-            if currency_response.status_code == 200:
-                rates = currency_response.json().get('rates', {})
-                try_rate = rates.get('TRY', 42.0)
-                
-                currencies = [
-                    ('USD', 'USD', '$', 1.0),
-                    ('EUR', 'EUR', '€', rates.get('EUR', 0.92)),
-                    ('GBP', 'GBP', '£', rates.get('GBP', 0.79)),
-                    ('CHF', 'CHF', 'Fr', rates.get('CHF', 0.88)),
-                    ('AUD', 'AUD', '$', rates.get('AUD', 1.54)),
-                    ('CAD', 'CAD', '$', rates.get('CAD', 1.41)),
-                    ('SAR', 'SAR', 'ر.س', rates.get('SAR', 3.75)),
-                    ('JPY', 'JPY', '¥', rates.get('JPY', 151.0)),
-                    ('KWD', 'KWD', 'KD', rates.get('KWD', 0.31))
-                ]
-                
-                for code, name, symbol, usd_rate in currencies:
-                    if code == 'USD':
-                        try_buy = try_rate * 0.995
-                        try_sell = try_rate * 1.005
-                    else:
-                        usd_per_currency = 1 / usd_rate if usd_rate > 0 else 1
-                        try_buy = (usd_per_currency * try_rate) * 0.995
-                        try_sell = (usd_per_currency * try_rate) * 1.005
-                    
-                    change = round((try_rate - 42.0) / 42.0 * 100, 2)
-                    
-                    currency_items.append({
-                        'id': currency_counter,
-                        'name': code,
-                        'nameEn': code,
-                        'buy': round(try_buy, 2),
-                        'sell': round(try_sell, 2),
-                        'change': change,
-                        'symbol': symbol,
-                        'unit': 'TRY'
-                    })
-                    currency_counter += 1
-        except:
-            pass
+            fx_items.append({
+                'name': code,
+                'nameEn': code,
+                'buy': round(try_buy, 2),
+                'sell': round(try_sell, 2),
+                'change': 0.0,
+                'symbol': symbol,
+                'unit': 'TRY'
+            })
         
-        return {
-            'gold': gold_items[:10],  # Return top 10
-            'currency': currency_items[:11]  # Return top 11
-        }
+        # Derived rates carry no daily change, compute it from the day open
+        price_stats.apply_day_change('currency', fx_items, clock())
+        return fx_items
     
     def _get_fallback_data(self) -> Dict:
         """Fallback data if API fails"""
         return {
+            'fallback': True,
             'gold': [
                 {'id': 1, 'name': 'HAS ALTIN', 'nameEn': 'PURE GOLD', 'buy': 5807.50, 'sell': 5858.70, 'change': 0.74, 'unit': 'TRY'},
                 {'id': 2, 'name': 'ONS', 'nameEn': 'OUNCE', 'buy': 4239.5, 'sell': 4239.9, 'change': 0.53, 'unit': 'TRY'},
@@ -201,3 +225,12 @@ class HaremAPIService:
         }
 
 harem_api_service = HaremAPIService()
+
+registry.register(Gauge(
+    'price_snapshot_age_seconds', 'Seconds since the served price snapshot was refreshed',
+    callback=lambda: {} if harem_api_service.snapshot_age() is None else {(): harem_api_service.snapshot_age()}
+))
+registry.register(Gauge(
+    'price_snapshot_retained_bytes', 'Memory held by the current and retained price snapshots',
+    callback=lambda: {(): harem_api_service.retained_bytes()}
+))
@@ -0,0 +1,205 @@
+"""
+Per-instrument exposure totals across all portfolios.
+
+    python backend/house_exposure.py            # reconcile the totals with a full scan
+"""
+
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from metrics import mongo_operation_duration
+from price_normalizer import instrument_key
+
+logger = logging.getLogger(__name__)
+
+# Differences below this are float noise from summing $inc deltas, not drift
+TOLERANCE = 1e-6
+
+
+class HouseExposure:
+    """Per-instrument totals across all portfolios, kept current with $inc by the portfolio handlers.
+
+    ``totals`` holds one document per instrument (``_id`` is the instrument
+    key) with quantity, cost basis, lot and holder counts. ``holders`` counts
+    the lots each user has per instrument, so the holder count only moves
+    when a user's first lot is added or their last one removed. Every write
+    to either collection also increments the document's ``writes`` counter,
+    which lets the reconciliation tell whether a document moved under it.
+    """
+
+    def __init__(self, totals=None, holders=None):
+        self.totals = totals
+        self.holders = holders
+
+    async def record_create(self, item: Dict):
+        await self._apply(item, 1)
+
+    async def record_delete(self, item: Dict):
+        await self._apply(item, -1)
+
+    async def record_update(self, before: Dict, after: Dict):
+        key = instrument_key(before["type"], before["name"])
+        with mongo_operation_duration.time("house_exposure", "update_one"):
+            await self.totals.update_one(
+                {"_id": key},
+                {
+                    "$inc": {
+                        "quantity": after["quantity"] - before["quantity"],
+                        "costBasis": after["quantity"] * after["buyPrice"] - before["quantity"] * before["buyPrice"],
+                        "writes": 1,
+                    },
+                    "$set": {"updatedAt": datetime.utcnow()},
+                    "$setOnInsert": {"type": before["type"], "name": before["name"]},
+                },
+                upsert=True
+            )
+
+    async def _apply(self, item: Dict, sign: int):
+        key = instrument_key(item["type"], item["name"])
+        holder_id = f"{key}|{item['userId']}"
+        with mongo_operation_duration.time("house_exposure", "find_one_and_update"):
+            holder = await self.holders.find_one_and_update(
+                {"_id": holder_id}, {"$inc": {"lots": sign, "writes": 1}}, upsert=True, return_document=True
+            )
+        lots = holder["lots"]
+        holders = 1 if sign > 0 and lots == 1 else -1 if sign < 0 and lots == 0 else 0
+        if lots <= 0:
+            await self.holders.delete_one({"_id": holder_id, "lots": lots})
+
+        with mongo_operation_duration.time("house_exposure", "update_one"):
+            await self.totals.update_one(
+                {"_id": key},
+                {
+                    "$inc": {
+                        "quantity": sign * item["quantity"],
+                        "costBasis": sign * item["quantity"] * item["buyPrice"],
+                        "lots": sign,
+                        "holders": holders,
+                        "writes": 1,
+                    },
+                    "$set": {"updatedAt": datetime.utcnow()},
+                    "$setOnInsert": {"type": item["type"], "name": item["name"]},
+                },
+                upsert=True
+            )
+
+    async def exposure(self) -> List[Dict]:
+        """Current totals, one document per instrument that ever had a position"""
+        with mongo_operation_duration.time("house_exposure", "find"):
+            docs = await self.totals.find({}).sort("_id").to_list(None)
+        return [
+            {
+                "type": doc["type"],
+                "name": doc["name"],
+                "quantity": doc.get("quantity", 0.0),
+                "costBasis": doc.get("costBasis", 0.0),
+                "lots": doc.get("lots", 0),
+                "holders": doc.get("holders", 0),
+                "updatedAt": doc.get("updatedAt"),
+            }
+            for doc in docs
+        ]
+
+    async def reconcile(self, portfolio) -> Dict[str, Dict]:
+        """Correct the totals from a full scan of ``portfolio``, returning the drift per instrument.
+
+        Corrects accumulated float error and updates lost to failed writes.
+        Corrections are $inc deltas applied only to documents not written
+        since they were read before the scan, so concurrent portfolio writes
+        are never overwritten; instruments that moved meanwhile are left for
+        the next run. A write whose exposure update is still in flight when
+        the scan reads it shows up as drift and is undone on the next run.
+        """
+        stored = {doc["_id"]: doc for doc in await self.totals.find({}).to_list(None)}
+        stored_holders = {doc["_id"]: doc for doc in await self.holders.find({}).to_list(None)}
+
+        scanned = defaultdict(lambda: {"quantity": 0.0, "costBasis": 0.0, "lots": 0, "users": defaultdict(int)})
+        meta = {}
+        projection = {"type": 1, "name": 1, "userId": 1, "quantity": 1, "buyPrice": 1}
+        with mongo_operation_duration.time("portfolio", "find"):
+            async for item in portfolio.find({}, projection):
+                key = instrument_key(item["type"], item["name"])
+                meta[key] = (item["type"], item["name"])
+                totals = scanned[key]
+                totals["quantity"] += item["quantity"]
+                totals["costBasis"] += item["quantity"] * item["buyPrice"]
+                totals["lots"] += 1
+                totals["users"][item["userId"]] += 1
+
+        drift = {}
+        skipped = []
+        for key in scanned.keys() | stored.keys():
+            actual = scanned.get(key) or {"quantity": 0.0, "costBasis": 0.0, "lots": 0, "users": {}}
+            current = stored.get(key, {})
+            fields = {
+                "quantity": actual["quantity"],
+                "costBasis": actual["costBasis"],
+                "lots": actual["lots"],
+                "holders": len(actual["users"]),
+            }
+            changed = {
+                field: value - current.get(field, 0)
+                for field, value in fields.items()
+                if abs(value - current.get(field, 0)) > TOLERANCE
+            }
+            if not changed:
+                continue
+            type, name = meta.get(key) or (current["type"], current["name"])
+            if await self._correct(self.totals, key, stored.get(key), changed, {"type": type, "name": name}):
+                drift[key] = changed
+            else:
+                skipped.append(key)
+
+        # Holder lot counts are corrected from the same scan
+        lots = {f"{key}|{user}": count for key, totals in scanned.items() for user, count in totals["users"].items()}
+        for holder_id, doc in stored_holders.items():
+            if holder_id not in lots:
+                await self.holders.delete_one({"_id": holder_id, "writes": doc.get("writes")})
+        for holder_id, count in lots.items():
+            doc = stored_holders.get(holder_id)
+            if doc is None or doc["lots"] != count:
+                await self._correct(self.holders, holder_id, doc, {"lots": count - (doc["lots"] if doc else 0)}, {})
+
+        if drift:
+            logger.warning("House exposure drifted for %d instruments: %s", len(drift), drift)
+        if skipped:
+            logger.info("House exposure of %s changed during reconciliation, left for the next run", skipped)
+        return drift
+
+    @staticmethod
+    async def _correct(collection, key: str, before: Optional[Dict], delta: Dict, insert: Dict) -> bool:
+        """$inc ``delta`` into ``key`` unless it was written after ``before`` was read"""
+        writes = before.get("writes") if before is not None else 0
+        if before is None:
+            # Create the document empty, so a handler upserting the same key concurrently cannot collide with us
+            await collection.update_one({"_id": key}, {"$setOnInsert": {**insert, "writes": 0}}, upsert=True)
+        with mongo_operation_duration.time(collection.name, "update_one"):
+            result = await collection.update_one(
+                {"_id": key, "writes": writes},
+                {"$inc": {**delta, "writes": 1}, "$set": {"updatedAt": datetime.utcnow()}},
+            )
+        return result.matched_count > 0
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        db = client[os.environ['DB_NAME']]
+        try:
+            drift = await HouseExposure(db.house_exposure, db.house_exposure_holders).reconcile(db.portfolio)
+            logger.info("Reconciled house exposure, %d instruments corrected", len(drift))
+        finally:
+            client.close()
+
+    asyncio.run(main())
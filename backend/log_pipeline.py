@@ -0,0 +1,183 @@
+"""
+Non-blocking structured logging.
+
+Records are filtered, stamped with the current request id and have their
+message arguments interpolated on the calling thread, then handed to a
+queue; the JSON/text layout, traceback rendering and the stderr write
+happen on a background listener thread. Once the listener is stopped,
+records are written directly on the calling thread. Identical messages
+(same logger, level, source and template) are rate limited: after a burst,
+repeats within the window are dropped and counted, and the next one let
+through reports how many were suppressed.
+
+    LOG_FORMAT=json|text   LOG_LEVEL=INFO   LOG_RATE_LIMIT=5/60 (burst/seconds)
+"""
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('request_id', default=None)
+
+REQUEST_ID_HEADER = b'x-request-id'
+
+
+class ContextFilter(logging.Filter):
+    """Stamps records with the request id of the task that logged them"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        if not hasattr(record, 'source'):
+            record.source = None
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets ``burst`` identical records through per ``window`` seconds and counts the rest"""
+
+    def __init__(self, burst: int = 5, window: float = 60.0):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        # key -> [window start, records seen in window, suppressed since last emitted]
+        self._seen: Dict[Tuple, list] = {}
+        # Records also come from worker threads (background source refreshes)
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, getattr(record, 'source', None), str(record.msg))
+        with self._lock:
+            return self._admit(key, record)
+
+    def _admit(self, key: Tuple, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        state = self._seen.get(key)
+        if state is None or now - state[0] >= self.window:
+            suppressed = state[2] if state else 0
+            self._seen[key] = [now, 1, 0]
+            if len(self._seen) > 10_000:
+                self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.window}
+            record.suppressed = suppressed
+            return True
+        state[1] += 1
+        if state[1] <= self.burst:
+            record.suppressed = 0
+            return True
+        state[2] += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for attr, field in (('request_id', 'requestId'), ('source', 'source'), ('suppressed', 'suppressed')):
+            value = getattr(record, attr, None)
+            if value:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        if getattr(record, 'suppressed', 0):
+            line += f' (suppressed {record.suppressed} repeats)'
+        return line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # %-interpolate here, while mutable arguments still hold the logged values;
+        # the layout and the write are left to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(level: str = 'INFO', fmt: str = 'json', rate_limit: str = '5/60', stream=None):
+    """Route the root logger through a queue to a stderr (or ``stream``) handler on a background thread"""
+    global _listener
+    stop_logging()
+
+    burst, window = rate_limit.split('/')
+    records = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(RateLimitFilter(int(burst), float(window)))
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records, stop the listener thread and write later records directly"""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+
+    # Records logged after shutdown (e.g. by other lifespan cleanup) would otherwise sit in a queue nobody reads
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, _QueueHandler) and handler.queue is listener.queue:
+            root.removeHandler(handler)
+            for output in listener.handlers:
+                for log_filter in handler.filters:
+                    output.addFilter(log_filter)
+                root.addHandler(output)
+
+
+class RequestIdMiddleware:
+    """ASGI middleware binding X-Request-ID (or a generated id) to the request's log records"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request_id = dict(scope['headers']).get(REQUEST_ID_HEADER)
+        request_id = request_id.decode('latin-1')[:64] if request_id else uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', [])) + [(REQUEST_ID_HEADER, request_id.encode('latin-1'))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
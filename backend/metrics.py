@@ -0,0 +1,222 @@
+"""
+Minimal Prometheus-style metrics.
+
+Most updates happen on the event loop thread, but upstream fetches also
+run on worker threads (background source refreshes, the startup warmup),
+so every metric guards its slots with its own lock; uncontended, that costs
+well under a microsecond. Histogram buckets are allocated once per label set.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Request/IO latencies in seconds, from sub-millisecond cache hits to upstream timeouts
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            slot = self._values.get(labels)
+            if slot is None:
+                slot = self._values[labels] = [0]
+            slot[0] += amount
+
+    def value(self, *labels) -> float:
+        slot = self._values.get(labels)
+        return slot[0] if slot else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(labels, slot[0]) for labels, slot in self._values.items()]
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labels, value in values:
+            lines.append(f'{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}')
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is either set directly or computed by a callback at scrape time"""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), callback: Callable[[], Dict[Tuple, float]] = None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.callback = callback
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) - amount
+
+    def render(self) -> List[str]:
+        if self.callback:
+            values = self.callback()
+        else:
+            with self._lock:
+                values = dict(self._values)
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        for labels, value in values.items():
+            lines.append(f'{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}')
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: 'Histogram', labels: Tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            slot = self._values.get(labels)
+            if slot is None:
+                slot = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            slot[bucket] += 1
+            slot[-1] += value
+
+    def time(self, *labels) -> _Timer:
+        """Context manager observing the elapsed wall time of its block"""
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        bounds = self.buckets + (float('inf'),)
+        with self._lock:
+            values = [(labels, list(slot)) for labels, slot in self._values.items()]
+        for labels, slot in values:
+            cumulative = 0
+            for bound, count in zip(bounds, slot):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(slot[-1])}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, labels)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def _hit_ratio(hits: float, misses: float) -> Dict[Tuple, float]:
+    total = hits + misses
+    return {(): hits / total} if total else {}
+
+
+http_request_duration = registry.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route template', ('method', 'route', 'status')))
+upstream_request_duration = registry.register(Histogram(
+    'upstream_request_duration_seconds', 'Upstream price API call latency', ('source',)))
+upstream_errors = registry.register(Counter(
+    'upstream_errors_total', 'Failed upstream price API calls', ('source', 'reason')))
+price_format_duration = registry.register(Histogram(
+    'price_format_duration_seconds', 'Time spent normalizing upstream payloads into price rows', ('source',)))
+snapshot_cache = registry.register(Counter(
+    'price_snapshot_requests_total', 'Price snapshot reads served from cache or by refreshing', ('result',)))
+registry.register(Gauge(
+    'price_snapshot_cache_hit_ratio', 'Share of price snapshot reads served from cache',
+    callback=lambda: _hit_ratio(snapshot_cache.value('hit'), snapshot_cache.value('miss'))))
+mongo_operation_duration = registry.register(Histogram(
+    'mongo_operation_duration_seconds', 'MongoDB operation latency', ('collection', 'operation')))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get('route')
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                scope['method'],
+                route.path if route is not None else 'unmatched',
+                str(status[0]),
+            )
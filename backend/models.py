@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Literal
+from typing import List, Optional, Literal
 from datetime import datetime
 import uuid
 
@@ -23,4 +23,17 @@ class PortfolioItem(BaseModel):
 
 class PortfolioItemUpdate(BaseModel):
     quantity: Optional[float] = None
-    buyPrice: Optional[float] = None
\ No newline at end of file
+    buyPrice: Optional[float] = None
+
+class AlertRule(BaseModel):
+    id: Optional[str] = None
+    type: Literal['gold', 'currency']
+    name: str
+    condition: Literal['above', 'below']
+    targetPrice: float
+
+class AlertBacktestRequest(BaseModel):
+    rules: List[AlertRule] = Field(..., min_length=1, max_length=10000)
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    maxTriggers: int = Field(100, ge=0, le=1000)
\ No newline at end of file
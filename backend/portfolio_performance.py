@@ -0,0 +1,108 @@
+from typing import Dict, List, Mapping
+
+import numpy as np
+
+from price_history import PriceSeries, to_epoch_ms
+from price_normalizer import instrument_key
+
+# Supported resolutions, in milliseconds
+RESOLUTIONS = {
+    '5m': 5 * 60 * 1000,
+    '15m': 15 * 60 * 1000,
+    '1h': 60 * 60 * 1000,
+    '4h': 4 * 60 * 60 * 1000,
+    '1d': 24 * 60 * 60 * 1000,
+}
+MAX_POINTS = 20000
+
+
+def price_matrix(keys: List[str], series: Mapping[str, PriceSeries], grid: np.ndarray) -> np.ndarray:
+    """Last known sell price of each instrument at every grid point (NaN before the first tick)"""
+    prices = np.full((len(keys), len(grid)), np.nan)
+    for row, key in enumerate(keys):
+        s = series.get(key)
+        if s is None or len(s.ts) == 0:
+            continue
+        pos = np.searchsorted(s.ts, grid, side='right') - 1
+        known = pos >= 0
+        prices[row, known] = s.sell[pos[known]]
+    return prices
+
+
+def compute_performance(holdings: List[Dict], series: Mapping[str, PriceSeries], start_ms: int, end_ms: int, step_ms: int) -> Dict:
+    """Portfolio value, cost and profit curves over a regular time grid.
+
+    Holdings are folded into per-instrument cumulative quantity and cost
+    matrices (instruments x timestamps), so the work scales with the number
+    of instruments rather than holdings x timestamps. A holding counts from
+    its ``createdAt`` onwards and is valued at its buy price until the first
+    recorded tick of its instrument, matching the frontend's fallback.
+    """
+    grid = np.arange(start_ms, end_ms + 1, step_ms, dtype=np.int64)
+    n_points = len(grid)
+
+    keys = sorted({instrument_key(h['type'], h['name']) for h in holdings})
+    key_index = {key: i for i, key in enumerate(keys)}
+
+    rows = np.fromiter((key_index[instrument_key(h['type'], h['name'])] for h in holdings), dtype=np.intp, count=len(holdings))
+    quantity = np.fromiter((h['quantity'] for h in holdings), dtype=np.float64, count=len(holdings))
+    cost = quantity * np.fromiter((h['buyPrice'] for h in holdings), dtype=np.float64, count=len(holdings))
+    entry = np.searchsorted(grid, to_epoch_ms([h['createdAt'] for h in holdings]), side='left')
+
+    # Deltas land on the entry column; the extra column absorbs holdings opened after `end`
+    held = np.zeros((len(keys), n_points + 1))
+    invested = np.zeros((len(keys), n_points + 1))
+    np.add.at(held, (rows, entry), quantity)
+    np.add.at(invested, (rows, entry), cost)
+    held = np.cumsum(held[:, :n_points], axis=1)
+    invested = np.cumsum(invested[:, :n_points], axis=1)
+
+    prices = price_matrix(keys, series, grid)
+    value = np.where(np.isnan(prices), invested, prices * held).sum(axis=0)
+    total_cost = invested.sum(axis=0)
+    profit = value - total_cost
+    with np.errstate(divide='ignore', invalid='ignore'):
+        profit_pct = np.where(total_cost > 0, profit / total_cost * 100, 0.0)
+
+    return {
+        'timestamps': grid.tolist(),
+        'value': np.round(value, 2).tolist(),
+        'cost': np.round(total_cost, 2).tolist(),
+        'profit': np.round(profit, 2).tolist(),
+        'profitPercentage': np.round(profit_pct, 2).tolist(),
+    }
+
+
+def value_holdings(holdings: List[Dict], prices: Dict) -> Dict:
+    """Current value and profit of each holding at the snapshot's sell prices.
+
+    Holdings whose instrument is missing from the snapshot are valued at
+    their buy price, as the portfolio page does.
+    """
+    sell = {
+        instrument_key(category, row['name']): row['sell']
+        for category in ('gold', 'currency')
+        for row in prices.get(category, [])
+    }
+    items = []
+    total_value = total_cost = 0.0
+    for holding in holdings:
+        current = sell.get(instrument_key(holding['type'], holding['name']), holding['buyPrice'])
+        value = current * holding['quantity']
+        cost = holding['buyPrice'] * holding['quantity']
+        items.append({
+            'id': holding['id'],
+            'currentPrice': current,
+            'value': round(value, 2),
+            'profit': round(value - cost, 2),
+            'profitPercentage': round((current - holding['buyPrice']) / holding['buyPrice'] * 100, 2) if holding['buyPrice'] else 0.0,
+        })
+        total_value += value
+        total_cost += cost
+    return {
+        'items': items,
+        'totalValue': round(total_value, 2),
+        'totalCost': round(total_cost, 2),
+        'totalProfit': round(total_value - total_cost, 2),
+        'totalPercentage': round((total_value - total_cost) / total_cost * 100, 2) if total_cost else 0.0,
+    }
@@ -0,0 +1,185 @@
+"""
+Historical-simulation risk analytics for portfolios.
+
+A ``RiskModel`` builds the instrument price and return matrices for a
+lookback window once; every portfolio is then a row of a quantity matrix
+and all of them are evaluated together with a few matrix products.
+
+Run the batch job over every user with: python portfolio_risk.py
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Sequence
+
+import numpy as np
+
+from portfolio_performance import RESOLUTIONS, price_matrix
+from price_history import PriceSeries
+from price_normalizer import instrument_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOOKBACK_DAYS = 365
+DEFAULT_CONFIDENCE = (0.95, 0.99)
+CHUNK_SIZE = 10000
+
+
+def _fill_gaps(prices: np.ndarray) -> np.ndarray:
+    """Forward-fill NaNs along time and back-fill the leading gap with the first known price"""
+    rows = np.arange(prices.shape[0])[:, None]
+    known = ~np.isnan(prices)
+    idx = np.where(known, np.arange(prices.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    filled = prices[rows, idx]
+    first_known = prices[rows[:, 0], known.argmax(axis=1)] if prices.shape[1] else np.zeros(prices.shape[0])
+    filled = np.where(np.isnan(filled), first_known[:, None], filled)
+    return np.nan_to_num(filled, nan=0.0)
+
+
+class RiskModel:
+    """Price and return matrices (instruments x days) shared by every portfolio evaluation"""
+
+    def __init__(self, keys: Sequence[str], prices: np.ndarray):
+        self.keys = list(keys)
+        self.key_index = {key: i for i, key in enumerate(self.keys)}
+        self.prices = _fill_gaps(prices)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = self.prices[:, 1:] / self.prices[:, :-1] - 1.0
+        self.returns = np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+        self.last = self.prices[:, -1] if self.prices.shape[1] else np.zeros(len(self.keys))
+
+    @classmethod
+    def from_series(cls, keys: Sequence[str], series: Mapping[str, PriceSeries], end_ms: int, days: int = DEFAULT_LOOKBACK_DAYS) -> 'RiskModel':
+        step = RESOLUTIONS['1d']
+        grid = np.arange(end_ms - days * step, end_ms + 1, step, dtype=np.int64)
+        return cls(keys, price_matrix(list(keys), series, grid))
+
+    def quantity_matrix(self, holdings_by_portfolio: Sequence[Iterable[Dict]]) -> np.ndarray:
+        """Portfolios x instruments quantity matrix; instruments without history are ignored"""
+        rows, cols, quantity = [], [], []
+        for row, holdings in enumerate(holdings_by_portfolio):
+            for h in holdings:
+                col = self.key_index.get(instrument_key(h['type'], h['name']))
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+                    quantity.append(h['quantity'])
+        matrix = np.zeros((len(holdings_by_portfolio), len(self.keys)))
+        np.add.at(matrix, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)), np.array(quantity, dtype=np.float64))
+        return matrix
+
+    def evaluate(self, quantities: np.ndarray, confidence: Sequence[float] = DEFAULT_CONFIDENCE, chunk_size: int = CHUNK_SIZE) -> Dict[str, np.ndarray]:
+        """Value, historical VaR, P&L volatility and max drawdown for every portfolio row.
+
+        VaR and volatility apply each historical day's returns to today's
+        positions (in TRY); drawdown follows today's quantities through the
+        lookback price path (as a fraction of the running peak).
+        """
+        n = quantities.shape[0]
+        result = {'value': np.empty(n), 'volatility': np.empty(n), 'maxDrawdown': np.empty(n)}
+        for level in confidence:
+            result[_var_key(level)] = np.empty(n)
+
+        for lo in range(0, n, chunk_size):
+            q = quantities[lo:lo + chunk_size]
+            positions = q * self.last
+            pnl = positions @ self.returns  # portfolios x days
+            result['value'][lo:lo + len(q)] = positions.sum(axis=1)
+
+            if pnl.shape[1]:
+                result['volatility'][lo:lo + len(q)] = pnl.std(axis=1)
+                # Historical VaR is the k-th worst day; a partial sort is enough
+                ranks = [min(int((1.0 - level) * pnl.shape[1]), pnl.shape[1] - 1) for level in confidence]
+                worst = np.partition(pnl, sorted(set(ranks)), axis=1)
+                for level, rank in zip(confidence, ranks):
+                    result[_var_key(level)][lo:lo + len(q)] = np.maximum(-worst[:, rank], 0.0)
+            else:
+                result['volatility'][lo:lo + len(q)] = 0.0
+                for level in confidence:
+                    result[_var_key(level)][lo:lo + len(q)] = 0.0
+
+            path = q @ self.prices  # portfolios x days
+            peak = np.maximum.accumulate(path, axis=1)
+            ratio = np.ones_like(path)
+            np.divide(path, peak, out=ratio, where=peak > 0)
+            result['maxDrawdown'][lo:lo + len(q)] = 1.0 - ratio.min(axis=1, initial=1.0)
+
+        return result
+
+
+def _var_key(level: float) -> str:
+    return f"var{round(level * 100):d}"
+
+
+def risk_report(result: Mapping[str, np.ndarray], row: int) -> Dict:
+    """JSON-friendly risk figures for one portfolio row"""
+    return {key: round(float(values[row]), 6 if key == 'maxDrawdown' else 2) for key, values in result.items()}
+
+
+async def load_model(price_history, keys: Sequence[str], days: int = DEFAULT_LOOKBACK_DAYS) -> RiskModel:
+    end = datetime.utcnow()
+    series = await price_history.load_series(keys, end - timedelta(days=days), end)
+    end_ms = int(end.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    return RiskModel.from_series(keys, series, end_ms, days)
+
+
+async def run_batch(db, price_history, days: int = DEFAULT_LOOKBACK_DAYS) -> Dict:
+    """Compute risk for every user in db.portfolio and store it in db.portfolio_risk"""
+    timings = {}
+    started = time.perf_counter()
+
+    users: Dict[str, List[Dict]] = {}
+    cursor = db.portfolio.find({}, {"_id": 0, "userId": 1, "type": 1, "name": 1, "quantity": 1})
+    async for doc in cursor:
+        users.setdefault(doc["userId"], []).append(doc)
+    timings["loadPortfolios"] = time.perf_counter() - started
+
+    mark = time.perf_counter()
+    keys = sorted({instrument_key(h["type"], h["name"]) for holdings in users.values() for h in holdings})
+    model = await load_model(price_history, keys, days)
+    timings["loadHistory"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    user_ids = list(users)
+    quantities = model.quantity_matrix([users[user_id] for user_id in user_ids])
+    result = model.evaluate(quantities)
+    timings["compute"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    computed_at = datetime.utcnow()
+    docs = [{"userId": user_id, "computedAt": computed_at, "lookbackDays": days, **risk_report(result, row)}
+            for row, user_id in enumerate(user_ids)]
+    await db.portfolio_risk.delete_many({})
+    for lo in range(0, len(docs), CHUNK_SIZE):
+        await db.portfolio_risk.insert_many(docs[lo:lo + CHUNK_SIZE], ordered=False)
+    timings["store"] = time.perf_counter() - mark
+    timings["total"] = time.perf_counter() - started
+
+    logger.info("Portfolio risk batch: %d portfolios, %d instruments, timings %s", len(user_ids), len(keys), timings)
+    return {"portfolios": len(user_ids), "instruments": len(keys), "timings": timings}
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from price_archive import DEFAULT_ARCHIVE_DIR, PriceArchive
+    from price_history import PriceHistoryRepository
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        db = client[os.environ['DB_NAME']]
+        try:
+            archive = PriceArchive(os.environ.get('PRICE_ARCHIVE_DIR', DEFAULT_ARCHIVE_DIR))
+            await run_batch(db, PriceHistoryRepository(db.price_history, archive=archive))
+        finally:
+            client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,196 @@
+"""
+Columnar, memory-mapped archive of closed days of price history.
+
+Each instrument gets a directory holding three append-only raw arrays:
+``ts.i64`` (epoch milliseconds), ``buy.f64`` and ``sell.f64``. The manifest
+records how many rows of each instrument are committed and the UTC midnight
+up to which Mongo history has been compacted, so a crash mid-append only
+leaves trailing bytes that the next compaction truncates away.
+
+Reads memory-map the arrays and binary-search the requested time range;
+the returned series are views into the mapping, not copies. Compaction
+holds an exclusive lock on the archive directory, so of several workers
+(or the CLI) only one appends at a time and the others skip the run.
+
+    python backend/price_archive.py            # compact every closed day, then expire archived raw ticks
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+from urllib.parse import quote
+
+import numpy as np
+
+from metrics import mongo_operation_duration
+from price_history import PriceSeries, to_epoch_ms
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_DIR = Path(__file__).parent / 'data' / 'price_archive'
+COLUMNS = (('ts.i64', np.int64), ('buy.f64', np.float64), ('sell.f64', np.float64))
+MANIFEST = 'manifest.json'
+LOCK = '.compact.lock'
+
+
+class PriceArchive:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.compacted_until: Optional[datetime] = None
+        self._counts: Dict[str, int] = {}
+        self._maps: Dict[str, PriceSeries] = {}
+        self._manifest_mtime = None
+        self.refresh()
+
+    @property
+    def compacted_until_ms(self) -> Optional[int]:
+        if self.compacted_until is None:
+            return None
+        return int(to_epoch_ms([self.compacted_until])[0])
+
+    def refresh(self):
+        """Pick up days compacted by another process since the manifest was last read"""
+        path = self.directory / MANIFEST
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+        self._manifest_mtime = mtime
+        manifest = json.loads(path.read_text())
+        self.compacted_until = datetime.fromisoformat(manifest['compactedUntil'])
+        self._counts = manifest['counts']
+        self._maps.clear()
+
+    def _write_manifest(self):
+        path = self.directory / MANIFEST
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps({'compactedUntil': self.compacted_until.isoformat(), 'counts': self._counts}))
+        os.replace(tmp, path)
+        self._manifest_mtime = path.stat().st_mtime_ns
+
+    def _instrument_dir(self, key: str) -> Path:
+        return self.directory / quote(key, safe='')
+
+    def _series(self, key: str) -> Optional[PriceSeries]:
+        count = self._counts.get(key, 0)
+        if not count:
+            return None
+        series = self._maps.get(key)
+        if series is None or len(series.ts) != count:
+            folder = self._instrument_dir(key)
+            series = PriceSeries(*(
+                np.memmap(folder / filename, dtype=dtype, mode='r', shape=(count,))
+                for filename, dtype in COLUMNS
+            ))
+            self._maps[key] = series
+        return series
+
+    def load(self, instruments: Iterable[str], start_ms: int, end_ms: int) -> Dict[str, PriceSeries]:
+        """Archived ticks in [start_ms, end_ms] per instrument, plus the last tick before start_ms"""
+        result = {}
+        for key in instruments:
+            series = self._series(key)
+            if series is None:
+                continue
+            lo = max(int(np.searchsorted(series.ts, start_ms, side='left')) - 1, 0)
+            hi = int(np.searchsorted(series.ts, end_ms, side='right'))
+            if hi > lo:
+                result[key] = PriceSeries(series.ts[lo:hi], series.buy[lo:hi], series.sell[lo:hi])
+        return result
+
+    def append(self, key: str, series: PriceSeries):
+        """Append ticks newer than everything archived for ``key``; committed by the next manifest write.
+
+        Only called under the compaction lock: the truncate below must never
+        cut committed rows that other processes have mapped.
+        """
+        folder = self._instrument_dir(key)
+        folder.mkdir(parents=True, exist_ok=True)
+        count = self._counts.get(key, 0)
+        for (filename, dtype), values in zip(COLUMNS, series):
+            dtype = np.dtype(dtype)
+            with open(folder / filename, 'ab') as f:
+                # Drop bytes from an append whose manifest write never happened
+                f.truncate(count * dtype.itemsize)
+                f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+        self._counts[key] = count + len(series.ts)
+
+    async def compact(self, collection, until: datetime = None) -> Dict[str, int]:
+        """Copy every closed UTC day of raw history up to ``until`` into the archive, one day at a time.
+
+        Returns nothing appended when another process holds the compaction lock.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / LOCK, 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info("Archive is being compacted by another process, skipping")
+                return {}
+            # The lock is released when the file closes
+            return await self._compact(collection, until)
+
+    async def _compact(self, collection, until: Optional[datetime]) -> Dict[str, int]:
+        # Another worker or the CLI may have compacted since; resuming from a stale manifest would append those days twice
+        self.refresh()
+        until = until or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        day = self.compacted_until
+        if day is None:
+            first = await collection.find_one({}, {'_id': 0, 'ts': 1}, sort=[('ts', 1)])
+            if first is None:
+                return {}
+            day = first['ts'].replace(hour=0, minute=0, second=0, microsecond=0)
+
+        appended: Dict[str, int] = {}
+        projection = {'_id': 0, 'instrument': 1, 'ts': 1, 'buy': 1, 'sell': 1}
+        while day < until:
+            next_day = day + timedelta(days=1)
+            grouped: Dict[str, list] = {}
+            with mongo_operation_duration.time('price_history', 'find'):
+                cursor = collection.find({'ts': {'$gte': day, '$lt': next_day}}, projection).sort('ts', 1)
+                async for doc in cursor:
+                    grouped.setdefault(doc['instrument'], []).append(doc)
+
+            for key, docs in grouped.items():
+                self.append(key, PriceSeries(
+                    to_epoch_ms([doc['ts'] for doc in docs]),
+                    np.fromiter((doc['buy'] for doc in docs), dtype=np.float64, count=len(docs)),
+                    np.fromiter((doc['sell'] for doc in docs), dtype=np.float64, count=len(docs)),
+                ))
+                appended[key] = appended.get(key, 0) + len(docs)
+            self.compacted_until = day = next_day
+            self._write_manifest()
+
+        if appended:
+            logger.info("Compacted %d ticks of %d instruments up to %s", sum(appended.values()), len(appended), until.date())
+        return appended
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from price_history import PriceHistoryRepository
+    from price_rollups import RAW_RETENTION
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        db = client[os.environ['DB_NAME']]
+        archive = PriceArchive(os.environ.get('PRICE_ARCHIVE_DIR', DEFAULT_ARCHIVE_DIR))
+        try:
+            await archive.compact(db.price_history)
+            await PriceHistoryRepository(db.price_history, archive=archive, retention=RAW_RETENTION).expire()
+        finally:
+            client.close()
+
+    asyncio.run(main())
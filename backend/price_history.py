@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from metrics import mongo_operation_duration
+from price_normalizer import instrument_key
+
+logger = logging.getLogger(__name__)
+
+# Minimum spacing between two recorded snapshots, in seconds
+DEFAULT_RECORD_INTERVAL = 60
+# Snapshots waiting to be folded into the rollups before the oldest are dropped
+ROLLUP_BACKLOG = 100
+
+
+class PriceSeries(NamedTuple):
+    ts: np.ndarray  # int64 epoch milliseconds, ascending
+    buy: np.ndarray  # float64
+    sell: np.ndarray  # float64
+
+
+def to_epoch_ms(values) -> np.ndarray:
+    """Convert naive UTC datetimes (as stored by Mongo) to int64 epoch milliseconds"""
+    return np.array(values, dtype='datetime64[ms]').astype(np.int64)
+
+
+def _concat(head: PriceSeries, tail: PriceSeries) -> PriceSeries:
+    if head is None or tail is None:
+        return tail if head is None else head
+    return PriceSeries(*(np.concatenate(pair) for pair in zip(head, tail)))
+
+
+class PriceHistoryRepository:
+    """Stores refreshed price snapshots as one document per instrument and tick"""
+
+    def __init__(self, collection, record_interval: float = DEFAULT_RECORD_INTERVAL, archive=None,
+                 rollups=None, retention: Optional[timedelta] = None):
+        self.collection = collection
+        self.record_interval = record_interval
+        # Optional PriceArchive holding compacted closed days (see price_archive.py)
+        self.archive = archive
+        # Optional PriceRollups fed with every new snapshot (see price_rollups.py)
+        self.rollups = rollups
+        # Raw ticks older than this are deleted once the archive holds them (see expire)
+        self.retention = retention
+        self._last_recorded = 0.0
+        self._last_rolled = None
+        self._rollup_backlog = deque(maxlen=ROLLUP_BACKLOG)
+        self._rollup_task = None
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("instrument", 1), ("ts", 1)])
+        # Earlier releases expired raw ticks with a TTL index, whether or not they had been archived
+        indexes = await self.collection.index_information()
+        if "expireAfterSeconds" in indexes.get("ts_1", {}):
+            await self.collection.drop_index("ts_1")
+        await self.collection.create_index([("ts", 1)])
+        if self.rollups is not None:
+            await self.rollups.ensure_indexes()
+
+    async def record_snapshot(self, prices: Dict, ts: datetime = None) -> bool:
+        """Persist a snapshot unless one was recorded less than record_interval ago.
+
+        Rollups see every distinct snapshot (by ``version``), not only the
+        recorded ones, so their high/low cover the ticks in between. They are
+        folded in order by a background task, off the caller's request path.
+        """
+        ts = ts or datetime.utcnow()
+        version = prices.get("version")
+        if self.rollups is not None and (version is None or version != self._last_rolled):
+            self._last_rolled = version
+            self._queue_rollup(prices, ts)
+
+        now = time.monotonic()
+        if now - self._last_recorded < self.record_interval:
+            return False
+        self._last_recorded = now
+
+        docs = [
+            {
+                "instrument": instrument_key(category, item["name"]),
+                "ts": ts,
+                "buy": item["buy"],
+                "sell": item["sell"],
+            }
+            for category in ("gold", "currency")
+            for item in prices.get(category, [])
+        ]
+        if docs:
+            with mongo_operation_duration.time("price_history", "insert_many"):
+                await self.collection.insert_many(docs, ordered=False)
+        return True
+
+    async def expire(self, now: datetime = None) -> int:
+        """Delete raw ticks older than ``retention``, but only those the archive already holds.
+
+        Nothing is deleted without an archive or before its first compaction,
+        so a stalled compaction keeps history in Mongo instead of losing it.
+        """
+        if self.retention is None or self.archive is None:
+            return 0
+        self.archive.refresh()
+        if self.archive.compacted_until is None:
+            return 0
+        cutoff = min((now or datetime.utcnow()) - self.retention, self.archive.compacted_until)
+        with mongo_operation_duration.time("price_history", "delete_many"):
+            result = await self.collection.delete_many({"ts": {"$lt": cutoff}})
+        return result.deleted_count
+
+    def _queue_rollup(self, prices: Dict, ts: datetime):
+        if len(self._rollup_backlog) == self._rollup_backlog.maxlen:
+            logger.warning("Rollup backlog full, dropping the snapshot of %s", self._rollup_backlog[0][1])
+        self._rollup_backlog.append((prices, ts))
+        if self._rollup_task is None or self._rollup_task.done():
+            self._rollup_task = asyncio.get_running_loop().create_task(self._fold_rollups())
+
+    async def _fold_rollups(self):
+        # A single task drains the backlog so candles see the snapshots in order (close is last-write-wins)
+        while self._rollup_backlog:
+            prices, ts = self._rollup_backlog.popleft()
+            try:
+                await self.rollups.record(prices, ts)
+            except Exception as e:
+                logger.error("Error recording price rollups: %s", e)
+
+    async def flush_rollups(self):
+        """Wait until every queued snapshot is folded into the rollups"""
+        if self._rollup_task is not None and not self._rollup_task.done():
+            await self._rollup_task
+
+    async def load_day_open(self, since: datetime) -> Dict[str, Tuple[datetime, float]]:
+        """First recorded (ts, sell) at or after ``since`` for each instrument of the latest snapshot.
+
+        One indexed query per instrument, however many ticks were recorded since.
+        """
+        latest = await self.collection.find_one({"ts": {"$gte": since}}, {"_id": 0, "ts": 1}, sort=[("ts", -1)])
+        if latest is None:
+            return {}
+        keys = [doc["instrument"] for doc in await self.collection.find({"ts": latest["ts"]}, {"_id": 0, "instrument": 1}).to_list(None)]
+        opens = {}
+        for key in keys:
+            doc = await self.collection.find_one(
+                {"instrument": key, "ts": {"$gte": since}}, {"_id": 0, "ts": 1, "sell": 1}, sort=[("ts", 1)]
+            )
+            opens[key] = (doc["ts"], doc["sell"])
+        return opens
+
+    async def load_series(self, instruments: Iterable[str], start: datetime, end: datetime) -> Dict[str, PriceSeries]:
+        """Load ascending price series per instrument for the [start, end] range.
+
+        The last tick before ``start`` is included so callers can carry the
+        price forward to the beginning of the range. Days already compacted
+        into the archive are read from it; only the rest comes from Mongo.
+        """
+        instruments = list(instruments)
+        archive = self.archive
+        if archive is not None:
+            archive.refresh()
+        boundary = archive.compacted_until if archive is not None else None
+        if boundary is None or start >= boundary:
+            series = await self._load_mongo(instruments, start, end)
+            if boundary is not None:
+                # Raw ticks before the open day may have expired; carry the price from the archive
+                start_ms = int(to_epoch_ms([start])[0])
+                boundary_ms = archive.compacted_until_ms
+                for key, prior in archive.load(instruments, boundary_ms, boundary_ms - 1).items():
+                    current = series.get(key)
+                    if current is None or current.ts[0] >= start_ms:
+                        series[key] = _concat(prior, current)
+            return series
+
+        start_ms, end_ms = to_epoch_ms([start, end])
+        archived = archive.load(instruments, int(start_ms), min(int(end_ms), archive.compacted_until_ms - 1))
+        if end < boundary:
+            return archived
+
+        recent = await self._load_mongo(instruments, boundary, end, prior=False)
+        for key, tail in recent.items():
+            archived[key] = _concat(archived.get(key), tail)
+        return archived
+
+    async def _load_mongo(self, instruments: List[str], start: datetime, end: datetime, prior: bool = True) -> Dict[str, PriceSeries]:
+        projection = {"_id": 0, "instrument": 1, "ts": 1, "buy": 1, "sell": 1}
+
+        grouped: Dict[str, list] = {}
+        if prior:
+            for key in instruments:
+                doc = await self.collection.find_one(
+                    {"instrument": key, "ts": {"$lt": start}}, projection, sort=[("ts", -1)]
+                )
+                if doc:
+                    grouped[key] = [doc]
+
+        cursor = self.collection.find(
+            {"instrument": {"$in": instruments}, "ts": {"$gte": start, "$lte": end}}, projection
+        ).sort("ts", 1)
+        async for doc in cursor:
+            grouped.setdefault(doc["instrument"], []).append(doc)
+
+        return {
+            key: PriceSeries(
+                to_epoch_ms([doc["ts"] for doc in docs]),
+                np.fromiter((doc["buy"] for doc in docs), dtype=np.float64, count=len(docs)),
+                np.fromiter((doc["sell"] for doc in docs), dtype=np.float64, count=len(docs)),
+            )
+            for key, docs in grouped.items()
+        }
@@ -0,0 +1,114 @@
+import re
+from types import MappingProxyType
+from typing import Dict, List, NamedTuple, Optional
+
+
+class Instrument(NamedTuple):
+    name: str
+    nameEn: str
+    type: str
+    symbol: Optional[str] = None
+
+
+class MalformedValue(NamedTuple):
+    key: str
+    field: str
+    raw: object
+
+
+class NormalizedPrices(NamedTuple):
+    gold: List[Dict]
+    currency: List[Dict]
+    errors: List[MalformedValue]
+
+
+# Harem API key -> instrument, built once at import and read-only afterwards
+INSTRUMENT_CATALOG = MappingProxyType({
+    'Has Altın': Instrument('HAS ALTIN', 'PURE GOLD', 'gold'),
+    'ONS': Instrument('ONS', 'OUNCE', 'gold'),
+    'GRAM ALTIN': Instrument('GRAM ALTIN', 'GRAM GOLD', 'gold'),
+    '22 AYAR': Instrument('22 AYAR', '22 CARAT', 'gold'),
+    '14 AYAR': Instrument('14 AYAR', '14 CARAT', 'gold'),
+    'ALTIN GÜMÜŞ': Instrument('ALTIN GÜMÜŞ', 'GOLD SILVER', 'gold'),
+    'YENİ ÇEYREK': Instrument('ÇEYREK ALTIN', 'QUARTER GOLD', 'gold'),
+    'YENİ YARIM': Instrument('YARIM ALTIN', 'HALF GOLD', 'gold'),
+    'YENİ TAM': Instrument('TAM ALTIN', 'FULL GOLD', 'gold'),
+    'YENİ ATA': Instrument('ATA ALTIN', 'ATA GOLD', 'gold'),
+    'ESKİ ÇEYREK': Instrument('ESKİ ÇEYREK', 'OLD QUARTER', 'gold'),
+    'ESKİ YARIM': Instrument('ESKİ YARIM', 'OLD HALF', 'gold'),
+    'ESKİ TAM': Instrument('ESKİ TAM', 'OLD FULL', 'gold'),
+    'ESKİ ATA': Instrument('ESKİ ATA', 'OLD ATA', 'gold'),
+    'USD/KG': Instrument('USD/KG', 'USD/KG', 'currency', '$'),
+    'EUR/KG': Instrument('EUR/KG', 'EUR/KG', 'currency', '€'),
+})
+
+def instrument_key(type: str, name: str) -> str:
+    """Stable identifier for an instrument across snapshots, stats and history"""
+    return f'{type}:{name}'
+
+
+# Prices use Turkish formatting ("5.777,76"): dots group thousands, comma is the decimal mark.
+# Validated values are ASCII, so a single bytes translation drops the dots and maps the comma.
+_PRICE_RE = re.compile(r'-?(?:\d{1,3}(?:\.\d{3})+|\d+)(?:,\d+)?', re.ASCII)
+
+# Percentages already use a dot as decimal separator ("34.72", "-0.50")
+_PERCENT_RE = re.compile(r'-?\d+(?:[.,]\d+)?', re.ASCII)
+
+_DECIMAL_COMMA = bytes.maketrans(b',', b'.')
+
+
+def _parse(value, pattern, delete: bytes) -> Optional[float]:
+    """Parse a raw upstream number, returning None when it is missing or malformed"""
+    if value.__class__ is str:
+        value = value.strip()
+        if pattern.fullmatch(value) is None:
+            return None
+        return float(value.encode('ascii').translate(_DECIMAL_COMMA, delete))
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def normalize_harem_payload(raw_data: List[Dict]) -> NormalizedPrices:
+    """Map a raw Harem API array onto catalog instruments in a single pass.
+
+    Rows whose buy/sell/percent cannot be parsed are left out and reported in
+    ``errors`` instead of being published with a 0.0 price.
+    """
+    gold_items = []
+    currency_items = []
+    errors = []
+    catalog = INSTRUMENT_CATALOG
+
+    for item in raw_data:
+        key = item.get('key', '')
+        instrument = catalog.get(key)
+        if instrument is None:
+            continue
+
+        buy = _parse(item.get('buy'), _PRICE_RE, b'.')
+        sell = _parse(item.get('sell'), _PRICE_RE, b'.')
+        percent = _parse(item.get('percent'), _PERCENT_RE, b'')
+
+        if buy is None or sell is None or percent is None:
+            for field, parsed in (('buy', buy), ('sell', sell), ('percent', percent)):
+                if parsed is None:
+                    errors.append(MalformedValue(key, field, item.get(field)))
+            continue
+
+        row = {
+            'name': instrument.name,
+            'nameEn': instrument.nameEn,
+            'buy': buy,
+            'sell': sell,
+            'change': percent,
+        }
+        if instrument.type == 'gold':
+            row['unit'] = 'TRY'
+            gold_items.append(row)
+        else:
+            row['symbol'] = instrument.symbol
+            row['unit'] = 'TRY'
+            currency_items.append(row)
+
+    return NormalizedPrices(gold_items, currency_items, errors)
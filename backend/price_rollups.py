@@ -0,0 +1,120 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+from pymongo import UpdateOne
+
+from metrics import mongo_operation_duration
+from price_history import to_epoch_ms
+from price_normalizer import instrument_key
+
+
+class RollupTier(NamedTuple):
+    bucket: timedelta
+    collection: str
+    retention: Optional[timedelta]  # None keeps the documents forever
+
+
+def _days(name: str, default: str) -> Optional[timedelta]:
+    days = float(os.environ.get(name, default))
+    return timedelta(days=days) if days > 0 else None
+
+
+# Raw ticks in price_history (0 keeps them forever); only ticks already compacted into the archive are deleted
+RAW_RETENTION = _days('PRICE_HISTORY_RETENTION_DAYS', '7')
+TIERS = {
+    '1m': RollupTier(timedelta(minutes=1), 'price_rollups_1m', _days('PRICE_ROLLUP_1M_RETENTION_DAYS', '28')),
+    '1h': RollupTier(timedelta(hours=1), 'price_rollups_1h', _days('PRICE_ROLLUP_1H_RETENTION_DAYS', '0')),
+    '1d': RollupTier(timedelta(days=1), 'price_rollups_1d', _days('PRICE_ROLLUP_1D_RETENTION_DAYS', '0')),
+}
+
+
+# Largest number of candles "auto" resolution returns for a chart
+CHART_POINTS = 1500
+
+
+class Candles(NamedTuple):
+    ts: np.ndarray  # int64 epoch milliseconds of each bucket start, ascending
+    open: np.ndarray  # sell prices, float64
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+
+
+def bucket_start(ts: datetime, bucket: timedelta) -> datetime:
+    """Start of the UTC bucket holding ``ts``"""
+    return datetime.min + ((ts - datetime.min) // bucket) * bucket
+
+
+def pick_resolution(start: datetime, end: datetime, now: datetime) -> str:
+    """Finest tier that covers [start, end] in at most CHART_POINTS candles and still holds ``start``"""
+    for resolution, tier in TIERS.items():
+        if tier.retention is not None and start < now - tier.retention:
+            continue
+        if (end - start) / tier.bucket <= CHART_POINTS:
+            return resolution
+    return '1d'
+
+
+class PriceRollups:
+    """Sell-price OHLC candles per instrument at 1 minute, 1 hour and 1 day, upserted as snapshots arrive"""
+
+    def __init__(self, db=None):
+        self.db = db
+
+    async def ensure_indexes(self):
+        for tier in TIERS.values():
+            collection = self.db[tier.collection]
+            await collection.create_index([("instrument", 1), ("ts", 1)], unique=True)
+            if tier.retention is not None:
+                await collection.create_index([("ts", 1)], expireAfterSeconds=int(tier.retention.total_seconds()))
+
+    async def record(self, prices: Dict, ts: datetime):
+        """Fold one snapshot into the open candle of every tier, with one unordered bulk write per tier"""
+        items = [
+            (instrument_key(category, item["name"]), item)
+            for category in ("gold", "currency")
+            for item in prices.get(category, [])
+        ]
+        if not items:
+            return
+        writes = []
+        for tier in TIERS.values():
+            bucket = bucket_start(ts, tier.bucket)
+            writes.append(self._bulk_write(tier.collection, [
+                UpdateOne(
+                    {"instrument": key, "ts": bucket},
+                    {
+                        "$setOnInsert": {"open": item["sell"]},
+                        "$max": {"high": item["sell"]},
+                        "$min": {"low": item["sell"]},
+                        "$set": {"close": item["sell"]},
+                        "$inc": {"ticks": 1},
+                    },
+                    upsert=True
+                )
+                for key, item in items
+            ]))
+        await asyncio.gather(*writes)
+
+    async def _bulk_write(self, collection: str, requests):
+        with mongo_operation_duration.time(collection, "bulk_write"):
+            await self.db[collection].bulk_write(requests, ordered=False)
+
+    async def load(self, instrument: str, resolution: str, start: datetime, end: datetime) -> Optional[Candles]:
+        """Candles of ``instrument`` whose bucket overlaps [start, end], None when there are none"""
+        tier = TIERS[resolution]
+        projection = {"_id": 0, "ts": 1, "open": 1, "high": 1, "low": 1, "close": 1}
+        with mongo_operation_duration.time("price_rollups", "find"):
+            docs = await self.db[tier.collection].find(
+                {"instrument": instrument, "ts": {"$gte": bucket_start(start, tier.bucket), "$lte": end}}, projection
+            ).sort("ts", 1).to_list(None)
+        if not docs:
+            return None
+        return Candles(
+            to_epoch_ms([doc["ts"] for doc in docs]),
+            *(np.fromiter((doc[field] for doc in docs), dtype=np.float64, count=len(docs))
+              for field in ("open", "high", "low", "close"))
+        )
@@ -0,0 +1,113 @@
+"""
+Compact fixed-point representation of a price snapshot.
+
+Buy/sell prices and daily changes are held as int64 fixed-point values with
+four decimals (exchange rates such as JPY are quoted below one kuruş), in
+one (instruments x 3) array per snapshot. The per-instrument metadata
+(names, symbol, unit) and the instrument layout are interned, so snapshots
+of the same instruments share them and only the value array is retained
+per snapshot.
+"""
+
+import sys
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Fixed-point scale: 1/10000 TRY for prices, 1/10000 percent for changes
+SCALE = 10_000
+CATEGORIES = ('gold', 'currency')
+
+
+class InstrumentMeta(NamedTuple):
+    type: str
+    name: str
+    nameEn: str
+    symbol: Optional[str]
+    unit: str
+
+
+_instruments: Dict[InstrumentMeta, InstrumentMeta] = {}
+_layouts: Dict[Tuple[InstrumentMeta, ...], Tuple[InstrumentMeta, ...]] = {}
+
+
+def intern_instrument(type: str, name: str, nameEn: str, symbol: Optional[str] = None, unit: str = 'TRY') -> InstrumentMeta:
+    meta = InstrumentMeta(type, sys.intern(name), sys.intern(nameEn), symbol and sys.intern(symbol), sys.intern(unit))
+    return _instruments.setdefault(meta, meta)
+
+
+def to_fixed(value: float, decimals: int = 4) -> int:
+    """Round a decimal amount to ``decimals`` places, once, as a fixed-point integer"""
+    return round(value * 10 ** decimals) * 10 ** (4 - decimals)
+
+
+def from_fixed(value: int) -> float:
+    return value / SCALE
+
+
+class PriceSnapshot:
+    __slots__ = ('version', 'taken_at', 'instruments', 'values', '_rendered')
+
+    def __init__(self, version: int, taken_at: float, instruments: Tuple[InstrumentMeta, ...], values: np.ndarray):
+        self.version = version
+        self.taken_at = taken_at
+        self.instruments = _layouts.setdefault(instruments, instruments)
+        self.values = values
+        self._rendered = None
+
+    @classmethod
+    def from_prices(cls, prices: Dict, version: int, taken_at: float) -> 'PriceSnapshot':
+        """Build from the ``{'gold': rows, 'currency': rows}`` shape the services produce"""
+        instruments = []
+        values = []
+        for category in CATEGORIES:
+            for row in prices.get(category, []):
+                instruments.append(intern_instrument(category, row['name'], row['nameEn'], row.get('symbol'), row.get('unit', 'TRY')))
+                values.append((to_fixed(row['buy']), to_fixed(row['sell']), to_fixed(row.get('change', 0.0))))
+        return cls(version, taken_at, tuple(instruments), np.array(values or np.empty((0, 3)), dtype=np.int64))
+
+    def _rows(self, indices) -> Dict[str, List[Dict]]:
+        rows = {category: [] for category in CATEGORIES}
+        position = {category: 0 for category in CATEGORIES}
+        wanted = set(indices)
+        for index, (meta, (buy, sell, change)) in enumerate(zip(self.instruments, self.values.tolist())):
+            position[meta.type] += 1
+            if index not in wanted:
+                continue
+            row = {
+                'id': position[meta.type],
+                'name': meta.name,
+                'nameEn': meta.nameEn,
+                'buy': from_fixed(buy),
+                'sell': from_fixed(sell),
+                'change': from_fixed(change),
+            }
+            if meta.symbol is not None:
+                row['symbol'] = meta.symbol
+            row['unit'] = meta.unit
+            rows[meta.type].append(row)
+        return rows
+
+    def as_prices(self) -> Dict:
+        """Rows in the API shape; cached while this is the current snapshot"""
+        if self._rendered is None:
+            self._rendered = {**self._rows(range(len(self.instruments))), 'version': self.version}
+        return self._rendered
+
+    def release(self):
+        """Drop the rendered rows once the snapshot is only retained for diffing"""
+        self._rendered = None
+
+    def diff(self, older: 'PriceSnapshot') -> np.ndarray:
+        """Indices of instruments whose buy, sell or change differ from ``older``"""
+        if older.instruments is not self.instruments:
+            return np.arange(len(self.instruments))
+        return np.flatnonzero((self.values != older.values).any(axis=1))
+
+    def changes_since(self, older: 'PriceSnapshot') -> Dict:
+        return {**self._rows(self.diff(older).tolist()), 'version': self.version}
+
+    @property
+    def nbytes(self) -> int:
+        """Memory retained by this snapshot alone; interned metadata is shared and not counted"""
+        return sys.getsizeof(self) + sys.getsizeof(self.values)
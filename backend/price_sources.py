@@ -0,0 +1,102 @@
+"""
+Per-source cached tiers for the upstream price feeds.
+
+Each upstream is a CachedSource with its own TTL and fallback policy: a
+failed refresh keeps serving the last good value for up to ``max_stale``
+seconds and is not retried for ``retry_after`` seconds. Slow feeds can
+refresh in the background, so a read never waits on them, not even for a
+first value: until it arrives they are served as missing. The price snapshot is assembled from the latest value of
+each source; ``version`` changes whenever a source refreshes.
+
+Refreshes are scheduled on the monotonic clock, not on upstream.clock(): a
+replay moves the data's timestamps but caching keeps real-time TTLs.
+"""
+
+import logging
+import threading
+from time import monotonic
+from typing import Any, Callable, Dict, Optional
+
+from metrics import Gauge, registry
+
+logger = logging.getLogger(__name__)
+
+
+class CachedSource:
+    def __init__(self, name: str, load: Callable[[], Optional[Any]], ttl: float,
+                 max_stale: float, retry_after: float, background: bool = False):
+        self.name = name
+        self.load = load
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.retry_after = retry_after
+        self.background = background
+        self.value = None
+        self.version = 0
+        self.fetched_at = 0.0
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+        self._pending = threading.Lock()
+
+    def get(self) -> Optional[Any]:
+        """Latest value, refreshed once older than ``ttl``; None when nothing usable is held"""
+        now = monotonic()
+        if now >= self._next_refresh:
+            if self.background:
+                self._refresh_in_background()
+            else:
+                self.refresh()
+        if self.value is not None and monotonic() - self.fetched_at > self.max_stale:
+            logger.warning("Dropping %s data older than %ss", self.name, self.max_stale, extra={'source': self.name})
+            self.value = None
+            self.version += 1
+        return self.value
+
+    def refresh(self) -> bool:
+        """Load the source now; keeps the previous value when the load fails"""
+        with self._lock:
+            try:
+                value = self.load()
+            except Exception as e:
+                logger.error("Error refreshing %s: %s", self.name, e, extra={'source': self.name})
+                value = None
+            now = monotonic()
+            if value is None:
+                self._next_refresh = now + self.retry_after
+                return False
+            self.value = value
+            self.version += 1
+            self.fetched_at = now
+            self._next_refresh = now + self.ttl
+            return True
+
+    def age(self) -> Optional[float]:
+        """Seconds since the last successful refresh, None while nothing is held"""
+        return None if self.value is None else monotonic() - self.fetched_at
+
+    def _refresh_in_background(self):
+        # One refresh in flight per source; readers keep getting the held value meanwhile
+        if not self._pending.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._pending.release()
+
+        threading.Thread(target=run, name=f'refresh-{self.name}', daemon=True).start()
+
+
+sources: Dict[str, CachedSource] = {}
+
+
+def register(source: CachedSource) -> CachedSource:
+    sources[source.name] = source
+    return source
+
+
+registry.register(Gauge(
+    'price_source_age_seconds', 'Seconds since each upstream price source last refreshed', ('source',),
+    callback=lambda: {(name,): source.age() for name, source in sources.items() if source.age() is not None}
+))
@@ -0,0 +1,233 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from price_normalizer import instrument_key
+
+MARKET_TZ = ZoneInfo('Europe/Istanbul')
+DEFAULT_WINDOWS = (300.0, 3600.0)  # seconds
+
+
+def _next_market_midnight(ts: float) -> float:
+    """Epoch seconds of the next midnight in the market timezone"""
+    local = datetime.fromtimestamp(ts, MARKET_TZ)
+    next_day = (local + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return next_day.replace(tzinfo=MARKET_TZ).timestamp()
+
+
+def market_day_start(ts: float) -> float:
+    """Epoch seconds of the midnight in the market timezone that started the day holding ``ts``"""
+    local = datetime.fromtimestamp(ts, MARKET_TZ)
+    return local.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+class RollingWindow:
+    """Time-based window with O(1) amortized min/max, EMA and realized volatility.
+
+    Min/max are kept in monotonic deques, so each tick is pushed and evicted
+    at most once. Volatility is the square root of the running sum of squared
+    log returns inside the window.
+    """
+
+    __slots__ = ('seconds', '_min', '_max', '_returns', '_sum_sq', 'ema')
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self._min = deque()  # (ts, price), prices increasing
+        self._max = deque()  # (ts, price), prices decreasing
+        self._returns = deque()  # (ts, squared log return)
+        self._sum_sq = 0.0
+        self.ema = None
+
+    def push(self, ts: float, price: float, log_return: Optional[float], dt: float):
+        mins = self._min
+        while mins and mins[-1][1] >= price:
+            mins.pop()
+        mins.append((ts, price))
+
+        maxs = self._max
+        while maxs and maxs[-1][1] <= price:
+            maxs.pop()
+        maxs.append((ts, price))
+
+        if log_return is not None:
+            squared = log_return * log_return
+            self._returns.append((ts, squared))
+            self._sum_sq += squared
+
+        # Time-aware EMA: a tick one full window later carries ~63% of the weight
+        if self.ema is None:
+            self.ema = price
+        else:
+            alpha = 1.0 - math.exp(-dt / self.seconds) if dt > 0 else 0.0
+            self.ema += alpha * (price - self.ema)
+
+        self._evict(ts)
+
+    def _evict(self, now: float):
+        cutoff = now - self.seconds
+        for window in (self._min, self._max):
+            while window[0][0] <= cutoff:
+                window.popleft()
+        returns = self._returns
+        while returns and returns[0][0] <= cutoff:
+            self._sum_sq -= returns.popleft()[1]
+        if not returns:
+            self._sum_sq = 0.0
+
+    @property
+    def min(self) -> float:
+        return self._min[0][1]
+
+    @property
+    def max(self) -> float:
+        return self._max[0][1]
+
+    @property
+    def volatility(self) -> float:
+        return math.sqrt(max(self._sum_sq, 0.0))
+
+    @property
+    def samples(self) -> int:
+        return len(self._returns)
+
+
+class InstrumentStats:
+    """Running statistics for a single instrument, anchored at the market day open"""
+
+    __slots__ = ('day_end', 'open', 'last', 'last_ts', 'windows')
+
+    def __init__(self, windows: Iterable[float]):
+        self.day_end = float('-inf')
+        self.open = None
+        self.last = None
+        self.last_ts = None
+        self.windows = [RollingWindow(seconds) for seconds in windows]
+
+    def push(self, ts: float, price: float):
+        if ts >= self.day_end:
+            self.day_end = _next_market_midnight(ts)
+            self.open = price
+
+        log_return = None
+        dt = 0.0
+        if self.last is not None and self.last > 0 and price > 0:
+            log_return = math.log(price / self.last)
+            dt = ts - self.last_ts
+
+        for window in self.windows:
+            window.push(ts, price, log_return, dt)
+
+        self.last = price
+        self.last_ts = ts
+
+    def seed_open(self, ts: float, price: float):
+        """Anchor the market day open at an earlier tick, e.g. one recorded before a restart"""
+        self.day_end = _next_market_midnight(ts)
+        self.open = price
+
+    @property
+    def change(self) -> float:
+        """Percent change since the first observation of the market day"""
+        if not self.open or self.last is None:
+            return 0.0
+        return round((self.last - self.open) / self.open * 100, 2)
+
+    def to_dict(self) -> Dict:
+        return {
+            'open': self.open,
+            'last': self.last,
+            'change': self.change,
+            'updatedAt': datetime.utcfromtimestamp(self.last_ts).isoformat(),
+            'windows': {
+                str(int(window.seconds)): {
+                    'min': window.min,
+                    'max': window.max,
+                    'ema': round(window.ema, 4),
+                    'volatility': round(window.volatility, 6),
+                    'samples': window.samples,
+                }
+                for window in self.windows
+            },
+        }
+
+
+class PriceStatsTracker:
+    """Per-instrument statistics updated incrementally on every snapshot refresh.
+
+    Most updates run on the event loop thread, but the exchangerate source
+    refreshes on a background thread and warmup refreshes on a worker, so
+    updates and snapshots hold a lock.
+    """
+
+    def __init__(self, windows: Iterable[float] = DEFAULT_WINDOWS):
+        self.windows = tuple(windows)
+        self._stats: Dict[str, Tuple[str, str, InstrumentStats]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, type: str, name: str, price: float, ts: Optional[float] = None) -> InstrumentStats:
+        """Record one tick for an instrument and return its updated statistics"""
+        with self._lock:
+            return self._observe(type, name, price, ts)
+
+    def _observe(self, type: str, name: str, price: float, ts: Optional[float]) -> InstrumentStats:
+        key = instrument_key(type, name)
+        entry = self._stats.get(key)
+        if entry is None:
+            entry = self._stats[key] = (type, name, InstrumentStats(self.windows))
+        stats = entry[2]
+        stats.push(time.time() if ts is None else ts, price)
+        return stats
+
+    def apply_day_change(self, type: str, rows: List[Dict], ts: Optional[float] = None):
+        """Observe each row's sell price and replace its change with the change since day open"""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            for row in rows:
+                row['change'] = self._observe(type, row['name'], row['sell'], ts).change
+
+    async def seed_day_open(self, history, now: Optional[float] = None) -> int:
+        """Restore today's open from recorded history so a restart keeps the daily change"""
+        now = time.time() if now is None else now
+        since = datetime.utcfromtimestamp(market_day_start(now))
+        opens = await history.load_day_open(since)
+        seeded = 0
+        with self._lock:
+            for key, (ts, sell) in opens.items():
+                type, name = key.split(':', 1)
+                entry = self._stats.get(key)
+                if entry is None:
+                    entry = self._stats[key] = (type, name, InstrumentStats(self.windows))
+                elif entry[2].day_end > now:
+                    continue
+                entry[2].seed_open(ts.replace(tzinfo=timezone.utc).timestamp(), sell)
+                seeded += 1
+        return seeded
+
+    def get(self, type: str, name: str) -> Optional[InstrumentStats]:
+        entry = self._stats.get(instrument_key(type, name))
+        return entry[2] if entry else None
+
+    def snapshot(self, type: str = 'all') -> Dict:
+        """Current statistics grouped by category, without touching history"""
+        result = {'windows': list(self.windows)}
+        with self._lock:
+            for category in ('gold', 'currency'):
+                if type not in ('all', category):
+                    continue
+                result[category] = [
+                    {'name': name, **stats.to_dict()}
+                    for entry_type, name, stats in self._stats.values()
+                    if entry_type == category and stats.last is not None
+                ]
+        return result
+
+
+price_stats = PriceStatsTracker(
+    float(seconds) for seconds in os.environ.get('PRICE_STATS_WINDOWS', '300,3600').split(',')
+)
@@ -1,28 +1,63 @@
 import os
-import requests
 from typing import Dict, List
 import logging
 
+from price_snapshot import from_fixed, to_fixed
+from price_stats import PriceStatsTracker
+from upstream import clock, fetch
+
 logger = logging.getLogger(__name__)
 
+# (name, English name, grams of gold) priced off the gram price
+GOLD_PRODUCTS = (
+    ('HAS ALTIN', 'PURE GOLD', 1.0),
+    ('ONS', 'OUNCE', 31.1035),
+    ('ÇEYREK ALTIN', 'QUARTER GOLD', 1.75),
+    ('YARIM ALTIN', 'HALF GOLD', 3.5),
+    ('TAM ALTIN', 'FULL GOLD', 7.0),
+    ('22 AYAR', '22 CARAT', 0.916),
+    ('GRAM ALTIN', 'GRAM GOLD', 1.0),
+    ('ALTIN GÜMÜŞ', 'GOLD SILVER', 0.012),
+    ('REŞAT ALTIN', 'RESAT GOLD', 7.2),
+    ('ATA ALTIN', 'ATA GOLD', 7.0),
+)
+
+
+def _quote(id: int, name: str, name_en: str, mid: float, spread: float, symbol: str = None) -> Dict:
+    """Buy/sell row around a mid price, rounded to kuruş once in fixed point"""
+    row = {
+        'id': id,
+        'name': name,
+        'nameEn': name_en,
+        'buy': from_fixed(to_fixed(mid * (1 - spread), 2)),
+        'sell': from_fixed(to_fixed(mid * (1 + spread), 2)),
+        'change': 0.0,
+    }
+    if symbol is not None:
+        row['symbol'] = symbol
+    row['unit'] = 'TRY'
+    return row
+
 class RapidAPIService:
     def __init__(self):
         # Using free APIs for gold and currency data
-        self.gold_api_url = "https://api.gold-api.com/price/XAU"
-        self.currency_api_url = "https://api.exchangerate-api.com/v4/latest/USD"
+        self.gold_api_url = os.environ.get('GOLD_API_URL', "https://api.gold-api.com/price/XAU")
+        self.currency_api_url = os.environ.get('EXCHANGERATE_API_URL', "https://api.exchangerate-api.com/v4/latest/USD")
+        # Kept apart from the Harem tracker since both services publish the same instrument names
+        self.price_stats = PriceStatsTracker()
     
     def get_gold_prices(self) -> List[Dict]:
         """Fetch gold prices from free gold API"""
         try:
             # Get international gold price in USD per ounce
-            response = requests.get(self.gold_api_url, timeout=10)
+            response = fetch('gold-api', self.gold_api_url, timeout=10)
             
             if response.status_code == 200:
                 gold_data = response.json()
                 gold_price_usd = gold_data.get('price', 2700)  # USD per troy ounce
                 
                 # Get USD/TRY exchange rate
-                currency_response = requests.get(self.currency_api_url, timeout=10)
+                currency_response = fetch('exchangerate', self.currency_api_url, timeout=10)
                 usd_try = 34.0  # fallback
                 if currency_response.status_code == 200:
                     currency_data = currency_response.json()
@@ -31,16 +66,16 @@ class RapidAPIService:
                 # Calculate Turkish gold prices
                 return self._calculate_turkish_gold_prices(gold_price_usd, usd_try)
             else:
-                logger.error(f"Gold API error: {response.status_code}")
+                logger.error("Gold API error: %s", response.status_code, extra={'source': 'gold-api'})
                 return self._get_fallback_gold_data()
         except Exception as e:
-            logger.error(f"Error fetching gold prices: {str(e)}")
+            logger.error("Error fetching gold prices: %s", e, extra={'source': 'gold-api'})
             return self._get_fallback_gold_data()
     
     def get_currency_rates(self) -> List[Dict]:
         """Fetch currency rates from free exchange rate API"""
         try:
-            response = requests.get(self.currency_api_url, timeout=10)
+            response = fetch('exchangerate', self.currency_api_url, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -49,10 +84,10 @@ class RapidAPIService:
                 
                 return self._format_currency_from_usd(rates, try_rate)
             else:
-                logger.error(f"Currency API error: {response.status_code}")
+                logger.error("Currency API error: %s", response.status_code, extra={'source': 'exchangerate'})
                 return self._get_fallback_currency_data()
         except Exception as e:
-            logger.error(f"Error fetching currency rates: {str(e)}")
+            logger.error("Error fetching currency rates: %s", e, extra={'source': 'exchangerate'})
             return self._get_fallback_currency_data()
     
     def _calculate_turkish_gold_prices(self, gold_price_usd: float, usd_try: float) -> List[Dict]:
@@ -64,98 +99,12 @@ class RapidAPIService:
         spread = 0.005
         
         formatted = [
-            {
-                'id': 1,
-                'name': 'HAS ALTIN',
-                'nameEn': 'PURE GOLD',
-                'buy': round(gram_price_try * (1 - spread), 2),
-                'sell': round(gram_price_try * (1 + spread), 2),
-                'change': round((gold_price_usd - 2670) / 2670 * 100, 2),  # Compare to base
-                'unit': 'TRY'
-            },
-            {
-                'id': 2,
-                'name': 'ONS',
-                'nameEn': 'OUNCE',
-                'buy': round(gold_price_usd * usd_try * (1 - spread), 2),
-                'sell': round(gold_price_usd * usd_try * (1 + spread), 2),
-                'change': round((gold_price_usd - 2670) / 2670 * 100, 2),
-                'unit': 'TRY'
-            },
-            {
-                'id': 3,
-                'name': 'ÇEYREK ALTIN',
-                'nameEn': 'QUARTER GOLD',
-                'buy': round(gram_price_try * 1.75 * (1 - spread), 2),
-                'sell': round(gram_price_try * 1.75 * (1 + spread), 2),
-                'change': round((gold_price_usd - 2670) / 2670 * 100, 2),
-                'unit': 'TRY'
-            },
-            {
-                'id': 4,
-                'name': 'YARIM ALTIN',
-                'nameEn': 'HALF GOLD',
-                'buy': round(gram_price_try * 3.5 * (1 - spread), 2),
-                'sell': round(gram_price_try * 3.5 * (1 + spread), 2),
-                'change': round((gold_price_usd - 2670) / 2670 * 100, 2),
-                'unit': 'TRY'
-            },
-            {
-                'id': 5,
-                'name': 'TAM ALTIN',
-                'nameEn': 'FULL GOLD',
-                'buy': round(gram_price_try * 7.0 * (1 - spread), 2),
-                'sell': round(gram_price_try * 7.0 * (1 + spread), 2),
-                'change': round((gold_price_usd - 2670) / 2670 * 100, 2),
-                'unit': 'TRY'
-            },
-            {
-                'id': 6,
-                'name': '22 AYAR',
-                'nameEn': '22 CARAT',
-                'buy': round(gram_price_try * 0.916 * (1 - spread), 2),
-                'sell': round(gram_price_try * 0.916 * (1 + spread), 2),
-                'change': round((gold_price_usd - 2670) / 2670 * 100, 2),
-                'unit': 'TRY'
-            },
-            {
-                'id': 7,
-                'name': 'GRAM ALTIN',
-                'nameEn': 'GRAM GOLD',
-                'buy': round(gram_price_try * (1 - spread), 2),
-                'sell': round(gram_price_try * (1 + spread), 2),
-                'change': round((gold_price_usd - 2670) / 2670 * 100, 2),
-                'unit': 'TRY'
-            },
-            {
-                'id': 8,
-                'name': 'ALTIN GÜMÜŞ',
-                'nameEn': 'GOLD SILVER',
-                'buy': round(gram_price_try * 0.012 * (1 - spread), 2),
-                'sell': round(gram_price_try * 0.012 * (1 + spread), 2),
-                'change': 0.5,
-                'unit': 'TRY'
-            },
-            {
-                'id': 9,
-                'name': 'REŞAT ALTIN',
-                'nameEn': 'RESAT GOLD',
-                'buy': round(gram_price_try * 7.2 * (1 - spread), 2),
-                'sell': round(gram_price_try * 7.2 * (1 + spread), 2),
-                'change': round((gold_price_usd - 2670) / 2670 * 100, 2),
-                'unit': 'TRY'
-            },
-            {
-                'id': 10,
-                'name': 'ATA ALTIN',
-                'nameEn': 'ATA GOLD',
-                'buy': round(gram_price_try * 7.0 * (1 - spread), 2),
-                'sell': round(gram_price_try * 7.0 * (1 + spread), 2),
-                'change': round((gold_price_usd - 2670) / 2670 * 100, 2),
-                'unit': 'TRY'
-            }
+            _quote(idx, name, name_en, gram_price_try * grams, spread)
+            for idx, (name, name_en, grams) in enumerate(GOLD_PRODUCTS, 1)
         ]
         
+        # All rows derive from the same ounce price, so track each one's move since day open
+        self.price_stats.apply_day_change('gold', formatted, clock())
         return formatted
     
     def _format_currency_from_usd(self, rates: Dict, try_rate: float) -> List[Dict]:
@@ -176,54 +125,16 @@ class RapidAPIService:
         
         formatted = []
         for idx, (code, name, symbol, usd_rate) in enumerate(currency_list, 1):
-            # Convert to TRY
-            if code == 'USD':
-                try_buy = try_rate * (1 - spread)
-                try_sell = try_rate * (1 + spread)
-            else:
-                # Convert other currencies: currency -> USD -> TRY
-                usd_per_currency = 1 / usd_rate if usd_rate > 0 else 1
-                try_buy = (usd_per_currency * try_rate) * (1 - spread)
-                try_sell = (usd_per_currency * try_rate) * (1 + spread)
-            
-            # Calculate change (simulated as small variation)
-            change = round((try_rate - 33.5) / 33.5 * 100, 2) if code == 'USD' else round((try_rate - 33.5) / 33.5 * 100 * 0.8, 2)
-            
-            formatted.append({
-                'id': idx,
-                'name': code,
-                'nameEn': code,
-                'buy': round(try_buy, 2),
-                'sell': round(try_sell, 2),
-                'change': change,
-                'symbol': symbol,
-                'unit': 'TRY'
-            })
+            # Convert to TRY: currency -> USD -> TRY
+            usd_per_currency = 1 / usd_rate if usd_rate > 0 else 1
+            formatted.append(_quote(idx, code, name, usd_per_currency * try_rate, spread, symbol))
         
         # Add gold-based currency rates
         gold_gram_try = try_rate * 85  # Approximate gram gold price
-        formatted.append({
-            'id': 10,
-            'name': 'USD/KG',
-            'nameEn': 'USD/KG',
-            'buy': round(gold_gram_try * 1000 / try_rate * (1 - spread), 2),
-            'sell': round(gold_gram_try * 1000 / try_rate * (1 + spread), 2),
-            'change': 0.55,
-            'symbol': '$',
-            'unit': 'TRY'
-        })
-        
-        formatted.append({
-            'id': 11,
-            'name': 'EUR/KG',
-            'nameEn': 'EUR/KG',
-            'buy': round(gold_gram_try * 1000 / try_rate / rates.get('EUR', 0.92) * (1 - spread), 2),
-            'sell': round(gold_gram_try * 1000 / try_rate / rates.get('EUR', 0.92) * (1 + spread), 2),
-            'change': 0.68,
-            'symbol': '€',
-            'unit': 'TRY'
-        })
+        formatted.append(_quote(10, 'USD/KG', 'USD/KG', gold_gram_try * 1000 / try_rate, spread, '$'))
+        formatted.append(_quote(11, 'EUR/KG', 'EUR/KG', gold_gram_try * 1000 / try_rate / rates.get('EUR', 0.92), spread, '€'))
         
+        self.price_stats.apply_day_change('currency', formatted, clock())
         return formatted
     
     def _get_fallback_gold_data(self) -> List[Dict]:
@@ -1,27 +1,172 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from contextlib import asynccontextmanager
 import os
+import asyncio
 import logging
+import time
 from pathlib import Path
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 # Load environment variables BEFORE importing services
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-from models import PortfolioItem, PortfolioItemCreate, PortfolioItemUpdate
+from models import PortfolioItem, PortfolioItemCreate, PortfolioItemUpdate, AlertBacktestRequest
 from harem_api_service import harem_api_service
+from price_stats import price_stats
+from price_history import PriceHistoryRepository
+from price_archive import DEFAULT_ARCHIVE_DIR, PriceArchive
+from price_rollups import RAW_RETENTION, TIERS as ROLLUP_TIERS, PriceRollups, pick_resolution
+from house_exposure import HouseExposure
+from portfolio_performance import RESOLUTIONS, MAX_POINTS, compute_performance, value_holdings
+from portfolio_risk import DEFAULT_LOOKBACK_DAYS, load_model, risk_report
+from price_normalizer import instrument_key
+from alert_backtest import run_backtest
+from metrics import MetricsMiddleware, mongo_operation_duration, registry as metrics_registry
+from admission import AdmissionMiddleware, admission_lanes
+from log_pipeline import RequestIdMiddleware, setup_logging, stop_logging
 
-# MongoDB connection
+# MongoDB connection, opened by the lifespan handler unless a database was injected
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+client: Optional[AsyncIOMotorClient] = None
+db = None
+price_archive = PriceArchive(os.environ.get('PRICE_ARCHIVE_DIR', DEFAULT_ARCHIVE_DIR))
+price_rollups = PriceRollups()
+price_history = PriceHistoryRepository(None, archive=price_archive, rollups=price_rollups, retention=RAW_RETENTION)
+house_exposure = HouseExposure()
+# Seconds between compaction runs rolling closed days into the archive, 0 disables
+ARCHIVE_COMPACT_INTERVAL = float(os.environ.get('PRICE_ARCHIVE_COMPACT_INTERVAL', '3600'))
+# Upper bound on startup warmup so a hung upstream cannot keep the worker from starting
+WARMUP_TIMEOUT = float(os.environ.get('WARMUP_TIMEOUT', '15'))
+# Seconds between price refresh attempts while a failed warmup keeps the worker unready
+WARMUP_RETRY_INTERVAL = float(os.environ.get('WARMUP_RETRY_INTERVAL', '5'))
+READINESS_TIMEOUT = 1.0
+# Startup price refresh running on a worker thread (see refresh_prices)
+_price_refresh: Optional[asyncio.Future] = None
+
+def _as_utc(value: datetime) -> datetime:
+    """Normalize query datetimes to the naive UTC values stored in Mongo"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+# Request profiling is opt-in on its own; an admin token alone does not install it
+PROFILING = os.environ.get('PROFILING', '0') != '0'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+ADMISSION_CONTROL = os.environ.get('ADMISSION_CONTROL', '1') != '0'
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow the request only when it carries the configured ADMIN_TOKEN"""
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+async def compact_price_history():
+    while True:
+        try:
+            await price_archive.compact(db.price_history)
+            await price_history.expire()
+        except Exception as e:
+            logger.error("Error compacting price history: %s", e)
+        await asyncio.sleep(ARCHIVE_COMPACT_INTERVAL)
+
+async def update_exposure(update):
+    """Apply a house exposure delta; a failure is left to the reconciliation instead of failing the portfolio write"""
+    try:
+        await update
+    except Exception as e:
+        logger.error("Error updating house exposure: %s", e)
+
+async def refresh_prices():
+    """Refresh prices on a worker thread, joining the refresh already in flight instead of starting another.
+
+    The refresh outlives a cancelled caller (a warmup timeout), and the
+    retries wait for it rather than queueing on the source lock.
+    """
+    global _price_refresh
+    if _price_refresh is None or _price_refresh.done():
+        _price_refresh = asyncio.ensure_future(asyncio.to_thread(harem_api_service.get_all_prices))
+    return await asyncio.shield(_price_refresh)
+
+async def load_first_snapshot():
+    # The day open comes first, otherwise the first refresh would anchor it at the current price
+    try:
+        await price_stats.seed_day_open(price_history)
+    except Exception as e:
+        logger.error("Error seeding day open prices: %s", e)
+    return await refresh_prices()
+
+async def warm_up() -> bool:
+    """Create indexes, open the Mongo pool and load the first price snapshot concurrently.
+
+    Returns whether warmup finished in time with a live (non-fallback) snapshot.
+    """
+    started = time.perf_counter()
+    steps = {
+        "indexes": price_history.ensure_indexes(),
+        "mongo": db.command("ping"),
+        "prices": load_first_snapshot(),
+    }
+    try:
+        results = await asyncio.wait_for(asyncio.gather(*steps.values(), return_exceptions=True), WARMUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Warmup did not finish within %ss", WARMUP_TIMEOUT)
+        return False
+    for name, result in zip(steps, results):
+        if isinstance(result, Exception):
+            logger.error("Warmup step %s failed: %s", name, result)
+    if harem_api_service.snapshot_age() is None:
+        logger.warning("Warmup could not load live prices")
+        return False
+    logger.info("Warmup finished in %.2fs", time.perf_counter() - started)
+    return True
+
+async def wait_for_live_prices():
+    """After a failed warmup, keep refreshing prices and report ready once a live snapshot is held"""
+    while harem_api_service.snapshot_age() is None:
+        await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+        await refresh_prices()
+    app.state.ready = True
+    logger.info("Live prices loaded, ready to serve")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db
+    if db is None:
+        client = AsyncIOMotorClient(mongo_url)
+        db = client[os.environ['DB_NAME']]
+    price_history.collection = db.price_history
+    price_rollups.db = db
+    house_exposure.totals = db.house_exposure
+    house_exposure.holders = db.house_exposure_holders
+    
+    tasks = []
+    if await warm_up():
+        app.state.ready = True
+    else:
+        tasks.append(asyncio.create_task(wait_for_live_prices()))
+    if ARCHIVE_COMPACT_INTERVAL > 0:
+        tasks.append(asyncio.create_task(compact_price_history()))
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        for task in tasks:
+            task.cancel()
+        # Snapshots already served still go into the candles
+        await price_history.flush_rollups()
+        if client is not None:
+            client.close()
+        stop_logging()
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.state.ready = False
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -33,14 +178,26 @@ async def root():
 
 # Get Gold & Currency Prices
 @api_router.get("/prices")
-async def get_prices(type: Optional[str] = "all"):
-    """Get real-time gold and currency prices from Harem Altın API"""
+async def get_prices(type: Optional[str] = "all", since: Optional[int] = None):
+    """Get real-time gold and currency prices from Harem Altın API.
+
+    With ``since`` (a previously returned ``version``) only the rows that
+    changed after that snapshot are returned, if it is still retained.
+    """
     try:
         prices_data = harem_api_service.get_all_prices()
+        if not prices_data.get("fallback"):
+            await price_history.record_snapshot(prices_data)
         
         result = {
-            "lastUpdate": datetime.utcnow().isoformat()
+            "lastUpdate": datetime.utcnow().isoformat(),
+            "version": prices_data.get("version")
         }
+        if since is not None:
+            changes = harem_api_service.changes_since(since)
+            if changes is not None and changes["version"] == prices_data.get("version"):
+                prices_data = changes
+                result["partial"] = True
         
         if type in ["all", "gold"]:
             result["gold"] = prices_data.get("gold", [])
@@ -50,29 +207,204 @@ async def get_prices(type: Optional[str] = "all"):
         
         return result
     except Exception as e:
-        logging.error(f"Error fetching prices: {str(e)}")
+        logger.error("Error fetching prices: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/prices/history")
+async def get_price_history(
+    type: str,
+    name: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = "raw"
+):
+    """Get recorded buy/sell ticks of one instrument (default: the last 24 hours).
+
+    With ``resolution`` 1m, 1h or 1d (or ``auto`` to pick one for the range)
+    sell-price OHLC candles are read from the rollups instead of raw ticks.
+    """
+    now = datetime.utcnow()
+    end = _as_utc(end) if end else now
+    start = _as_utc(start) if start else end - timedelta(days=1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if resolution == "auto":
+        resolution = pick_resolution(start, end, now)
+    if resolution != "raw" and resolution not in ROLLUP_TIERS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of raw, auto, {', '.join(ROLLUP_TIERS)}")
+    if resolution != "raw" and (end - start) / ROLLUP_TIERS[resolution].bucket > MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"Requested range spans more than {MAX_POINTS} candles, use a coarser resolution")
+    
+    try:
+        key = instrument_key(type, name)
+        if resolution != "raw":
+            candles = await price_rollups.load(key, resolution, start, end)
+            result = {"instrument": key, "resolution": resolution}
+            if candles is None:
+                return {**result, "timestamps": [], "open": [], "high": [], "low": [], "close": []}
+            return {
+                **result,
+                "timestamps": candles.ts.tolist(),
+                "open": candles.open.tolist(),
+                "high": candles.high.tolist(),
+                "low": candles.low.tolist(),
+                "close": candles.close.tolist()
+            }
+        series = (await price_history.load_series([key], start, end)).get(key)
+        if series is None:
+            return {"instrument": key, "timestamps": [], "buy": [], "sell": []}
+        if len(series.ts) > MAX_POINTS:
+            raise HTTPException(status_code=400, detail=f"Requested range holds more than {MAX_POINTS} ticks, narrow it down")
+        return {
+            "instrument": key,
+            "timestamps": series.ts.tolist(),
+            "buy": series.buy.tolist(),
+            "sell": series.sell.tolist()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching price history: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/prices/stats")
+async def get_price_stats(type: Optional[str] = "all"):
+    """Get incrementally maintained per-instrument statistics (day open, rolling min/max, EMA, volatility)"""
+    result = price_stats.snapshot(type)
+    result["lastUpdate"] = datetime.utcnow().isoformat()
+    return result
+
+BOOTSTRAP_QUERIES = ("prices", "portfolio", "valuation")
+# The app values holdings itself from the returned prices; valuation is for clients that ask for it
+BOOTSTRAP_DEFAULT = "prices,portfolio"
+
+@api_router.get("/bootstrap")
+async def get_bootstrap(include: str = BOOTSTRAP_DEFAULT, type: Optional[str] = "all"):
+    """Everything the app needs for its first render in one round trip.
+
+    ``include`` lists the sub-queries to run. Prices and valuation come from
+    the same snapshot, whose ``version`` is returned; a failing sub-query is
+    reported under ``errors`` instead of failing the whole response.
+    """
+    wanted = {name.strip() for name in include.split(",") if name.strip()}
+    unknown = wanted - set(BOOTSTRAP_QUERIES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sub-queries: {', '.join(sorted(unknown))}")
+    
+    async def load_portfolio():
+        with mongo_operation_duration.time("portfolio", "find"):
+            return await db.portfolio.find({"userId": "default"}).to_list(1000)
+    
+    async def load_prices():
+        prices_data = harem_api_service.get_all_prices()
+        if not prices_data.get("fallback"):
+            await price_history.record_snapshot(prices_data)
+        return prices_data
+    
+    # The portfolio query is started first so Mongo works while the price refresh runs
+    queries = {}
+    if wanted & {"portfolio", "valuation"}:
+        queries["portfolio"] = load_portfolio()
+    if wanted & {"prices", "valuation"}:
+        queries["prices"] = load_prices()
+    results = dict(zip(queries, await asyncio.gather(*queries.values(), return_exceptions=True)))
+    
+    response = {"lastUpdate": datetime.utcnow().isoformat(), "version": None, "errors": {}}
+    for name, value in results.items():
+        if isinstance(value, Exception):
+            logger.error("Error loading bootstrap %s: %s", name, value)
+            response["errors"][name] = str(value)
+    
+    prices_data = results.get("prices")
+    items = results.get("portfolio")
+    if isinstance(prices_data, dict):
+        response["version"] = prices_data.get("version")
+        if "prices" in wanted:
+            response["prices"] = {
+                category: prices_data.get(category, [])
+                for category in ("gold", "currency") if type in ("all", category)
+            }
+    if isinstance(items, list):
+        if "portfolio" in wanted:
+            response["portfolio"] = [PortfolioItem(**item) for item in items]
+        if "valuation" in wanted and isinstance(prices_data, dict):
+            response["valuation"] = value_holdings(items, prices_data)
+    return response
+
 # Portfolio Management
 @api_router.post("/portfolio", response_model=PortfolioItem)
 async def create_portfolio_item(item: PortfolioItemCreate):
     """Create new portfolio item"""
     try:
         portfolio_item = PortfolioItem(**item.dict())
-        await db.portfolio.insert_one(portfolio_item.dict())
+        with mongo_operation_duration.time("portfolio", "insert_one"):
+            await db.portfolio.insert_one(portfolio_item.dict())
+        await update_exposure(house_exposure.record_create(portfolio_item.dict()))
         return portfolio_item
     except Exception as e:
-        logging.error(f"Error creating portfolio item: {str(e)}")
+        logger.error("Error creating portfolio item: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/portfolio", response_model=List[PortfolioItem])
 async def get_portfolio():
     """Get all portfolio items"""
     try:
-        items = await db.portfolio.find({"userId": "default"}).to_list(1000)
+        with mongo_operation_duration.time("portfolio", "find"):
+            items = await db.portfolio.find({"userId": "default"}).to_list(1000)
         return [PortfolioItem(**item) for item in items]
     except Exception as e:
-        logging.error(f"Error fetching portfolio: {str(e)}")
+        logger.error("Error fetching portfolio: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/portfolio/performance")
+async def get_portfolio_performance(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = "1h"
+):
+    """Get portfolio value, cost and profit over time from stored price history"""
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    
+    try:
+        with mongo_operation_duration.time("portfolio", "find"):
+            items = await db.portfolio.find({"userId": "default"}).to_list(1000)
+        end = _as_utc(end) if end else datetime.utcnow()
+        result = {"resolution": resolution}
+        if not items:
+            return {**result, "timestamps": [], "value": [], "cost": [], "profit": [], "profitPercentage": []}
+        
+        start = _as_utc(start) if start else min(item["createdAt"] for item in items)
+        step_ms = RESOLUTIONS[resolution]
+        if start > end or (end - start).total_seconds() * 1000 / step_ms > MAX_POINTS:
+            raise HTTPException(status_code=400, detail=f"Requested range must be ordered and span at most {MAX_POINTS} points")
+        
+        instruments = {instrument_key(item["type"], item["name"]) for item in items}
+        series = await price_history.load_series(instruments, start, end)
+        start_ms = int(start.replace(tzinfo=timezone.utc).timestamp() * 1000)
+        end_ms = int(end.replace(tzinfo=timezone.utc).timestamp() * 1000)
+        return {**result, **compute_performance(items, series, start_ms, end_ms, step_ms)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error computing portfolio performance: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/portfolio/risk")
+async def get_portfolio_risk(days: int = DEFAULT_LOOKBACK_DAYS):
+    """Get historical value-at-risk, volatility and max drawdown for the portfolio"""
+    if not 2 <= days <= 3650:
+        raise HTTPException(status_code=400, detail="days must be between 2 and 3650")
+    
+    try:
+        with mongo_operation_duration.time("portfolio", "find"):
+            items = await db.portfolio.find({"userId": "default"}).to_list(1000)
+        keys = sorted({instrument_key(item["type"], item["name"]) for item in items})
+        model = await load_model(price_history, keys, days)
+        result = model.evaluate(model.quantity_matrix([items]))
+        return {"lookbackDays": days, **risk_report(result, 0)}
+    except Exception as e:
+        logger.error("Error computing portfolio risk: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.put("/portfolio/{item_id}", response_model=PortfolioItem)
@@ -82,56 +414,166 @@ async def update_portfolio_item(item_id: str, update: PortfolioItemUpdate):
         update_data = {k: v for k, v in update.dict().items() if v is not None}
         update_data["updatedAt"] = datetime.utcnow()
         
-        result = await db.portfolio.find_one_and_update(
-            {"id": item_id, "userId": "default"},
-            {"$set": update_data},
-            return_document=True
-        )
+        # The previous document is returned so the exposure totals can be adjusted by the difference
+        with mongo_operation_duration.time("portfolio", "find_one_and_update"):
+            before = await db.portfolio.find_one_and_update(
+                {"id": item_id, "userId": "default"},
+                {"$set": update_data},
+                return_document=False
+            )
         
-        if not result:
+        if not before:
             raise HTTPException(status_code=404, detail="Portfolio item not found")
         
+        result = {**before, **update_data}
+        await update_exposure(house_exposure.record_update(before, result))
         return PortfolioItem(**result)
     except HTTPException:
         raise
     except Exception as e:
-        logging.error(f"Error updating portfolio item: {str(e)}")
+        logger.error("Error updating portfolio item: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.delete("/portfolio/{item_id}")
 async def delete_portfolio_item(item_id: str):
     """Delete portfolio item"""
     try:
-        result = await db.portfolio.delete_one({"id": item_id, "userId": "default"})
+        with mongo_operation_duration.time("portfolio", "find_one_and_delete"):
+            deleted = await db.portfolio.find_one_and_delete({"id": item_id, "userId": "default"})
         
-        if result.deleted_count == 0:
+        if not deleted:
             raise HTTPException(status_code=404, detail="Portfolio item not found")
         
+        await update_exposure(house_exposure.record_delete(deleted))
         return {"message": "Portfolio item deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        logging.error(f"Error deleting portfolio item: {str(e)}")
+        logger.error("Error deleting portfolio item: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Alerts
+@api_router.post("/alerts/backtest")
+async def backtest_alerts(request: AlertBacktestRequest):
+    """Replay above/below alert rules against recorded prices and report when they would have fired"""
+    end = _as_utc(request.end) if request.end else datetime.utcnow()
+    start = _as_utc(request.start) if request.start else end - timedelta(days=30)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    try:
+        rules = [rule.dict() for rule in request.rules]
+        instruments = {instrument_key(rule["type"], rule["name"]) for rule in rules}
+        series = await price_history.load_series(instruments, start, end)
+        start_ms = int(start.replace(tzinfo=timezone.utc).timestamp() * 1000)
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "results": run_backtest(rules, series, start_ms, request.maxTriggers)
+        }
+    except Exception as e:
+        logger.error("Error backtesting alerts: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+# Admin
+@api_router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """List the most recent request profiles"""
+    from profiling import profile_store
+    return profile_store.list()
+
+@api_router.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: int, format: str = "pstats"):
+    """Download a request profile as .pstats, or as a text report with format=text"""
+    from profiling import profile_store
+    record = profile_store.get(profile_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "text":
+        return PlainTextResponse(record.text())
+    return Response(
+        record.stats,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.pstats"'}
+    )
+
+@api_router.get("/admin/exposure", dependencies=[Depends(require_admin)])
+async def get_house_exposure():
+    """Total quantity, cost basis and holders per instrument across all portfolios"""
+    try:
+        instruments = await house_exposure.exposure()
+    except Exception as e:
+        logger.error("Error fetching house exposure: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"instruments": instruments}
+
+@api_router.post("/admin/exposure/reconcile", dependencies=[Depends(require_admin)])
+async def reconcile_exposure():
+    """Correct the house exposure totals from a full portfolio scan and report the drift"""
+    try:
+        drift = await house_exposure.reconcile(db.portfolio)
+    except Exception as e:
+        logger.error("Error reconciling house exposure: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"drift": drift}
+
+# Prometheus scrape endpoint, outside the /api prefix
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+# Probes, outside the /api prefix
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the process is up and serving"""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: warmup loaded live prices and MongoDB answers; 503 otherwise.
+
+    The snapshot only gates the first warmup. A later upstream outage is
+    reported in ``snapshot`` but keeps the worker in rotation, since every
+    worker would go stale at once and fallback prices still serve.
+    """
+    checks = {
+        "warm": app.state.ready,
+        "snapshot": harem_api_service.snapshot_state(),
+    }
+    try:
+        await asyncio.wait_for(db.command("ping"), READINESS_TIMEOUT)
+        checks["mongo"] = True
+    except Exception:
+        checks["mongo"] = False
+    ready = checks["warm"] and checks["mongo"]
+    return JSONResponse({"status": "ready" if ready else "not ready", **checks}, status_code=200 if ready else 503)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+# Innermost, so shed responses still get CORS headers and show up in request metrics
+if ADMISSION_CONTROL:
+    app.add_middleware(AdmissionMiddleware, lanes=admission_lanes)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+app.add_middleware(MetricsMiddleware)
+# Only installed when enabled, so disabled profiling adds no per-request work
+if PROFILING:
+    from profiling import ProfilingMiddleware, profile_store
+    app.add_middleware(ProfilingMiddleware, store=profile_store, sample_rate=PROFILE_SAMPLE_RATE, admin_token=ADMIN_TOKEN)
+# Outermost, so every log record written while handling a request carries its id
+app.add_middleware(RequestIdMiddleware)
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+setup_logging(
+    level=os.environ.get('LOG_LEVEL', 'INFO'),
+    fmt=os.environ.get('LOG_FORMAT', 'json'),
+    rate_limit=os.environ.get('LOG_RATE_LIMIT', '5/60'),
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+Single chokepoint for upstream price API calls.
+
+UPSTREAM_MODE selects how calls are served:
+
+- ``live`` (default): plain HTTP GET
+- ``record``: live GET, with every response appended to UPSTREAM_ARCHIVE
+- ``replay``: responses come from UPSTREAM_ARCHIVE instead of the network,
+  played back UPSTREAM_REPLAY_SPEED times faster than recorded (0 steps
+  through the recording one response per call)
+"""
+
+import atexit
+import os
+import time
+
+import requests
+
+from metrics import upstream_errors, upstream_request_duration
+from upstream_archive import UpstreamRecorder, UpstreamReplayer
+
+_recorder = None
+_replayer = None
+
+
+def configure(mode: str = 'live', archive: str = '', speed: float = 1.0):
+    """Switch between live, record and replay mode"""
+    global _recorder, _replayer
+    if _recorder is not None:
+        _recorder.close()
+    _recorder = _replayer = None
+
+    if mode == 'record':
+        _recorder = UpstreamRecorder(archive)
+    elif mode == 'replay':
+        _replayer = UpstreamReplayer(archive, speed)
+    elif mode != 'live':
+        raise ValueError(f"Unknown UPSTREAM_MODE '{mode}'")
+    return _replayer
+
+
+def clock() -> float:
+    """Wall time, or the replay time when replaying (see UpstreamReplayer.clock)"""
+    return _replayer.clock if _replayer is not None else time.time()
+
+
+def fetch(source: str, url: str, **kwargs) -> requests.Response:
+    """GET an upstream price API, recording latency and failures under ``source``"""
+    started = time.perf_counter()
+    try:
+        if _replayer is not None:
+            response = _replayer.response(source, url)
+        else:
+            response = requests.get(url, **kwargs)
+    except Exception as e:
+        upstream_errors.inc(source, type(e).__name__)
+        raise
+    finally:
+        upstream_request_duration.observe(time.perf_counter() - started, source)
+    if _recorder is not None:
+        _recorder.record(source, url, response.status_code, response.text)
+    if response.status_code != 200:
+        upstream_errors.inc(source, f'http_{response.status_code}')
+    return response
+
+
+if os.environ.get('UPSTREAM_MODE', 'live') != 'live':
+    configure(
+        os.environ['UPSTREAM_MODE'],
+        os.environ.get('UPSTREAM_ARCHIVE', 'upstream_archive.jsonl.gz'),
+        float(os.environ.get('UPSTREAM_REPLAY_SPEED', '1')),
+    )
+    atexit.register(lambda: _recorder is not None and _recorder.close())
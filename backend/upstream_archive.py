@@ -0,0 +1,116 @@
+"""
+On-disk archive of raw upstream responses for record/replay.
+
+The archive is gzip-compressed JSON lines, one record per upstream call:
+``{"t": <epoch seconds>, "source": ..., "url": ..., "status": ..., "body": ...}``.
+Each recording session appends a new gzip member, so archives from several
+runs can simply be concatenated.
+"""
+
+import bisect
+import gzip
+import json
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+
+def read_archive(path: str) -> Iterator[Dict]:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class ReplayResponse:
+    """The slice of requests.Response the price services use"""
+
+    __slots__ = ('status_code', 'text', 'recorded_at')
+
+    def __init__(self, status_code: int, text: str, recorded_at: float):
+        self.status_code = status_code
+        self.text = text
+        self.recorded_at = recorded_at
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class UpstreamRecorder:
+    """Appends every live upstream response to the archive"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def record(self, source: str, url: str, status: int, body: str, t: Optional[float] = None):
+        line = json.dumps({
+            't': time.time() if t is None else t,
+            'source': source,
+            'url': url,
+            'status': status,
+            'body': body,
+        }, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class UpstreamReplayer:
+    """Serves recorded responses per source in place of the live upstreams.
+
+    With ``speed > 0`` the recording plays back on a virtual clock running
+    ``speed`` times faster than wall time, and each call gets the latest
+    response recorded at or before that instant. With ``speed == 0`` every
+    call simply advances to the next recorded response of its source, so a
+    whole market day can be pushed through as fast as the services go.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0):
+        self.speed = speed
+        self._records: Dict[str, List[Dict]] = {}
+        for record in read_archive(path):
+            self._records.setdefault(record['source'], []).append(record)
+        for records in self._records.values():
+            records.sort(key=lambda record: record['t'])
+        self._times = {source: [record['t'] for record in records] for source, records in self._records.items()}
+        self.start = min((times[0] for times in self._times.values() if times), default=0.0)
+        self.end = max((times[-1] for times in self._times.values() if times), default=0.0)
+        self._cursors = {source: 0 for source in self._records}
+        self._wall_start = time.monotonic()
+        self._stepped_to = self.start
+        self._lock = threading.Lock()
+
+    @property
+    def clock(self) -> float:
+        """Current replay time: the virtual clock, or the last response served when stepping"""
+        if self.speed > 0:
+            return self.start + (time.monotonic() - self._wall_start) * self.speed
+        return self._stepped_to
+
+    def __len__(self) -> int:
+        return sum(len(records) for records in self._records.values())
+
+    def remaining(self, source: str) -> int:
+        return len(self._records.get(source, ())) - self._cursors.get(source, 0)
+
+    def response(self, source: str, url: str) -> ReplayResponse:
+        records = self._records.get(source)
+        if not records:
+            raise LookupError(f"No recorded responses for upstream '{source}'")
+
+        with self._lock:
+            if self.speed > 0:
+                index = max(bisect.bisect_right(self._times[source], self.clock) - 1, 0)
+            else:
+                index = min(self._cursors[source], len(records) - 1)
+                self._cursors[source] = index + 1
+                self._stepped_to = max(self._stepped_to, records[index]['t'])
+            record = records[index]
+
+        return ReplayResponse(record['status'], record['body'], record['t'])
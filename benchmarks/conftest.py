@@ -0,0 +1,22 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+BENCH_DIR = Path(__file__).parent
+BACKEND_DIR = BENCH_DIR.parent / 'backend'
+
+# Backend modules import each other as top-level modules (see server.py)
+sys.path.insert(0, str(BACKEND_DIR))
+
+from fake_upstream import load_payload  # noqa: E402
+
+
+@pytest.fixture
+def harem_payload():
+    return load_payload('harem_regular_session.json')['data']
+
+
+@pytest.fixture
+def harem_malformed_payload():
+    return load_payload('harem_malformed_values.json')['data']
@@ -0,0 +1,189 @@
+"""
+In-memory stand-in for the subset of Motor used by the backend routes.
+
+Only meant for offline load tests: filters support equality and the
+$in/$gt/$gte/$lt/$lte operators, updates support $set/$inc/$setOnInsert/
+$min/$max, and bulk_write takes pymongo UpdateOne requests. Pass
+--mongo-url to the load test to use a real server instead.
+"""
+
+import copy
+import itertools
+from types import SimpleNamespace
+
+_ids = itertools.count(1)
+
+_OPERATORS = {
+    '$in': lambda value, arg: value in arg,
+    '$gt': lambda value, arg: value is not None and value > arg,
+    '$gte': lambda value, arg: value is not None and value >= arg,
+    '$lt': lambda value, arg: value is not None and value < arg,
+    '$lte': lambda value, arg: value is not None and value <= arg,
+}
+
+
+def _matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict) and condition and all(key.startswith('$') for key in condition):
+            if not all(_OPERATORS[op](value, arg) for op, arg in condition.items()):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection:
+        return copy.copy(doc)
+    included = [field for field, flag in projection.items() if flag and field != '_id']
+    if included:
+        result = {field: doc[field] for field in included if field in doc}
+        if projection.get('_id', 1) and '_id' in doc:
+            result['_id'] = doc['_id']
+        return result
+    return {field: value for field, value in doc.items() if projection.get(field, 1)}
+
+
+def _apply_update(doc, update, inserted):
+    for field, value in update.get('$set', {}).items():
+        doc[field] = value
+    for field, value in update.get('$inc', {}).items():
+        doc[field] = doc.get(field, 0) + value
+    for field, value in update.get('$min', {}).items():
+        doc[field] = value if field not in doc else min(doc[field], value)
+    for field, value in update.get('$max', {}).items():
+        doc[field] = value if field not in doc else max(doc[field], value)
+    if inserted:
+        for field, value in update.get('$setOnInsert', {}).items():
+            doc[field] = value
+
+
+class FakeCursor:
+    def __init__(self, docs, projection):
+        self._docs = docs
+        self._projection = projection
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            self._docs.sort(key=lambda doc: doc.get(field), reverse=order < 0)
+        return self
+
+    def limit(self, n):
+        if n:
+            self._docs = self._docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        docs = self._docs if length is None else self._docs[:length]
+        return [_project(doc, self._projection) for doc in docs]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._docs:
+            yield _project(doc, self._projection)
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self.docs = []
+        self.indexes = {}
+
+    async def create_index(self, keys, **kwargs):
+        name = '_'.join(f'{field}_{direction}' for field, direction in keys)
+        self.indexes[name] = {'key': list(keys), **kwargs}
+        return name
+
+    async def index_information(self):
+        return copy.deepcopy(self.indexes)
+
+    async def drop_index(self, name):
+        del self.indexes[name]
+
+    async def insert_one(self, doc):
+        doc.setdefault('_id', next(_ids))
+        self.docs.append(copy.copy(doc))
+        return SimpleNamespace(inserted_id=doc['_id'])
+
+    async def insert_many(self, docs, ordered=True):
+        for doc in docs:
+            await self.insert_one(doc)
+        return SimpleNamespace(inserted_ids=[doc['_id'] for doc in docs])
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([doc for doc in self.docs if _matches(doc, query or {})], projection)
+
+    async def find_one(self, query=None, projection=None, sort=None):
+        cursor = self.find(query, projection)
+        if sort:
+            cursor.sort(sort)
+        docs = await cursor.to_list(1)
+        return docs[0] if docs else None
+
+    async def count_documents(self, query):
+        return sum(1 for doc in self.docs if _matches(doc, query))
+
+    async def find_one_and_update(self, query, update, return_document=False, upsert=False, projection=None):
+        for doc in self.docs:
+            if _matches(doc, query):
+                before = copy.copy(doc)
+                _apply_update(doc, update, inserted=False)
+                return _project(doc if return_document else before, projection)
+        if not upsert:
+            return None
+        doc = {field: value for field, value in query.items() if not isinstance(value, dict)}
+        _apply_update(doc, update, inserted=True)
+        await self.insert_one(doc)
+        return _project(doc, projection) if return_document else None
+
+    async def update_one(self, query, update, upsert=False):
+        before = len(self.docs)
+        result = await self.find_one_and_update(query, update, upsert=upsert)
+        return SimpleNamespace(matched_count=int(result is not None), upserted_id=None if len(self.docs) == before else self.docs[-1]['_id'])
+
+    async def bulk_write(self, requests, ordered=True):
+        matched = upserted = 0
+        for request in requests:
+            result = await self.update_one(request._filter, request._doc, upsert=request._upsert)
+            matched += result.matched_count
+            upserted += result.upserted_id is not None
+        return SimpleNamespace(matched_count=matched, modified_count=matched, upserted_count=upserted)
+
+    async def find_one_and_delete(self, query, projection=None):
+        for i, doc in enumerate(self.docs):
+            if _matches(doc, query):
+                del self.docs[i]
+                return _project(doc, projection)
+        return None
+
+    async def delete_one(self, query):
+        deleted = await self.find_one_and_delete(query)
+        return SimpleNamespace(deleted_count=int(deleted is not None))
+
+    async def delete_many(self, query):
+        kept = [doc for doc in self.docs if not _matches(doc, query)]
+        deleted = len(self.docs) - len(kept)
+        self.docs = kept
+        return SimpleNamespace(deleted_count=deleted)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, name, *args, **kwargs):
+        return {'ok': 1}
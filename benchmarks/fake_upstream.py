@@ -0,0 +1,93 @@
+"""
+Local HTTP stand-in for the Harem, exchangerate and gold-api upstreams.
+
+Serves the recorded payloads from benchmarks/payloads with configurable
+latency and failure injection.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PAYLOAD_DIR = Path(__file__).parent / 'payloads'
+
+ROUTES = {
+    '/harem_altin/prices': 'harem_regular_session.json',
+    '/v4/latest/USD': 'exchangerate_usd.json',
+    '/price/XAU': 'gold_api_xau.json',
+}
+
+
+def load_payload(name: str):
+    """Load a recorded upstream payload from benchmarks/payloads"""
+    with open(PAYLOAD_DIR / name, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class FakeUpstream:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, failure_rate: float = 0.0, host: str = '127.0.0.1', port: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.failures = 0
+        self._bodies = {path: (PAYLOAD_DIR / name).read_bytes() for path, name in ROUTES.items()}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def env(self) -> dict:
+        """Environment variables pointing the backend services at this server"""
+        return {
+            'RAPIDAPI_BASE_URL': self.url,
+            'EXCHANGERATE_API_URL': f'{self.url}/v4/latest/USD',
+            'GOLD_API_URL': f'{self.url}/price/XAU',
+        }
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                upstream.requests += 1
+                delay = upstream.latency_ms + random.uniform(-upstream.jitter_ms, upstream.jitter_ms)
+                if delay > 0:
+                    time.sleep(delay / 1000)
+
+                body = upstream._bodies.get(self.path.split('?')[0])
+                if body is None:
+                    self._reply(404, b'{"message": "not found"}')
+                elif random.random() < upstream.failure_rate:
+                    upstream.failures += 1
+                    self._reply(503, json.dumps({'success': False, 'message': 'injected failure'}).encode())
+                else:
+                    self._reply(200, body)
+
+            def _reply(self, status, body):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'FakeUpstream':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
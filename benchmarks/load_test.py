@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the backend API.
+
+Starts ``server.app`` under uvicorn against a local fake upstream (see
+fake_upstream.py) and an in-memory Mongo stand-in (or a real server with
+--mongo-url), drives concurrent load on /api/prices and the portfolio CRUD
+routes and reports throughput and p50/p95/p99 latency per route.
+
+    python benchmarks/load_test.py --duration 10 --concurrency 32
+    python benchmarks/load_test.py --save-baseline     # record a new baseline
+    python benchmarks/load_test.py --compare           # exit 1 on regression
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import socket
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent
+BACKEND_DIR = BENCH_DIR.parent / 'backend'
+BASELINE_FILE = BENCH_DIR / 'baselines' / 'load_baseline.json'
+
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+from fake_upstream import FakeUpstream  # noqa: E402
+
+SCENARIOS = ('prices', 'portfolio')
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(q / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _serve(env: dict, mongo_url: str, port: int):
+    """Child process entry point: wire the stand-ins into server.app and run uvicorn"""
+    os.environ.update(env)
+    import uvicorn
+    import server
+
+    if not mongo_url:
+        # The lifespan handler only connects to Mongo when no database was injected
+        from fake_mongo import FakeDatabase
+        server.db = FakeDatabase()
+
+    uvicorn.run(server.app, host='127.0.0.1', port=port, log_level='warning', access_log=False)
+
+
+def start_backend(args, upstream: FakeUpstream):
+    """Serve server.app from a separate process so the load generator does not share its GIL"""
+    env = {
+        **upstream.env(),
+        'MONGO_URL': args.mongo_url or os.environ.get('MONGO_URL', 'mongodb://127.0.0.1:1'),
+        'DB_NAME': os.environ.get('DB_NAME', 'berkay_altin_loadtest'),
+        'PRICE_SNAPSHOT_TTL': str(args.snapshot_ttl),
+    }
+    port = _free_port()
+    process = multiprocessing.get_context('spawn').Process(target=_serve, args=(env, args.mongo_url, port), daemon=True)
+    process.start()
+
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            with urllib.request.urlopen(f'{base_url}/readyz', timeout=1):
+                return process, base_url
+        except OSError:
+            if time.monotonic() > deadline or not process.is_alive():
+                process.terminate()
+                raise RuntimeError('backend did not start')
+            time.sleep(0.1)
+
+
+async def _prices(client, record):
+    for params in ({'type': 'all'}, {'type': 'gold'}, {'type': 'currency'}):
+        await record('GET /api/prices', client.get('/api/prices', params=params))
+
+
+async def _portfolio(client, record):
+    item = {'type': 'gold', 'name': 'GRAM ALTIN', 'nameEn': 'GRAM GOLD', 'quantity': 10, 'buyPrice': 5650.0}
+    created = await record('POST /api/portfolio', client.post('/api/portfolio', json=item))
+    await record('GET /api/portfolio', client.get('/api/portfolio'))
+    if created is not None and created.status_code == 200:
+        item_id = created.json()['id']
+        await record('PUT /api/portfolio/{item_id}', client.put(f'/api/portfolio/{item_id}', json={'quantity': 12}))
+        await record('DELETE /api/portfolio/{item_id}', client.delete(f'/api/portfolio/{item_id}'))
+
+
+async def drive(base_url: str, scenarios, concurrency: int, duration: float):
+    import httpx
+
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    latencies = {}
+    errors = {}
+    deadline = time.perf_counter() + duration
+    flows = [_prices if name == 'prices' else _portfolio for name in scenarios]
+
+    async def record(route, request):
+        started = time.perf_counter()
+        try:
+            response = await request
+        except Exception:
+            errors[route] = errors.get(route, 0) + 1
+            return None
+        latencies.setdefault(route, []).append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors[route] = errors.get(route, 0) + 1
+        return response
+
+    async def worker(n):
+        flow = flows[n % len(flows)]
+        while time.perf_counter() < deadline:
+            await flow(client, record)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    report = {}
+    for route, values in sorted(latencies.items()):
+        values.sort()
+        report[route] = {
+            'requests': len(values),
+            'errors': errors.get(route, 0),
+            'throughput': round(len(values) / elapsed, 1),
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"{'route':<34}{'req':>8}{'err':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, row in report.items():
+        print(f"{route:<34}{row['requests']:>8}{row['errors']:>6}{row['throughput']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+
+
+def compare(report, baseline, tolerance):
+    """Routes whose p95 grew or throughput dropped by more than ``tolerance``"""
+    regressions = []
+    for route, row in report.items():
+        base = baseline.get('routes', {}).get(route)
+        if not base:
+            continue
+        if row['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{route}: p95 {row['p95_ms']}ms vs baseline {base['p95_ms']}ms")
+        if row['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{route}: {row['throughput']} req/s vs baseline {base['throughput']} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load per run')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--scenario', choices=SCENARIOS + ('all',), default='all')
+    parser.add_argument('--upstream-latency-ms', type=float, default=50.0)
+    parser.add_argument('--upstream-jitter-ms', type=float, default=10.0)
+    parser.add_argument('--upstream-failure-rate', type=float, default=0.0)
+    parser.add_argument('--snapshot-ttl', type=float, default=5.0, help='PRICE_SNAPSHOT_TTL for the backend')
+    parser.add_argument('--mongo-url', help='use a real MongoDB instead of the in-memory stand-in')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true', help='fail when results regress against the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression')
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(args.upstream_latency_ms, args.upstream_jitter_ms, args.upstream_failure_rate).start()
+    scenarios = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+    try:
+        process, base_url = start_backend(args, upstream)
+        try:
+            report = asyncio.run(drive(base_url, scenarios, args.concurrency, args.duration))
+        finally:
+            process.terminate()
+            process.join(timeout=10)
+    finally:
+        upstream.stop()
+
+    print_report(report)
+    print(f"upstream: {upstream.requests} requests, {upstream.failures} injected failures")
+
+    result = {
+        'settings': {key: value for key, value in vars(args).items() if key not in ('baseline', 'save_baseline', 'compare')},
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'routes': report,
+    }
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(result, indent=2) + '\n')
+        print(f"baseline saved to {args.baseline}")
+    if args.compare:
+        regressions = compare(report, json.loads(args.baseline.read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("no regressions against baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+Alert backtest timings for thousands of rules over months of minute ticks.
+"""
+
+import numpy as np
+
+from alert_backtest import run_backtest
+from price_history import PriceSeries
+
+N_TICKS = 90 * 24 * 60  # three months of one-minute ticks
+N_RULES = 5000
+
+
+def _market():
+    rng = np.random.default_rng(11)
+    ts = np.arange(N_TICKS, dtype=np.int64) * 60_000
+    sell = np.round(5800 + np.cumsum(rng.normal(0, 2.0, N_TICKS)), 2)
+    series = {'gold:GRAM ALTIN': PriceSeries(ts, sell - 50, sell)}
+    rules = [
+        {'type': 'gold', 'name': 'GRAM ALTIN', 'condition': str(condition), 'targetPrice': float(target)}
+        for condition, target in zip(
+            rng.choice(['above', 'below'], N_RULES),
+            np.round(rng.uniform(sell.min(), sell.max(), N_RULES), 2),
+        )
+    ]
+    return series, rules
+
+
+def test_backtest_5000_rules(benchmark):
+    series, rules = _market()
+    results = benchmark.pedantic(run_backtest, args=(rules, series, 0, 10), rounds=3, iterations=1)
+    if benchmark.stats is not None:
+        benchmark.extra_info['rules'] = N_RULES
+        benchmark.extra_info['ticks'] = N_TICKS
+    assert len(results) == N_RULES
@@ -0,0 +1,47 @@
+"""
+Parse benchmarks for recorded Harem payloads.
+"""
+
+from price_normalizer import normalize_harem_payload
+
+
+def _report_us(benchmark, parses, rows):
+    if benchmark.stats is None:  # --benchmark-disable
+        return
+    median = benchmark.stats.stats.median
+    benchmark.extra_info['us_per_parse'] = round(median * 1e6 / parses, 2)
+    benchmark.extra_info['us_per_row'] = round(median * 1e6 / (parses * rows), 3)
+
+
+def test_parse_regular_session(benchmark, harem_payload):
+    result = benchmark(normalize_harem_payload, harem_payload)
+    _report_us(benchmark, 1, len(harem_payload))
+
+    assert len(result.gold) == 14
+    assert len(result.currency) == 2
+    assert result.errors == []
+    has_altin = result.gold[0]
+    assert (has_altin['name'], has_altin['buy'], has_altin['sell'], has_altin['change']) == ('HAS ALTIN', 5807.5, 5858.7, 0.74)
+    assert result.currency[0]['buy'] == 137020.0
+
+
+def test_parse_malformed_values(benchmark, harem_malformed_payload):
+    result = benchmark(normalize_harem_payload, harem_malformed_payload)
+    _report_us(benchmark, 1, len(harem_malformed_payload))
+
+    assert sorted((e.key, e.field) for e in result.errors) == [
+        ('22 AYAR', 'sell'), ('EUR/KG', 'buy'), ('ONS', 'buy'), ('YENİ ATA', 'percent'),
+    ]
+    names = [row['name'] for row in result.gold + result.currency]
+    assert 'ONS' not in names and 'ATA ALTIN' not in names
+    assert all(row['buy'] > 0 and row['sell'] > 0 for row in result.gold + result.currency)
+
+
+def test_parse_full_day_batch(benchmark, harem_payload):
+    # One refresh every 5 seconds over a 10 hour trading session
+    day = [harem_payload] * 7200
+    parsed = benchmark.pedantic(lambda: [normalize_harem_payload(p) for p in day], rounds=5, iterations=1)
+    _report_us(benchmark, len(day), len(harem_payload))
+
+    assert len(parsed) == len(day)
+    assert all(len(result.gold) == 14 and len(result.currency) == 2 and not result.errors for result in parsed)
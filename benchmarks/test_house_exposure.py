@@ -0,0 +1,28 @@
+"""
+House exposure totals: reading them does not depend on the portfolio size.
+"""
+
+import asyncio
+import random
+
+from fake_mongo import FakeDatabase
+from house_exposure import HouseExposure
+
+INSTRUMENTS = [('gold', 'GRAM ALTIN'), ('gold', 'ÇEYREK ALTIN'), ('gold', 'HAS ALTIN'), ('currency', 'USD'), ('currency', 'EUR')]
+N_ITEMS = 5000
+
+
+def test_exposure_read(benchmark):
+    db = FakeDatabase()
+    exposure = HouseExposure(db.house_exposure, db.house_exposure_holders)
+    rng = random.Random(7)
+
+    async def seed():
+        for _ in range(N_ITEMS):
+            type, name = rng.choice(INSTRUMENTS)
+            await exposure.record_create({'userId': f'user-{rng.randrange(500)}', 'type': type, 'name': name,
+                                          'quantity': rng.uniform(0.5, 50), 'buyPrice': rng.uniform(30, 6000)})
+
+    asyncio.run(seed())
+    rows = benchmark(lambda: asyncio.run(exposure.exposure()))
+    assert len(rows) == len(INSTRUMENTS) and sum(row['lots'] for row in rows) == N_ITEMS
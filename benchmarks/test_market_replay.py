@@ -0,0 +1,129 @@
+"""
+Refresh, history ingestion and alert evaluation over a replayed market day.
+
+Uses the upstream archive at MARKET_DAY_ARCHIVE when set (recorded with
+UPSTREAM_MODE=record), otherwise synthesizes a session of one-minute Harem
+and exchangerate responses from the payloads in benchmarks/payloads.
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import harem_api_service
+import upstream
+from alert_backtest import run_backtest
+from fake_upstream import load_payload
+from fake_mongo import FakeDatabase
+from harem_api_service import HaremAPIService
+from price_history import PriceHistoryRepository
+from price_stats import PriceStatsTracker
+from upstream_archive import UpstreamRecorder
+
+SESSION_START = datetime(2025, 12, 1, 7, 0)  # 10:00 Istanbul
+SESSION_MINUTES = 8 * 60
+N_RULES = 2000
+
+
+def _format_tr(value: float) -> str:
+    return f'{value:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def _synthesize(path):
+    harem = load_payload('harem_regular_session.json')
+    rates = load_payload('exchangerate_usd.json')
+    base = {row['key']: float(row['sell'].replace('.', '').replace(',', '.')) for row in harem['data']}
+
+    rng = np.random.default_rng(3)
+    drift = np.exp(np.cumsum(rng.normal(0, 0.0005, SESSION_MINUTES)))
+    recorder = UpstreamRecorder(str(path))
+    for minute, factor in enumerate(drift):
+        t = (SESSION_START + timedelta(minutes=minute)).timestamp()
+        rows = []
+        for row in harem['data']:
+            sell = base[row['key']] * factor
+            rows.append({**row, 'buy': _format_tr(sell * 0.995), 'sell': _format_tr(sell)})
+        recorder.record('harem', 'replay://harem', 200, json.dumps({'success': True, 'data': rows}, ensure_ascii=False), t)
+        fx = {**rates, 'rates': {**rates['rates'], 'TRY': round(rates['rates']['TRY'] * factor, 4)}}
+        recorder.record('exchangerate', 'replay://exchangerate', 200, json.dumps(fx), t + 0.5)
+    recorder.close()
+
+
+@pytest.fixture(scope='module')
+def market_day(tmp_path_factory):
+    if os.environ.get('MARKET_DAY_ARCHIVE'):
+        return os.environ['MARKET_DAY_ARCHIVE']
+    path = tmp_path_factory.mktemp('replay') / 'market_day.jsonl.gz'
+    _synthesize(path)
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(harem_api_service, 'price_stats', PriceStatsTracker())
+    yield
+    upstream.configure('live')
+
+
+def _refresh_day(archive):
+    """Replay every recorded Harem response through the service, as fast as it goes"""
+    replayer = upstream.configure('replay', archive, speed=0)
+    service = HaremAPIService()
+    service.fx.background = False
+    snapshots = []
+    while replayer.remaining('harem'):
+        # Stepping serves one recorded response per fetch; the TTLs run on wall time, so step Harem explicitly
+        service.harem.refresh()
+        snapshots.append((service.get_all_prices(), datetime.utcfromtimestamp(upstream.clock())))
+    return snapshots
+
+
+def _ingest(snapshots):
+    history = PriceHistoryRepository(FakeDatabase().price_history, record_interval=0)
+
+    async def run():
+        for prices, ts in snapshots:
+            await history.record_snapshot(prices, ts)
+        start, end = snapshots[0][1], snapshots[-1][1]
+        keys = {f"{category}:{item['name']}" for prices, _ in snapshots[:1] for category in ('gold', 'currency') for item in prices[category]}
+        return await history.load_series(keys, start, end)
+
+    return asyncio.run(run())
+
+
+def _rules(series):
+    rng = np.random.default_rng(5)
+    rules = []
+    for key, values in series.items():
+        type, name = key.split(':', 1)
+        targets = rng.uniform(values.sell.min(), values.sell.max(), N_RULES // len(series) + 1)
+        rules.extend(
+            {'type': type, 'name': name, 'condition': str(condition), 'targetPrice': round(float(target), 2)}
+            for condition, target in zip(rng.choice(['above', 'below'], len(targets)), targets)
+        )
+    return rules[:N_RULES]
+
+
+def test_replay_refresh(benchmark, market_day):
+    snapshots = benchmark.pedantic(_refresh_day, args=(market_day,), rounds=3, iterations=1)
+    assert snapshots and not any(prices.get('fallback') for prices, _ in snapshots)
+    # Timestamps follow the recording, not the wall clock
+    assert snapshots[-1][1] > snapshots[0][1]
+
+
+def test_replay_history_ingestion(benchmark, market_day):
+    snapshots = _refresh_day(market_day)
+    series = benchmark.pedantic(_ingest, args=(snapshots,), rounds=3, iterations=1)
+    assert all(len(values.ts) == len(snapshots) for values in series.values())
+
+
+def test_replay_alert_evaluation(benchmark, market_day):
+    series = _ingest(_refresh_day(market_day))
+    rules = _rules(series)
+    start_ms = int(next(iter(series.values())).ts[0])
+    results = benchmark(run_backtest, rules, series, start_ms)
+    assert len(results) == len(rules)
@@ -0,0 +1,38 @@
+"""
+Batched risk evaluation timings for 100k synthetic portfolios.
+"""
+
+import numpy as np
+
+from portfolio_risk import RiskModel
+
+N_PORTFOLIOS = 100_000
+N_INSTRUMENTS = 21
+LOOKBACK_DAYS = 365
+
+
+def _model_and_quantities():
+    rng = np.random.default_rng(7)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (N_INSTRUMENTS, LOOKBACK_DAYS + 1)), axis=1))
+    prices[0, :30] = np.nan  # instrument listed late
+    keys = [f'gold:{i}' for i in range(N_INSTRUMENTS)]
+    held = rng.random((N_PORTFOLIOS, N_INSTRUMENTS)) < 0.15
+    quantities = np.where(held, rng.integers(1, 100, held.shape), 0).astype(np.float64)
+    return keys, prices, quantities
+
+
+def test_risk_100k_portfolios(benchmark):
+    keys, prices, quantities = _model_and_quantities()
+
+    def run():
+        model = RiskModel(keys, prices)
+        return model.evaluate(quantities)
+
+    result = benchmark.pedantic(run, rounds=3, iterations=1)
+    if benchmark.stats is not None:
+        benchmark.extra_info['portfolios'] = N_PORTFOLIOS
+        benchmark.extra_info['us_per_portfolio'] = round(benchmark.stats.stats.median * 1e6 / N_PORTFOLIOS, 2)
+
+    assert result['value'].shape == (N_PORTFOLIOS,)
+    assert np.all(result['var99'] >= result['var95'])
+    assert np.all((result['maxDrawdown'] >= 0) & (result['maxDrawdown'] <= 1))
@@ -0,0 +1,29 @@
+"""
+Columnar price archive: year-long range scans.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+from price_archive import PriceArchive
+from price_history import PriceSeries
+
+KEY = 'gold:GRAM ALTIN'
+YEAR_TICKS = 365 * 24 * 60
+
+
+def test_year_scan(benchmark, tmp_path):
+    archive = PriceArchive(tmp_path)
+    ts = np.arange(YEAR_TICKS, dtype=np.int64) * 60_000
+    sell = 5800 + np.cumsum(np.random.default_rng(1).normal(0, 2.0, YEAR_TICKS))
+    archive.append(KEY, PriceSeries(ts, sell - 50, sell))
+    archive.compacted_until = datetime(1971, 1, 1)
+    archive._write_manifest()
+
+    def scan():
+        series = archive.load([KEY], int(ts[1000]), int(ts[-1000]))[KEY]
+        return float(series.sell.max())
+
+    result = benchmark(scan)
+    assert result == float(sell[999:YEAR_TICKS - 999].max())
@@ -0,0 +1,24 @@
+"""
+OHLC rollups: chart reads touch one document per candle whatever the range.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from fake_mongo import FakeDatabase
+from price_rollups import PriceRollups
+
+KEY = 'gold:GRAM ALTIN'
+START = datetime(2025, 12, 1, 6, 58)
+
+
+def test_year_chart(benchmark):
+    db = FakeDatabase()
+    rollups = PriceRollups(db)
+    days = [START.replace(hour=0, minute=0) + timedelta(days=d) for d in range(365)]
+    db.price_rollups_1d.docs.extend(
+        {'instrument': KEY, 'ts': day, 'open': 5800.0, 'high': 5900.0, 'low': 5700.0, 'close': 5850.0} for day in days
+    )
+
+    candles = benchmark(lambda: asyncio.run(rollups.load(KEY, '1d', days[0], days[-1] + timedelta(hours=12))))
+    assert len(candles.ts) == 365
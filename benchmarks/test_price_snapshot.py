@@ -0,0 +1,53 @@
+"""
+Memory per retained price snapshot: API-shaped dict rows vs the compact
+fixed-point PriceSnapshot, plus diffing cost.
+"""
+
+import tracemalloc
+
+from price_normalizer import normalize_harem_payload
+from price_snapshot import PriceSnapshot
+
+RETAINED = 720  # an hour of 5 second refreshes
+
+
+def _prices(harem_payload, tick: int):
+    normalized = normalize_harem_payload(harem_payload)
+    prices = {'gold': normalized.gold, 'currency': normalized.currency}
+    for rows in prices.values():
+        for idx, row in enumerate(rows, 1):
+            row['id'] = idx
+            row['buy'] = round(row['buy'] + tick * 0.05, 2)
+            row['sell'] = round(row['sell'] + tick * 0.05, 2)
+    return prices
+
+
+def _retained_bytes(build) -> int:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        retained = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert len(retained) == RETAINED
+    return (after - before) // RETAINED
+
+
+def test_snapshot_memory(benchmark, harem_payload):
+    sources = [_prices(harem_payload, tick) for tick in range(RETAINED)]
+    PriceSnapshot.from_prices(sources[0], 0, 0.0)  # intern metadata up front
+
+    dict_bytes = _retained_bytes(lambda: [_prices(harem_payload, tick) for tick in range(RETAINED)])
+    compact_bytes = _retained_bytes(lambda: [PriceSnapshot.from_prices(p, v, 0.0) for v, p in enumerate(sources)])
+
+    snapshot = PriceSnapshot.from_prices(sources[-1], RETAINED, 0.0)
+    assert compact_bytes * 5 < dict_bytes
+    assert compact_bytes <= snapshot.nbytes + 128
+
+    older = PriceSnapshot.from_prices(sources[0], 0, 0.0)
+    changed = benchmark(snapshot.diff, older)
+    assert len(changed) == len(snapshot.instruments)
+    if benchmark.stats is not None:
+        benchmark.extra_info['dict_bytes'] = dict_bytes
+        benchmark.extra_info['snapshot_bytes'] = compact_bytes
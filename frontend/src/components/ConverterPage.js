@@ -16,7 +16,7 @@ const ConverterPage = () => {
     const fetchPrices = async () => {
       setLoading(true);
       try {
-        const data = await api.getPrices();
+        const data = await api.getInitialPrices();
         const items = [];
         
         if (data.gold) {
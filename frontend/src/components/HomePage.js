@@ -41,10 +41,10 @@ const HomePage = () => {
   const [loading, setLoading] = useState(true);
   const [lastUpdate, setLastUpdate] = useState(null);
 
-  const fetchPrices = async () => {
+  const fetchPrices = async (initial = false) => {
     setLoading(true);
     try {
-      const data = await api.getPrices();
+      const data = initial ? await api.getInitialPrices() : await api.getPrices();
       if (data.gold) setGoldPrices(data.gold);
       if (data.currency) setCurrencies(data.currency);
       setLastUpdate(new Date(data.lastUpdate));
@@ -56,9 +56,9 @@ const HomePage = () => {
   };
 
   useEffect(() => {
-    fetchPrices();
+    fetchPrices(true);
     // Auto-refresh every 60 seconds
-    const interval = setInterval(fetchPrices, 60000);
+    const interval = setInterval(() => fetchPrices(), 60000);
     return () => clearInterval(interval);
   }, []);
 
@@ -86,7 +86,7 @@ const HomePage = () => {
             className="w-full pl-10 pr-4 py-2.5 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-yellow-500 focus:border-transparent"
           />
           <button
-            onClick={fetchPrices}
+            onClick={() => fetchPrices()}
             className="absolute right-2 top-1/2 -translate-y-1/2 p-2 hover:bg-gray-100 rounded-lg transition-colors"
             disabled={loading}
           >
@@ -23,14 +23,14 @@ const PortfolioPage = () => {
   });
 
   useEffect(() => {
-    fetchPortfolio();
-    fetchPrices();
+    fetchPortfolio(true);
+    fetchPrices(true);
   }, []);
 
-  const fetchPortfolio = async () => {
+  const fetchPortfolio = async (initial = false) => {
     setLoading(true);
     try {
-      const data = await api.getPortfolio();
+      const data = initial ? await api.getInitialPortfolio() : await api.getPortfolio();
       setPortfolio(data);
     } catch (error) {
       console.error('Failed to fetch portfolio:', error);
@@ -39,9 +39,9 @@ const PortfolioPage = () => {
     }
   };
 
-  const fetchPrices = async () => {
+  const fetchPrices = async (initial = false) => {
     try {
-      const data = await api.getPrices();
+      const data = initial ? await api.getInitialPrices() : await api.getPrices();
       setPrices(data);
       
       const items = [];
@@ -3,6 +3,11 @@ import axios from 'axios';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Pages mounted shortly after each other share one bootstrap round trip
+const BOOTSTRAP_MAX_AGE = 30000;
+let bootstrapRequest = null;
+let bootstrapRequestedAt = 0;
+
 export const api = {
   // Get prices
   getPrices: async (type = 'all') => {
@@ -17,6 +22,65 @@ export const api = {
     }
   },
 
+  getPriceHistory: async (type, name, params = {}) => {
+    try {
+      const response = await axios.get(`${API}/prices/history`, {
+        params: { type, name, ...params }
+      });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching price history:', error);
+      throw error;
+    }
+  },
+
+  // Prices and portfolio for the first render, from one price snapshot
+  getBootstrap: async (include = 'prices,portfolio') => {
+    try {
+      const response = await axios.get(`${API}/bootstrap`, {
+        params: { include }
+      });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching bootstrap data:', error);
+      throw error;
+    }
+  },
+
+  loadInitialData: () => {
+    if (!bootstrapRequest || Date.now() - bootstrapRequestedAt > BOOTSTRAP_MAX_AGE) {
+      bootstrapRequestedAt = Date.now();
+      bootstrapRequest = api.getBootstrap().catch((error) => {
+        bootstrapRequest = null;
+        throw error;
+      });
+    }
+    return bootstrapRequest;
+  },
+
+  getInitialPrices: async () => {
+    const data = await api.loadInitialData().catch(() => ({}));
+    if (!data.prices) return api.getPrices();
+    return { ...data.prices, lastUpdate: data.lastUpdate };
+  },
+
+  getInitialPortfolio: async () => {
+    const data = await api.loadInitialData().catch(() => ({}));
+    if (!data.portfolio) return api.getPortfolio();
+    return data.portfolio;
+  },
+
+  // Replay alert rules against recorded prices
+  backtestAlerts: async (rules, params = {}) => {
+    try {
+      const response = await axios.post(`${API}/alerts/backtest`, { rules, ...params });
+      return response.data;
+    } catch (error) {
+      console.error('Error backtesting alerts:', error);
+      throw error;
+    }
+  },
+
   // Portfolio operations
   getPortfolio: async () => {
     try {
@@ -28,8 +92,19 @@ export const api = {
     }
   },
 
+  getPortfolioPerformance: async (params = {}) => {
+    try {
+      const response = await axios.get(`${API}/portfolio/performance`, { params });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching portfolio performance:', error);
+      throw error;
+    }
+  },
+
   createPortfolioItem: async (item) => {
     try {
+      bootstrapRequest = null;
       const response = await axios.post(`${API}/portfolio`, item);
       return response.data;
     } catch (error) {
@@ -40,6 +115,7 @@ export const api = {
 
   updatePortfolioItem: async (id, item) => {
     try {
+      bootstrapRequest = null;
       const response = await axios.put(`${API}/portfolio/${id}`, item);
       return response.data;
     } catch (error) {
@@ -50,6 +126,7 @@ export const api = {
 
   deletePortfolioItem: async (id) => {
     try {
+      bootstrapRequest = null;
       const response = await axios.delete(`${API}/portfolio/${id}`);
       return response.data;
     } catch (error) {
@@ -0,0 +1,56 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).parent.parent
+
+# Backend modules import each other as top-level modules (see server.py); the
+# Mongo/upstream stand-ins and recorded payloads are shared with benchmarks/
+sys.path.insert(0, str(ROOT_DIR / 'backend'))
+sys.path.insert(0, str(ROOT_DIR / 'benchmarks'))
+
+# server.py reads these at import; tests inject a FakeDatabase instead of connecting
+os.environ.setdefault('MONGO_URL', 'mongodb://127.0.0.1:1')
+os.environ.setdefault('DB_NAME', 'berkay_altin_test')
+
+from fake_mongo import FakeDatabase  # noqa: E402
+from fake_upstream import FakeUpstream, load_payload  # noqa: E402
+
+
+@pytest.fixture
+def harem_payload():
+    return load_payload('harem_regular_session.json')['data']
+
+
+@pytest.fixture(scope='session')
+def upstream():
+    upstream = FakeUpstream().start()
+    yield upstream
+    upstream.stop()
+
+
+@pytest.fixture
+def server(monkeypatch, upstream):
+    """The server module on an in-memory database and a fresh price service reading the local upstream.
+
+    TestClient(server.app) without a context skips the lifespan, so the
+    collections it would wire up are set here.
+    """
+    import harem_api_service
+    import price_sources
+    import server
+
+    db = FakeDatabase()
+    monkeypatch.setattr(server, 'db', db)
+    monkeypatch.setattr(server.price_history, 'collection', db.price_history)
+    monkeypatch.setattr(server.price_rollups, 'db', db)
+    monkeypatch.setattr(server.house_exposure, 'totals', db.house_exposure)
+    monkeypatch.setattr(server.house_exposure, 'holders', db.house_exposure_holders)
+
+    monkeypatch.setattr(price_sources, 'sources', {})
+    monkeypatch.setattr(harem_api_service, 'RAPIDAPI_BASE_URL', upstream.url)
+    monkeypatch.setattr(harem_api_service, 'EXCHANGERATE_API_URL', f'{upstream.url}/v4/latest/USD')
+    monkeypatch.setattr(server, 'harem_api_service', harem_api_service.HaremAPIService())
+    return server
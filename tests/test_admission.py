@@ -0,0 +1,83 @@
+"""
+Admission control under a price-read surge: writes keep their lane and
+excess reads are shed with 503 instead of queuing.
+"""
+
+import asyncio
+
+from admission import AdmissionMiddleware, admission_shed, classify, parse_lanes, queue_wait
+
+
+def _scope(method, path):
+    return {'type': 'http', 'method': method, 'path': path, 'headers': []}
+
+
+async def _slow_app(scope, receive, send):
+    await asyncio.sleep(0.05)
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'{}'})
+
+
+async def _call(app, method, path):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await app(_scope(method, path), None, send)
+    start = messages[0]
+    return start['status'], dict(start['headers'])
+
+
+def test_surge_sheds_reads_and_keeps_writes():
+    lanes = parse_lanes('prices=2:2:0.02,writes=1:4:1')
+    app = AdmissionMiddleware(_slow_app, lanes)
+
+    async def run():
+        reads = [_call(app, 'GET', '/api/prices') for _ in range(20)]
+        writes = [_call(app, 'POST', '/api/portfolio') for _ in range(3)]
+        return await asyncio.gather(*reads, *writes)
+
+    results = asyncio.run(run())
+    reads, writes = results[:20], results[20:]
+
+    assert sum(status == 200 for status, _ in reads) == 2
+    shed = [headers for status, headers in reads if status == 503]
+    assert len(shed) == 18 and all(headers[b'retry-after'] == b'1' for headers in shed)
+    assert all(status == 200 for status, _ in writes)
+    assert all(lane.in_flight == 0 and lane.queue_depth == 0 for lane in lanes.values())
+
+
+def test_exempt_paths_bypass_lanes():
+    lanes = parse_lanes('prices=1:1:0.01')
+    lanes['default'].limit = 0
+    app = AdmissionMiddleware(_slow_app, lanes)
+    assert asyncio.run(_call(app, 'GET', '/metrics'))[0] == 200
+
+
+def test_shed_requests_are_counted_per_lane_and_reason():
+    lanes = parse_lanes('prices=1:1:0.01')
+    app = AdmissionMiddleware(_slow_app, lanes)
+    shed_before = {reason: admission_shed.value('prices', reason) for reason in ('queue_full', 'timeout')}
+    waits_before = sum((queue_wait._values.get(('prices',)) or [0])[:-1])
+
+    async def run():
+        # One admitted, one queued until its 10ms budget runs out, one rejected on a full queue
+        return await asyncio.gather(*(_call(app, 'GET', '/api/prices') for _ in range(3)))
+
+    statuses = sorted(status for status, _ in asyncio.run(run()))
+
+    assert statuses == [200, 503, 503]
+    assert admission_shed.value('prices', 'queue_full') - shed_before['queue_full'] == 1
+    assert admission_shed.value('prices', 'timeout') - shed_before['timeout'] == 1
+    # Only the request that actually queued records a wait
+    assert sum(queue_wait._values[('prices',)][:-1]) - waits_before == 1
+
+
+def test_only_cheap_price_reads_use_the_prices_lane():
+    assert classify('GET', '/api/prices') == 'prices'
+    assert classify('GET', '/api/prices/stats') == 'prices'
+    # History reads Mongo and the archive, too slow for the prices queue budget
+    assert classify('GET', '/api/prices/history') == 'default'
+    assert classify('PUT', '/api/portfolio/42') == 'writes'
+    assert classify('GET', '/api/portfolio') == 'default'
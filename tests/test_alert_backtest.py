@@ -0,0 +1,67 @@
+import tracemalloc
+
+import numpy as np
+
+import alert_backtest
+from alert_backtest import run_backtest
+from price_history import PriceSeries
+
+N_TICKS = 5 * 24 * 60
+
+
+def _market(n_rules: int = 50):
+    rng = np.random.default_rng(11)
+    ts = np.arange(N_TICKS, dtype=np.int64) * 60_000
+    sell = np.round(5800 + np.cumsum(rng.normal(0, 2.0, N_TICKS)), 2)
+    series = {'gold:GRAM ALTIN': PriceSeries(ts, sell - 50, sell)}
+    rules = [
+        {'type': 'gold', 'name': 'GRAM ALTIN', 'condition': str(condition), 'targetPrice': float(target)}
+        for condition, target in zip(
+            rng.choice(['above', 'below'], n_rules),
+            np.round(rng.uniform(sell.min(), sell.max(), n_rules), 2),
+        )
+    ]
+    return series, rules
+
+
+def test_backtest_matches_tick_by_tick_replay():
+    series, rules = _market()
+    s = series['gold:GRAM ALTIN']
+    results = run_backtest(rules[:50], series, int(s.ts[1000]), max_triggers=3)
+    for rule, result in zip(rules[:50], results):
+        holds = s.sell >= rule['targetPrice'] if rule['condition'] == 'above' else s.sell <= rule['targetPrice']
+        fired = np.nonzero(holds[1:] & ~holds[:-1])[0] + 1
+        fired = fired[s.ts[fired] >= s.ts[1000]]
+        assert result['count'] == len(fired)
+        assert result['triggers'] == s.ts[fired][:3].tolist()
+
+
+def test_trigger_cap_is_applied_while_expanding(monkeypatch):
+    series, rules = _market(400)
+    s = series['gold:GRAM ALTIN']
+    expected = run_backtest(rules, series, int(s.ts[0]), max_triggers=5)
+
+    # A few transitions and pairs at a time: the same first triggers
+    monkeypatch.setattr(alert_backtest, 'TICK_CHUNK', 64)
+    monkeypatch.setattr(alert_backtest, 'PAIR_BUDGET', 50)
+    assert run_backtest(rules, series, int(s.ts[0]), max_triggers=5) == expected
+
+
+def test_dense_rules_do_not_materialize_every_crossing():
+    # Every tick crosses all 2000 rules: 400 million (rule, tick) pairs if expanded in full
+    n_ticks, n_rules = 200_000, 2000
+    ts = np.arange(n_ticks, dtype=np.int64) * 60_000
+    sell = np.where(np.arange(n_ticks) % 2 == 0, 0.0, 100.0)
+    series = {'gold:GRAM ALTIN': PriceSeries(ts, sell, sell)}
+    rules = [{'type': 'gold', 'name': 'GRAM ALTIN', 'condition': 'above', 'targetPrice': 1.0 + i * 0.01}
+             for i in range(n_rules)]
+
+    tracemalloc.start()
+    try:
+        results = run_backtest(rules, series, 0, max_triggers=3)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert all(result['count'] == n_ticks // 2 for result in results)
+    assert all(result['triggers'] == [60_000, 180_000, 300_000] for result in results)
+    assert peak < 64 * 2 ** 20
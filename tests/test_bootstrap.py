@@ -0,0 +1,84 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _item(type, name, quantity, buy_price):
+    now = datetime.utcnow()
+    return {'id': str(uuid.uuid4()), 'userId': 'default', 'type': type, 'name': name, 'nameEn': name,
+            'quantity': quantity, 'buyPrice': buy_price, 'createdAt': now, 'updatedAt': now}
+
+
+@pytest.fixture
+def client(server):
+    holdings = [
+        _item('gold', 'GRAM ALTIN', 2, 5000.0),
+        _item('currency', 'USD', 100, 40.0),
+        # Not in the snapshot: valued at its buy price
+        _item('gold', 'UNLISTED', 1, 100.0),
+    ]
+    asyncio.run(server.db.portfolio.insert_many(holdings))
+    # Rates as held after the first background FX refresh
+    server.harem_api_service.fx.refresh()
+    return TestClient(server.app)
+
+
+def _sell(prices, category, name):
+    return next(row['sell'] for row in prices[category] if row['name'] == name)
+
+
+def test_default_payload(client):
+    data = client.get('/api/bootstrap').json()
+
+    assert set(data) == {'lastUpdate', 'version', 'errors', 'prices', 'portfolio'}
+    assert data['errors'] == {} and isinstance(data['version'], int)
+    assert data['prices']['gold'] and data['prices']['currency']
+    assert sorted(item['name'] for item in data['portfolio']) == ['GRAM ALTIN', 'UNLISTED', 'USD']
+
+
+def test_valuation_uses_the_returned_snapshot(client):
+    data = client.get('/api/bootstrap', params={'include': 'prices,valuation'}).json()
+
+    assert 'portfolio' not in data
+    gram = _sell(data['prices'], 'gold', 'GRAM ALTIN')
+    usd = _sell(data['prices'], 'currency', 'USD')
+    valuation = data['valuation']
+    by_price = sorted(item['currentPrice'] for item in valuation['items'])
+    assert by_price == sorted([gram, usd, 100.0])
+    assert valuation['totalCost'] == 14100.0
+    assert valuation['totalValue'] == pytest.approx(2 * gram + 100 * usd + 100.0, abs=0.01)
+    assert valuation['totalProfit'] == pytest.approx(valuation['totalValue'] - 14100.0, abs=0.01)
+
+
+def test_reads_within_the_ttl_share_one_snapshot(client, server, upstream):
+    first = client.get('/api/bootstrap').json()
+    requests = upstream.requests
+    second = client.get('/api/bootstrap', params={'include': 'prices'}).json()
+
+    # Served from the cached sources: same snapshot version, no upstream call
+    assert second['version'] == first['version']
+    assert upstream.requests == requests
+    assert server.harem_api_service.snapshot_age() < server.harem_api_service.harem.ttl
+    assert set(second) == {'lastUpdate', 'version', 'errors', 'prices'}
+
+
+def test_type_filter_and_unknown_queries(client):
+    data = client.get('/api/bootstrap', params={'include': 'prices', 'type': 'gold'}).json()
+    assert set(data['prices']) == {'gold'}
+
+    response = client.get('/api/bootstrap', params={'include': 'prices,news'})
+    assert response.status_code == 400 and 'news' in response.json()['detail']
+
+
+def test_failing_sub_query_is_reported(client, server, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError('mongo down')
+
+    monkeypatch.setattr(server.db.portfolio, 'find', broken)
+    data = client.get('/api/bootstrap').json()
+
+    assert data['errors'] == {'portfolio': 'mongo down'}
+    assert 'portfolio' not in data and data['prices']['gold']
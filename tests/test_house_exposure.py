@@ -0,0 +1,126 @@
+import asyncio
+import random
+import uuid
+
+import pytest
+
+from fake_mongo import FakeDatabase
+from house_exposure import HouseExposure
+
+INSTRUMENTS = [('gold', 'GRAM ALTIN'), ('gold', 'ÇEYREK ALTIN'), ('gold', 'HAS ALTIN'), ('currency', 'USD'), ('currency', 'EUR')]
+
+
+async def _simulate(db, exposure, operations: int, seed: int = 7):
+    """Random creates, updates and deletes applied the way the portfolio handlers do"""
+    rng = random.Random(seed)
+    ids = []
+    for _ in range(operations):
+        action = rng.random()
+        if action < 0.6 or not ids:
+            type, name = rng.choice(INSTRUMENTS)
+            item = {'id': str(uuid.uuid4()), 'userId': f'user-{rng.randrange(20)}', 'type': type, 'name': name, 'nameEn': name,
+                    'quantity': round(rng.uniform(0.5, 50), 2), 'buyPrice': round(rng.uniform(30, 6000), 2)}
+            await db.portfolio.insert_one(dict(item))
+            await exposure.record_create(item)
+            ids.append(item['id'])
+        elif action < 0.8:
+            update = {'quantity': round(rng.uniform(0.5, 50), 2)}
+            before = await db.portfolio.find_one_and_update({'id': rng.choice(ids)}, {'$set': update}, return_document=False)
+            await exposure.record_update(before, {**before, **update})
+        else:
+            item_id = ids.pop(rng.randrange(len(ids)))
+            await exposure.record_delete(await db.portfolio.find_one_and_delete({'id': item_id}))
+
+
+def _exposure(db) -> HouseExposure:
+    return HouseExposure(db.house_exposure, db.house_exposure_holders)
+
+
+def test_incremental_totals_match_scan():
+    db = FakeDatabase()
+    exposure = _exposure(db)
+
+    async def run():
+        await _simulate(db, exposure, 2000)
+        assert await exposure.reconcile(db.portfolio) == {}
+
+        totals = {(row['type'], row['name']): row for row in await exposure.exposure()}
+        items = db.portfolio.docs
+        for key, row in totals.items():
+            held = [item for item in items if (item['type'], item['name']) == key]
+            assert row['lots'] == len(held)
+            assert row['holders'] == len({item['userId'] for item in held})
+            assert abs(row['quantity'] - sum(item['quantity'] for item in held)) < 1e-6
+
+        # A lost update is reported and corrected by the reconciliation
+        db.house_exposure.docs[0]['quantity'] += 5
+        drift = await exposure.reconcile(db.portfolio)
+        assert [round(change['quantity'], 6) for change in drift.values()] == [-5]
+        assert await exposure.reconcile(db.portfolio) == {}
+
+    asyncio.run(run())
+
+
+class _WriteDuringScan:
+    """Portfolio collection whose scan is interleaved with a handler's create"""
+
+    def __init__(self, db, exposure, item):
+        self.db, self.exposure, self.item = db, exposure, item
+
+    def find(self, query=None, projection=None):
+        cursor = self.db.portfolio.find(query, projection)
+
+        async def scan():
+            async for doc in cursor:
+                yield doc
+                if self.item is not None:
+                    item, self.item = self.item, None
+                    await self.db.portfolio.insert_one(dict(item))
+                    await self.exposure.record_create(item)
+
+        return scan()
+
+
+def test_reconcile_does_not_overwrite_concurrent_writes():
+    db = FakeDatabase()
+    exposure = _exposure(db)
+
+    async def run():
+        await _simulate(db, exposure, 200)
+        gram = next(doc for doc in db.house_exposure.docs if doc['name'] == 'GRAM ALTIN')
+        usd = next(doc for doc in db.house_exposure.docs if doc['name'] == 'USD')
+        gram['quantity'] += 5  # a lost update on an instrument nobody writes meanwhile
+        usd['quantity'] += 7  # and one on the instrument written during the scan
+        late = {'id': str(uuid.uuid4()), 'userId': 'user-late', 'type': 'currency', 'name': 'USD', 'nameEn': 'USD',
+                'quantity': 100.0, 'buyPrice': 40.0}
+
+        drift = await exposure.reconcile(_WriteDuringScan(db, exposure, late))
+
+        assert [round(change['quantity'], 6) for change in drift.values()] == [-5]
+        # The late create's $inc survives; the USD drift is left for the next run
+        assert 'currency:USD' not in drift
+        assert await exposure.reconcile(db.portfolio) == {'currency:USD': {'quantity': pytest.approx(-7)}}
+        assert await exposure.reconcile(db.portfolio) == {}
+        usd_items = [item for item in db.portfolio.docs if item['name'] == 'USD']
+        assert usd['quantity'] == pytest.approx(sum(item['quantity'] for item in usd_items))
+        assert usd['holders'] == len({item['userId'] for item in usd_items})
+
+    asyncio.run(run())
+
+
+def test_reconcile_backfills_missing_totals():
+    db = FakeDatabase()
+    exposure = _exposure(db)
+
+    async def run():
+        await _simulate(db, exposure, 300)
+        db.house_exposure.docs.clear()
+        db.house_exposure_holders.docs.clear()
+
+        drift = await exposure.reconcile(db.portfolio)
+        assert set(drift) == {f'{type}:{name}' for type, name in {(i['type'], i['name']) for i in db.portfolio.docs}}
+        assert await exposure.reconcile(db.portfolio) == {}
+        lots = sum(doc['lots'] for doc in db.house_exposure_holders.docs)
+        assert lots == len(db.portfolio.docs)
+
+    asyncio.run(run())
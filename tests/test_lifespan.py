@@ -0,0 +1,109 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+DEAD_URL = 'http://127.0.0.1:1'
+
+
+@pytest.fixture
+def server(server, monkeypatch):
+    # Background jobs are exercised on their own; the archive must not land in the source tree
+    monkeypatch.setattr(server, 'ARCHIVE_COMPACT_INTERVAL', 0)
+    monkeypatch.setattr(server, 'WARMUP_RETRY_INTERVAL', 0.05)
+    return server
+
+
+def _wait_ready(client, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get('/readyz')
+        if response.status_code == 200 or time.monotonic() > deadline:
+            return response
+        time.sleep(0.05)
+
+
+def test_ready_only_after_warmup(server, monkeypatch):
+    seen = []
+    warm_up = server.warm_up
+
+    async def tracked():
+        # The collections are wired before warmup and readiness is reported after it
+        seen.append((server.price_history.collection is server.db.price_history, server.app.state.ready))
+        ok = await warm_up()
+        seen.append(server.app.state.ready)
+        return ok
+
+    monkeypatch.setattr(server, 'warm_up', tracked)
+    with TestClient(server.app) as client:
+        assert seen == [(True, False), False]
+        response = client.get('/readyz')
+        assert response.status_code == 200
+        assert response.json() == {'status': 'ready', 'warm': True, 'snapshot': 'live', 'mongo': True}
+        assert server.harem_api_service.snapshot_age() is not None
+    assert server.app.state.ready is False
+
+
+def test_warmup_timeout_keeps_the_worker_unready_until_prices_load(server, monkeypatch, upstream):
+    monkeypatch.setattr(server, 'WARMUP_TIMEOUT', 0.05)
+    monkeypatch.setattr(upstream, 'latency_ms', 300)
+    with TestClient(server.app) as client:
+        response = client.get('/readyz')
+        assert response.status_code == 503 and response.json()['warm'] is False
+        assert client.get('/healthz').status_code == 200
+
+        # The retry picks up the snapshot once the slow upstream answers
+        assert _wait_ready(client).status_code == 200
+
+
+def test_liveness_does_not_wait_on_a_slow_upstream(server, monkeypatch, upstream):
+    monkeypatch.setattr(server, 'WARMUP_TIMEOUT', 0.05)
+    monkeypatch.setattr(upstream, 'latency_ms', 1000)
+    with TestClient(server.app) as client:
+        # The retries keep joining the warmup refresh, which is still waiting on the upstream
+        time.sleep(0.2)
+        started = time.monotonic()
+        assert client.get('/healthz').status_code == 200
+        assert time.monotonic() - started < 0.5
+        assert client.get('/readyz').status_code == 503
+        assert _wait_ready(client).status_code == 200
+
+
+def test_upstream_outage_after_warmup_is_reported_not_unready(server):
+    harem = server.harem_api_service.harem
+    with TestClient(server.app) as client:
+        assert client.get('/readyz').status_code == 200
+        harem.fetched_at -= harem.ttl + harem.retry_after + 1
+        assert client.get('/readyz').json() == {'status': 'ready', 'warm': True, 'snapshot': 'stale', 'mongo': True}
+
+        # Harem data dropped after max_stale hits every worker at once; they keep serving fallback prices
+        harem.value = None
+        response = client.get('/readyz')
+        assert response.status_code == 200 and response.json()['snapshot'] == 'fallback'
+        assert client.get('/api/prices').json()['gold']
+
+
+def test_upstream_down(server, monkeypatch):
+    import harem_api_service
+
+    monkeypatch.setattr(server.harem_api_service, 'base_url', DEAD_URL)
+    monkeypatch.setattr(harem_api_service, 'EXCHANGERATE_API_URL', DEAD_URL)
+    with TestClient(server.app) as client:
+        response = client.get('/readyz')
+        assert response.status_code == 503
+        assert response.json() == {'status': 'not ready', 'warm': False, 'snapshot': 'fallback', 'mongo': True}
+        # Fallback prices are still served to clients that reach this worker
+        assert client.get('/api/prices').json()['gold']
+        assert client.get('/healthz').status_code == 200
+
+
+def test_mongo_down(server, monkeypatch):
+    async def unreachable(*args, **kwargs):
+        raise ConnectionError('mongo down')
+
+    monkeypatch.setattr(server.db, 'command', unreachable)
+    with TestClient(server.app) as client:
+        response = client.get('/readyz')
+        assert response.status_code == 503
+        assert response.json() == {'status': 'not ready', 'warm': True, 'snapshot': 'live', 'mongo': False}
+        assert client.get('/healthz').status_code == 200
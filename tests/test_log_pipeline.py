@@ -0,0 +1,94 @@
+import io
+import json
+import logging
+import logging.handlers
+import queue
+
+import pytest
+
+from log_pipeline import (
+    ContextFilter, JsonFormatter, RateLimitFilter, _QueueHandler, request_id_var, setup_logging, stop_logging,
+)
+
+
+def _pipeline(burst: int = 5, window: float = 60.0):
+    records = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(RateLimitFilter(burst, window))
+    log = logging.getLogger('test_log_pipeline')
+    log.handlers[:] = [handler]
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    return log, records, handler
+
+
+def _drain(records) -> list:
+    stream = io.StringIO()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter())
+    while not records.empty():
+        output.handle(records.get())
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_outage_is_rate_limited():
+    log, records, handler = _pipeline(burst=3)
+    token = request_id_var.set('req-1')
+    try:
+        for attempt in range(100):
+            log.error("Error fetching Harem prices: %s", f'timeout #{attempt}', extra={'source': 'harem'})
+        log.error("Currency API error: %s", 502, extra={'source': 'exchangerate'})
+    finally:
+        request_id_var.reset(token)
+
+    entries = _drain(records)
+    assert [e['message'] for e in entries[:3]] == [f'Error fetching Harem prices: timeout #{i}' for i in range(3)]
+    assert entries[3]['source'] == 'exchangerate' and len(entries) == 4
+    assert all(e['requestId'] == 'req-1' for e in entries)
+
+    # Once the window rolls over the next record reports what was dropped
+    rate_limit = handler.filters[1]
+    for state in rate_limit._seen.values():
+        state[0] -= rate_limit.window
+    log.error("Error fetching Harem prices: %s", 'recovered?', extra={'source': 'harem'})
+    assert _drain(records)[0]['suppressed'] == 97
+
+
+@pytest.fixture
+def root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    stop_logging()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_records_after_stop_are_written_directly(root_logger):
+    stream = io.StringIO()
+    setup_logging('INFO', 'json', '2/60', stream=stream)
+    log = logging.getLogger('lifespan_shutdown')
+    log.info("Warmup finished in %.2fs", 0.5)
+    stop_logging()
+
+    log.info("Closing Mongo client")
+    for _ in range(3):
+        log.error("Error compacting price history: %s", 'cancelled')
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [e['message'] for e in entries] == [
+        'Warmup finished in 0.50s',
+        'Closing Mongo client',
+        'Error compacting price history: cancelled',
+        'Error compacting price history: cancelled',
+    ]
+    assert not any(isinstance(handler, _QueueHandler) for handler in root_logger.handlers)
+
+
+def test_arguments_are_interpolated_when_logged():
+    log, records, _ = _pipeline()
+    state = {'lanes': 1}
+    log.info("Admission state: %s", state)
+    state['lanes'] = 2
+    assert _drain(records)[0]['message'] == "Admission state: {'lanes': 1}"
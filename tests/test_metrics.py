@@ -0,0 +1,118 @@
+import threading
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from metrics import Counter, Gauge, Histogram, MetricsMiddleware, MetricsRegistry, http_request_duration
+
+
+def _count(method, route, status) -> int:
+    slot = http_request_duration._values.get((method, route, status))
+    return sum(slot[:-1]) if slot else 0
+
+
+def _app():
+    app = FastAPI()
+
+    @app.get('/items/{item_id}')
+    async def get_item(item_id: int):
+        if item_id == 0:
+            raise HTTPException(status_code=404, detail='Not found')
+        return {'id': item_id}
+
+    @app.get('/crash')
+    async def crash():
+        raise RuntimeError('boom')
+
+    app.add_middleware(MetricsMiddleware)
+    return app
+
+
+def test_requests_are_labelled_by_route_template_and_status():
+    client = TestClient(_app(), raise_server_exceptions=False)
+    before = {
+        labels: _count(*labels)
+        for labels in [
+            ('GET', '/items/{item_id}', '200'), ('GET', '/items/{item_id}', '404'),
+            ('GET', '/crash', '500'), ('GET', 'unmatched', '404'),
+        ]
+    }
+
+    for item_id in (1, 2, 3, 0):
+        client.get(f'/items/{item_id}')
+    client.get('/crash')
+    client.get('/no/such/path')
+
+    after = {labels: _count(*labels) - count for labels, count in before.items()}
+    # Path parameters never become label values, so the series count stays bounded
+    assert after == {
+        ('GET', '/items/{item_id}', '200'): 3,
+        ('GET', '/items/{item_id}', '404'): 1,
+        ('GET', '/crash', '500'): 1,
+        ('GET', 'unmatched', '404'): 1,
+    }
+    assert not any(labels[1] == '/items/1' for labels in http_request_duration._values)
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    errors = registry.register(Counter('errors_total', 'Errors', ('source',)))
+    depth = registry.register(Gauge('queue_depth', 'Depth', callback=lambda: {(): 3}))
+    latency = registry.register(Histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1.0)))
+    errors.inc('harem')
+    errors.inc('harem', amount=2)
+    latency.observe(0.05, '/api/prices')
+    latency.observe(0.5, '/api/prices')
+    latency.observe(5.0, '/api/prices')
+    assert depth.render()[-1] == 'queue_depth 3'
+
+    assert registry.render().splitlines() == [
+        '# HELP errors_total Errors',
+        '# TYPE errors_total counter',
+        'errors_total{source="harem"} 3',
+        '# HELP queue_depth Depth',
+        '# TYPE queue_depth gauge',
+        'queue_depth 3',
+        '# HELP latency_seconds Latency',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{route="/api/prices",le="0.1"} 1',
+        'latency_seconds_bucket{route="/api/prices",le="1.0"} 2',
+        'latency_seconds_bucket{route="/api/prices",le="+Inf"} 3',
+        'latency_seconds_sum{route="/api/prices"} 5.55',
+        'latency_seconds_count{route="/api/prices"} 3',
+    ]
+
+
+def test_metrics_endpoint(server):
+    client = TestClient(server.app)
+    client.get('/healthz')
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    assert '# TYPE http_request_duration_seconds histogram' in response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/healthz",status="200"}' in response.text
+    assert '# TYPE admission_shed_total counter' in response.text
+
+
+def test_updates_from_worker_threads_are_not_lost():
+    registry = MetricsRegistry()
+    errors = registry.register(Counter('errors_total', 'Errors', ('source',)))
+    latency = registry.register(Histogram('latency_seconds', 'Latency', ('source',)))
+
+    def fetch_loop(source):
+        for i in range(20000):
+            errors.inc(source)
+            latency.observe(0.01, source)
+            if i % 100 == 0:
+                registry.render()
+
+    threads = [threading.Thread(target=fetch_loop, args=(source,)) for source in ('harem', 'exchangerate') * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors.value('harem') == errors.value('exchangerate') == 40000
+    assert 'latency_seconds_count{source="exchangerate"} 40000' in registry.render()
@@ -0,0 +1,87 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from portfolio_performance import compute_performance, price_matrix
+from price_history import PriceSeries, to_epoch_ms
+
+START = datetime(2025, 12, 1, 6, 0)
+HOUR_MS = 3600 * 1000
+
+
+def _series(ticks):
+    ts = to_epoch_ms([t for t, _ in ticks])
+    sell = np.array([price for _, price in ticks], dtype=np.float64)
+    return PriceSeries(ts, sell, sell)
+
+
+def _holding(id, type, name, quantity, buy_price, created_at):
+    return {'id': id, 'type': type, 'name': name, 'quantity': quantity, 'buyPrice': buy_price, 'createdAt': created_at}
+
+
+def test_hand_computed_portfolio():
+    holdings = [
+        _holding('1', 'gold', 'GRAM ALTIN', 2, 100.0, START),
+        # Bought between two grid points: counts from the next one
+        _holding('2', 'currency', 'USD', 10, 40.0, START + timedelta(minutes=90)),
+        # Bought after the range: never counted
+        _holding('3', 'gold', 'GRAM ALTIN', 1, 100.0, START + timedelta(hours=5)),
+    ]
+    series = {
+        'gold:GRAM ALTIN': _series([(START + timedelta(minutes=30), 110.0), (START + timedelta(minutes=150), 120.0)]),
+        'currency:USD': _series([(START + timedelta(hours=3), 42.0)]),
+    }
+    start_ms = int(to_epoch_ms([START])[0])
+
+    result = compute_performance(holdings, series, start_ms, start_ms + 4 * HOUR_MS, HOUR_MS)
+
+    assert result['timestamps'] == [start_ms + i * HOUR_MS for i in range(5)]
+    # Gold is valued at its buy price until the first tick; USD likewise until 09:00
+    assert result['value'] == [200.0, 220.0, 620.0, 660.0, 660.0]
+    assert result['cost'] == [200.0, 200.0, 600.0, 600.0, 600.0]
+    assert result['profit'] == [0.0, 20.0, 20.0, 60.0, 60.0]
+    assert result['profitPercentage'] == [0.0, 10.0, 3.33, 10.0, 10.0]
+
+
+def test_price_matrix_carries_last_tick_forward():
+    series = {'gold:GRAM ALTIN': _series([(START + timedelta(minutes=30), 110.0), (START + timedelta(hours=2), 120.0)])}
+    start_ms = int(to_epoch_ms([START])[0])
+    grid = np.arange(start_ms, start_ms + 4 * HOUR_MS, HOUR_MS, dtype=np.int64)
+
+    prices = price_matrix(['gold:GRAM ALTIN', 'currency:USD'], series, grid)
+
+    assert np.isnan(prices[0, 0]) and prices[0, 1:].tolist() == [110.0, 120.0, 120.0]
+    assert np.isnan(prices[1]).all()
+
+
+def test_matches_per_holding_valuation():
+    rng = random.Random(7)
+    names = ['GRAM ALTIN', 'CEYREK ALTIN', 'ONS']
+    series = {}
+    for name in names:
+        minutes = sorted(rng.sample(range(30, 48 * 60), 200))
+        series['gold:' + name] = _series([(START + timedelta(minutes=m), round(rng.uniform(90, 110), 2)) for m in minutes])
+    holdings = [
+        _holding(str(i), 'gold', rng.choice(names), rng.randint(1, 5), round(rng.uniform(90, 110), 2),
+                 START + timedelta(minutes=rng.randrange(-60, 50 * 60)))
+        for i in range(40)
+    ]
+    start_ms = int(to_epoch_ms([START])[0])
+    end_ms = start_ms + 48 * HOUR_MS
+
+    result = compute_performance(holdings, series, start_ms, end_ms, HOUR_MS)
+
+    for i, point in enumerate(result['timestamps']):
+        value = cost = 0.0
+        for holding in holdings:
+            if int(to_epoch_ms([holding['createdAt']])[0]) > point:
+                continue
+            s = series['gold:' + holding['name']]
+            pos = np.searchsorted(s.ts, point, side='right') - 1
+            price = s.sell[pos] if pos >= 0 else holding['buyPrice']
+            value += price * holding['quantity']
+            cost += holding['buyPrice'] * holding['quantity']
+        assert result['value'][i] == pytest.approx(value, abs=0.01)
+        assert result['cost'][i] == pytest.approx(cost, abs=0.01)
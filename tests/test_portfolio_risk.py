@@ -0,0 +1,26 @@
+import numpy as np
+
+from portfolio_risk import RiskModel
+
+N_INSTRUMENTS = 21
+LOOKBACK_DAYS = 365
+
+
+def _model_and_quantities(n_portfolios: int = 50):
+    rng = np.random.default_rng(7)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (N_INSTRUMENTS, LOOKBACK_DAYS + 1)), axis=1))
+    prices[0, :30] = np.nan  # instrument listed late
+    keys = [f'gold:{i}' for i in range(N_INSTRUMENTS)]
+    held = rng.random((n_portfolios, N_INSTRUMENTS)) < 0.15
+    quantities = np.where(held, rng.integers(1, 100, held.shape), 0).astype(np.float64)
+    return keys, prices, quantities
+
+
+def test_risk_matches_single_portfolio():
+    keys, prices, quantities = _model_and_quantities()
+    model = RiskModel(keys, prices)
+    batch = model.evaluate(quantities[:50], chunk_size=16)
+    for row in (0, 17, 49):
+        single = model.evaluate(quantities[row:row + 1])
+        for key, values in batch.items():
+            assert np.isclose(values[row], single[key][0])
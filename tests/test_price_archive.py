@@ -0,0 +1,130 @@
+import asyncio
+import fcntl
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from fake_mongo import FakeDatabase
+from price_archive import LOCK, PriceArchive
+from price_history import PriceHistoryRepository, PriceSeries, to_epoch_ms
+
+KEY = 'gold:GRAM ALTIN'
+
+
+async def _seed(collection, start: datetime, minutes: int, step: int = 10):
+    docs = [
+        {'instrument': KEY, 'ts': start + timedelta(minutes=m), 'buy': 5000.0 + m, 'sell': 5050.0 + m}
+        for m in range(0, minutes, step)
+    ]
+    await collection.insert_many(docs)
+
+
+def test_compacted_history_matches_mongo(tmp_path):
+    db = FakeDatabase()
+    start = datetime(2025, 12, 1)
+    today = start + timedelta(days=3)
+    archive = PriceArchive(tmp_path)
+    plain = PriceHistoryRepository(db.price_history)
+    archived = PriceHistoryRepository(db.price_history, archive=archive)
+
+    async def run():
+        await _seed(db.price_history, start, 3 * 24 * 60 + 600)
+        appended = await archive.compact(db.price_history, until=today)
+        assert appended == {KEY: 3 * 24 * 6}
+        assert archive.compacted_until == today
+
+        ranges = [
+            (start - timedelta(hours=1), today + timedelta(hours=5)),  # archive + open day
+            (start + timedelta(hours=30, minutes=5), start + timedelta(hours=40)),  # archive only
+            (today + timedelta(hours=2), today + timedelta(hours=3)),  # open day only
+        ]
+        for lo, hi in ranges:
+            expected = (await plain.load_series([KEY], lo, hi))[KEY]
+            actual = (await archived.load_series([KEY], lo, hi))[KEY]
+            for a, b in zip(actual, expected):
+                np.testing.assert_array_equal(a, b)
+
+        # Raw ticks of closed days expired: the open day still starts from the last archived price
+        await db.price_history.delete_many({'ts': {'$lt': today}})
+        series = (await archived.load_series([KEY], today, today + timedelta(hours=1)))[KEY]
+        assert series.ts[0] < to_epoch_ms([today])[0] and series.sell[0] == 5050.0 + (3 * 24 * 60 - 10)
+
+        # Compaction is incremental
+        assert await archive.compact(db.price_history, until=today) == {}
+
+    asyncio.run(run())
+
+
+def test_interrupted_append_is_discarded(tmp_path):
+    archive = PriceArchive(tmp_path)
+    ts = np.arange(10, dtype=np.int64)
+    archive.append(KEY, PriceSeries(ts, ts * 1.0, ts * 1.0))
+    archive.compacted_until = datetime(2025, 12, 1)
+    archive._write_manifest()
+    archive.append(KEY, PriceSeries(ts + 10, ts * 1.0, ts * 1.0))  # manifest never written
+
+    reopened = PriceArchive(tmp_path)
+    assert len(reopened.load([KEY], 0, 100)[KEY].ts) == 10
+    reopened.append(KEY, PriceSeries(ts + 10, ts * 2.0, ts * 2.0))
+    reopened._write_manifest()
+    assert PriceArchive(tmp_path).load([KEY], 0, 100)[KEY].sell[-1] == 18.0
+
+
+def test_compaction_resumes_from_another_process(tmp_path):
+    db = FakeDatabase()
+    start = datetime(2025, 12, 1)
+    worker, cli = PriceArchive(tmp_path), PriceArchive(tmp_path)
+
+    async def run():
+        await _seed(db.price_history, start, 3 * 24 * 60)
+        assert await cli.compact(db.price_history, until=start + timedelta(days=2)) == {KEY: 2 * 24 * 6}
+        # The worker's manifest predates the CLI run: only the third day is left for it
+        assert await worker.compact(db.price_history, until=start + timedelta(days=3)) == {KEY: 24 * 6}
+
+    asyncio.run(run())
+    assert len(PriceArchive(tmp_path).load([KEY], 0, 2 ** 62)[KEY].ts) == 3 * 24 * 6
+
+
+def test_expiry_keeps_ticks_the_archive_does_not_hold(tmp_path):
+    db = FakeDatabase()
+    start = datetime(2025, 12, 1)
+    now = start + timedelta(days=30)
+    archive = PriceArchive(tmp_path)
+    history = PriceHistoryRepository(db.price_history, archive=archive, retention=timedelta(days=7))
+
+    async def run():
+        await db.price_history.create_index([('ts', 1)], expireAfterSeconds=7 * 86400)
+        await history.ensure_indexes()
+        assert 'expireAfterSeconds' not in db.price_history.indexes['ts_1']
+
+        await _seed(db.price_history, start, 30 * 24 * 60, step=60)
+        # Compaction never ran (off, failing, or a fresh archive directory): nothing is deleted
+        assert await history.expire(now) == 0
+
+        await archive.compact(db.price_history, until=start + timedelta(days=10))
+        assert await history.expire(now) == 10 * 24
+        # Past the archive the retention applies
+        await archive.compact(db.price_history, until=now)
+        assert await history.expire(now) == 13 * 24
+        assert min(doc['ts'] for doc in db.price_history.docs) == now - timedelta(days=7)
+
+        series = (await history.load_series([KEY], start, now))[KEY]
+        assert len(series.ts) == 30 * 24
+
+    asyncio.run(run())
+
+
+def test_compaction_is_skipped_while_another_process_holds_the_lock(tmp_path):
+    db = FakeDatabase()
+    start = datetime(2025, 12, 1)
+    archive = PriceArchive(tmp_path)
+
+    async def run():
+        await _seed(db.price_history, start, 2 * 24 * 60)
+        with open(tmp_path / LOCK, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            assert await archive.compact(db.price_history, until=start + timedelta(days=2)) == {}
+        assert archive.compacted_until is None and not any(tmp_path.glob('*/ts.i64'))
+        assert await archive.compact(db.price_history, until=start + timedelta(days=2)) == {KEY: 2 * 24 * 6}
+
+    asyncio.run(run())
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from fake_mongo import FakeDatabase
+from price_history import PriceHistoryRepository
+from price_rollups import TIERS, PriceRollups, pick_resolution
+
+KEY = 'gold:GRAM ALTIN'
+START = datetime(2025, 12, 1, 6, 58)
+
+
+def _prices(sell: float, version: int):
+    return {'gold': [{'name': 'GRAM ALTIN', 'buy': sell - 50, 'sell': sell}], 'currency': [], 'version': version}
+
+
+async def _ingest(history, ticks: np.ndarray, step: timedelta):
+    for version, sell in enumerate(ticks, 1):
+        await history.record_snapshot(_prices(float(sell), version), START + step * (version - 1))
+        # Snapshots arrive far apart compared to a fold; don't outrun the backlog
+        await history.flush_rollups()
+
+
+def test_candles_match_ticks():
+    db = FakeDatabase()
+    rollups = PriceRollups(db)
+    history = PriceHistoryRepository(db.price_history, record_interval=0, rollups=rollups)
+    step = timedelta(seconds=30)
+    ticks = np.round(5800 + np.cumsum(np.random.default_rng(2).normal(0, 1.5, 26 * 120)), 2)
+
+    async def run():
+        await history.ensure_indexes()
+        await _ingest(history, ticks, step)
+        assert len(db.price_history.docs) == len(ticks)
+        # The same snapshot served again is not folded twice
+        await history.record_snapshot(_prices(1.0, len(ticks)), START)
+
+        ts = np.array([START + step * i for i in range(len(ticks))], dtype='datetime64[ms]')
+        for resolution, tier in TIERS.items():
+            candles = await rollups.load(KEY, resolution, START, START + step * len(ticks))
+            buckets = ts.astype(f'datetime64[{ {"1m": "m", "1h": "h", "1d": "D"}[resolution] }]')
+            edges = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+            np.testing.assert_array_equal(candles.ts, buckets[edges].astype('datetime64[ms]').astype(np.int64))
+            np.testing.assert_array_equal(candles.open, ticks[edges])
+            np.testing.assert_array_equal(candles.high, np.maximum.reduceat(ticks, edges))
+            np.testing.assert_array_equal(candles.low, np.minimum.reduceat(ticks, edges))
+            np.testing.assert_array_equal(candles.close, ticks[np.r_[edges[1:], len(ticks)] - 1])
+            assert len(db[tier.collection].docs) == len(edges)
+
+    asyncio.run(run())
+
+
+def test_rollups_are_folded_off_the_request_path():
+    db = FakeDatabase()
+    history = PriceHistoryRepository(db.price_history, record_interval=0, rollups=PriceRollups(db))
+    writes = []
+    bulk_write = db.price_rollups_1m.bulk_write
+
+    async def slow_bulk_write(requests, ordered=True):
+        writes.append((len(requests), ordered))
+        await asyncio.sleep(0.05)
+        return await bulk_write(requests, ordered=ordered)
+
+    db.price_rollups_1m.bulk_write = slow_bulk_write
+
+    async def run():
+        await history.record_snapshot(_prices(5800.0, 1), START)
+        await history.record_snapshot(_prices(5810.0, 2), START + timedelta(seconds=5))
+        # The raw ticks are written, the candles are still being folded
+        assert len(db.price_history.docs) == 2 and not db.price_rollups_1m.docs
+        await history.flush_rollups()
+
+    asyncio.run(run())
+    # One unordered bulk write per tier and snapshot, applied in order
+    assert writes == [(1, False), (1, False)]
+    assert [(doc['open'], doc['close'], doc['ticks']) for doc in db.price_rollups_1m.docs] == [(5800.0, 5810.0, 2)]
+    assert set(db.price_rollups_1m.docs[0]) == {'_id', 'instrument', 'ts', 'open', 'high', 'low', 'close', 'ticks'}
+
+
+def test_pick_resolution():
+    now = datetime(2025, 12, 1)
+    assert pick_resolution(now - timedelta(hours=6), now, now) == '1m'
+    assert pick_resolution(now - timedelta(days=7), now, now) == '1h'
+    assert pick_resolution(now - timedelta(days=365), now, now) == '1d'
+    # Minute candles past their retention are gone
+    old = now - timedelta(days=60)
+    assert pick_resolution(old, old + timedelta(hours=1), now) == '1h'
@@ -0,0 +1,31 @@
+from price_normalizer import normalize_harem_payload
+from price_snapshot import PriceSnapshot
+
+def _prices(harem_payload, tick: int):
+    normalized = normalize_harem_payload(harem_payload)
+    prices = {'gold': normalized.gold, 'currency': normalized.currency}
+    for rows in prices.values():
+        for idx, row in enumerate(rows, 1):
+            row['id'] = idx
+            row['buy'] = round(row['buy'] + tick * 0.05, 2)
+            row['sell'] = round(row['sell'] + tick * 0.05, 2)
+    return prices
+
+
+def test_snapshot_round_trip(harem_payload):
+    prices = _prices(harem_payload, 0)
+    prices['currency'].append({'name': 'JPY', 'nameEn': 'JPY', 'buy': 0.226, 'sell': 0.2301, 'change': 0.22, 'symbol': '¥', 'unit': 'TRY'})
+    snapshot = PriceSnapshot.from_prices(prices, 1, 0.0)
+    rendered = snapshot.as_prices()
+    for category in ('gold', 'currency'):
+        for original, row in zip(prices[category], rendered[category]):
+            assert (row['name'], row['buy'], row['sell'], row['change']) == (original['name'], original['buy'], original['sell'], original['change'])
+    assert rendered['currency'][-1]['id'] == len(prices['currency'])
+
+    moved = _prices(harem_payload, 0)
+    moved['gold'][3]['sell'] += 1.0
+    moved['currency'].append(prices['currency'][-1])
+    newer = PriceSnapshot.from_prices(moved, 2, 0.0)
+    assert newer.instruments is snapshot.instruments
+    changes = newer.changes_since(snapshot)
+    assert [row['name'] for row in changes['gold']] == [moved['gold'][3]['name']] and changes['currency'] == []
@@ -0,0 +1,128 @@
+import json
+import threading
+from collections import Counter
+
+import pytest
+
+import harem_api_service
+import price_sources
+from fake_upstream import load_payload
+from harem_api_service import HaremAPIService
+from price_stats import PriceStatsTracker
+from upstream_archive import ReplayResponse
+
+
+class FakeFeeds:
+    def __init__(self, monkeypatch):
+        self.now = 1_764_572_400.0
+        self.calls = Counter()
+        self.down = set()
+        self.bodies = {
+            'harem': json.dumps({'success': True, 'data': load_payload('harem_regular_session.json')['data']}),
+            'exchangerate': json.dumps(load_payload('exchangerate_usd.json')),
+        }
+        monkeypatch.setattr(harem_api_service, 'fetch', self.fetch)
+        monkeypatch.setattr(harem_api_service, 'clock', lambda: self.now)
+        monkeypatch.setattr(price_sources, 'monotonic', lambda: self.now)
+        monkeypatch.setattr(harem_api_service, 'price_stats', PriceStatsTracker())
+
+    def fetch(self, source, url, **kwargs):
+        self.calls[source] += 1
+        if source in self.down:
+            return ReplayResponse(503, '', self.now)
+        return ReplayResponse(200, self.bodies[source], self.now)
+
+
+@pytest.fixture
+def feeds(monkeypatch):
+    return FakeFeeds(monkeypatch)
+
+
+def _service() -> HaremAPIService:
+    service = HaremAPIService()
+    service.fx.background = False
+    return service
+
+
+def _names(prices, category='currency'):
+    return [row['name'] for row in prices[category]]
+
+
+def test_harem_refresh_skips_fx(feeds):
+    service = _service()
+    first = service.get_all_prices()
+    assert 'USD' in _names(first) and feeds.calls == {'harem': 1, 'exchangerate': 1}
+
+    for _ in range(100):
+        feeds.now += harem_api_service.SNAPSHOT_TTL
+        prices = service.get_all_prices()
+    assert feeds.calls == {'harem': 101, 'exchangerate': 1}
+    assert prices['version'] > first['version'] and _names(prices) == _names(first)
+
+    # Reads within the Harem TTL are served from the merged snapshot
+    assert service.get_all_prices() is prices and feeds.calls['harem'] == 101
+
+
+def test_fx_outage_serves_last_rates(feeds):
+    service = _service()
+    service.get_all_prices()
+    feeds.down.add('exchangerate')
+
+    feeds.now += harem_api_service.FX_RATES_TTL
+    assert 'USD' in _names(service.get_all_prices()) and feeds.calls['exchangerate'] == 2
+    feeds.now += harem_api_service.FX_RATES_RETRY / 2
+    service.get_all_prices()
+    assert feeds.calls['exchangerate'] == 2  # not retried before FX_RATES_RETRY
+
+    feeds.now += harem_api_service.FX_RATES_MAX_STALE
+    prices = service.get_all_prices()
+    assert not prices.get('fallback') and 'USD' not in _names(prices)
+
+
+def test_harem_outage_serves_stale_then_fallback(feeds):
+    service = _service()
+    live = service.get_all_prices()
+    feeds.down.add('harem')
+
+    feeds.now += harem_api_service.SNAPSHOT_TTL
+    assert service.get_all_prices()['version'] == live['version']
+    assert service.snapshot_age() == harem_api_service.SNAPSHOT_TTL
+
+    feeds.now += harem_api_service.HAREM_MAX_STALE
+    assert service.get_all_prices().get('fallback') and service.snapshot_age() is None
+
+    feeds.down.clear()
+    feeds.now += harem_api_service.SNAPSHOT_TTL
+    assert service.get_all_prices()['version'] > live['version']
+
+
+def test_background_fx_refresh(feeds):
+    service = HaremAPIService()
+    service.get_all_prices()
+    feeds.now += harem_api_service.FX_RATES_TTL
+    prices = service.get_all_prices()  # served with the held rates while the refresh runs
+    assert 'USD' in _names(prices)
+    with service.fx._pending:
+        assert feeds.calls['exchangerate'] == 2
+
+
+def test_cold_fx_is_loaded_off_the_read_path(feeds, monkeypatch):
+    released = threading.Event()
+    fetch = feeds.fetch
+
+    def slow_fetch(source, url, **kwargs):
+        if source == 'exchangerate':
+            released.wait(5)
+        return fetch(source, url, **kwargs)
+
+    monkeypatch.setattr(harem_api_service, 'fetch', slow_fetch)
+    service = HaremAPIService()
+    # No rates held yet: Harem prices are served without waiting on the FX feed
+    first = service.get_all_prices()
+    assert not first.get('fallback') and 'USD' not in _names(first)
+
+    released.set()
+    with service.fx._pending:
+        pass
+    prices = service.get_all_prices()
+    assert 'USD' in _names(prices) and prices['version'] > first['version']
@@ -0,0 +1,124 @@
+import asyncio
+import math
+import random
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from fake_mongo import FakeDatabase
+from price_history import PriceHistoryRepository
+from price_stats import MARKET_TZ, InstrumentStats, PriceStatsTracker, RollingWindow
+
+WINDOW = 60.0
+
+
+def _brute_force(ticks, now, seconds):
+    """Min, max, volatility and sample count over the ticks strictly inside (now - seconds, now]"""
+    inside = [(ts, price) for ts, price in ticks if ts > now - seconds]
+    returns = [
+        math.log(price / previous) ** 2
+        for (_, previous), (ts, price) in zip(ticks, ticks[1:])
+        if ts > now - seconds
+    ]
+    return min(p for _, p in inside), max(p for _, p in inside), math.sqrt(sum(returns)), len(returns)
+
+
+def _ticks(n: int, seed: int):
+    rng = random.Random(seed)
+    ts, price, ticks = 0.0, 100.0, []
+    for _ in range(n):
+        # Steps that land exactly on the window edge exercise the eviction boundary
+        ts += rng.choice([0.5, 1.0, 5.0, 15.0, WINDOW, 2 * WINDOW])
+        price = round(price * math.exp(rng.gauss(0, 0.01)), 2)
+        ticks.append((ts, price))
+    return ticks
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_window_matches_brute_force(seed):
+    ticks = _ticks(500, seed)
+    window = RollingWindow(WINDOW)
+    ema = None
+    for i, (ts, price) in enumerate(ticks):
+        previous = ticks[i - 1] if i else None
+        log_return = math.log(price / previous[1]) if previous else None
+        dt = ts - previous[0] if previous else 0.0
+        window.push(ts, price, log_return, dt)
+
+        ema = price if ema is None else ema + (1 - math.exp(-dt / WINDOW)) * (price - ema)
+        low, high, volatility, samples = _brute_force(ticks[:i + 1], ts, WINDOW)
+        assert (window.min, window.max, window.samples) == (low, high, samples)
+        assert window.volatility == pytest.approx(volatility, abs=1e-8)
+        assert window.ema == pytest.approx(ema)
+
+
+def test_tick_at_window_edge_is_evicted():
+    window = RollingWindow(WINDOW)
+    window.push(0.0, 90.0, None, 0.0)
+    window.push(1.0, 100.0, math.log(100 / 90), 1.0)
+    window.push(WINDOW, 95.0, math.log(95 / 100), WINDOW - 1)
+    assert (window.min, window.max, window.samples) == (95.0, 100.0, 2)
+    window.push(WINDOW + 1.0, 96.0, math.log(96 / 95), 1.0)
+    assert (window.min, window.max, window.samples) == (95.0, 96.0, 2)
+
+
+def test_day_open_rolls_over_at_istanbul_midnight():
+    midnight = datetime(2025, 12, 2, tzinfo=MARKET_TZ).timestamp()  # 21:00 UTC the day before
+    stats = InstrumentStats([WINDOW])
+    stats.push(midnight - 3600, 100.0)
+    stats.push(midnight - 1, 110.0)
+    assert (stats.open, stats.change) == (100.0, 10.0)
+
+    stats.push(midnight, 121.0)
+    assert (stats.open, stats.change) == (121.0, 0.0)
+    stats.push(midnight + 30, 127.05)
+    assert stats.change == 5.0
+    # The rolling windows are not reset by the new day
+    assert (stats.windows[0].min, stats.windows[0].max) == (110.0, 127.05)
+
+
+def test_day_open_seeded_from_history():
+    db = FakeDatabase()
+    history = PriceHistoryRepository(db.price_history, record_interval=0)
+    midnight = datetime(2025, 12, 2, tzinfo=MARKET_TZ).astimezone(timezone.utc).replace(tzinfo=None)
+    now = (datetime(2025, 12, 2, 14, 0, tzinfo=MARKET_TZ)).timestamp()
+
+    def prices(usd, eur):
+        return {'currency': [{'name': 'USD', 'buy': usd, 'sell': usd}, {'name': 'EUR', 'buy': eur, 'sell': eur}]}
+
+    async def run():
+        await history.record_snapshot(prices(41.0, 48.0), midnight.replace(hour=20))  # yesterday
+        await history.record_snapshot(prices(42.0, 49.0), midnight.replace(hour=21, minute=5))
+        await history.record_snapshot(prices(42.5, 49.5), midnight.replace(hour=21, minute=30))
+
+        # A restart at 14:00 local: the first refresh keeps today's open instead of anchoring a new one
+        tracker = PriceStatsTracker([WINDOW])
+        assert await tracker.seed_day_open(history, now) == 2
+        rows = [{'name': 'USD', 'sell': 43.05}]
+        tracker.apply_day_change('currency', rows, now)
+        assert rows[0]['change'] == 2.5
+        assert [row['name'] for row in tracker.snapshot()['currency']] == ['USD']
+
+        # Opens already anchored today are kept
+        assert await tracker.seed_day_open(history, now) == 0
+
+    asyncio.run(run())
+
+
+def test_snapshot_while_a_background_refresh_observes():
+    tracker = PriceStatsTracker([WINDOW])
+    done = threading.Event()
+
+    def refresh():
+        # Like the exchangerate source refreshing off the loop, adding instruments as it goes
+        for i in range(20000):
+            tracker.apply_day_change('currency', [{'name': f'FX{i % 2000}', 'sell': 40.0 + i % 7}], float(i))
+        done.set()
+
+    thread = threading.Thread(target=refresh)
+    thread.start()
+    while not done.is_set():
+        tracker.snapshot()
+    thread.join()
+    assert len(tracker.snapshot()['currency']) == 2000
@@ -0,0 +1,96 @@
+import asyncio
+import pstats
+
+from fastapi.testclient import TestClient
+
+import profiling
+from profiling import ProfileStore, ProfilingMiddleware
+
+TOKEN = 'secret'
+
+
+async def _app(scope, receive, send):
+    await asyncio.sleep(0.02)
+    sum(i * i for i in range(1000))
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'{}'})
+
+
+def _scope(path='/api/prices', headers=()):
+    return {'type': 'http', 'method': 'GET', 'path': path, 'headers': list(headers)}
+
+
+async def _call(app, scope):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, None, send)
+    return dict(messages[0]['headers'])
+
+
+def test_x_profile_requires_the_admin_token():
+    store = ProfileStore()
+    app = ProfilingMiddleware(_app, store, admin_token=TOKEN)
+
+    anonymous = asyncio.run(_call(app, _scope(headers=[(b'x-profile', b'1')])))
+    wrong = asyncio.run(_call(app, _scope(headers=[(b'x-profile', b'1'), (b'x-admin-token', b'guess')])))
+    assert b'x-profile-id' not in anonymous and b'x-profile-id' not in wrong
+    assert store.list() == []
+
+    admin = asyncio.run(_call(app, _scope(headers=[(b'x-profile', b'1'), (b'x-admin-token', TOKEN.encode())])))
+    [summary] = store.list()
+    assert admin[b'x-profile-id'] == str(summary['id']).encode()
+    assert (summary['method'], summary['path'], summary['status']) == ('GET', '/api/prices', 200)
+    assert summary['wallMs'] >= summary['cpuMs'] >= 0
+
+
+def test_without_admin_token_x_profile_is_ignored():
+    store = ProfileStore()
+    app = ProfilingMiddleware(_app, store)
+    asyncio.run(_call(app, _scope(headers=[(b'x-profile', b'1'), (b'x-admin-token', b'')])))
+    assert store.list() == []
+
+
+def test_one_profile_at_a_time():
+    store = ProfileStore()
+    app = ProfilingMiddleware(_app, store, sample_rate=1.0)
+
+    async def run():
+        return await asyncio.gather(*(_call(app, _scope()) for _ in range(3)))
+
+    headers = asyncio.run(run())
+    # cProfile hooks the whole thread, so overlapping requests run unprofiled
+    assert sum(b'x-profile-id' in h for h in headers) == 1
+    assert len(store.list()) == 1
+
+    asyncio.run(_call(app, _scope()))
+    assert len(store.list()) == 2
+
+
+def test_admin_profile_endpoints(server, monkeypatch, tmp_path):
+    monkeypatch.setattr(server, 'ADMIN_TOKEN', TOKEN)
+    monkeypatch.setattr(profiling, 'profile_store', ProfileStore())
+    asyncio.run(_call(ProfilingMiddleware(_app, profiling.profile_store, sample_rate=1.0), _scope('/api/portfolio')))
+    client = TestClient(server.app)
+    admin = {'X-Admin-Token': TOKEN}
+
+    assert client.get('/api/admin/profiles').status_code == 403
+    assert client.get('/api/admin/profiles', headers={'X-Admin-Token': 'guess'}).status_code == 403
+
+    [summary] = client.get('/api/admin/profiles', headers=admin).json()
+    assert summary['path'] == '/api/portfolio'
+    assert set(summary) >= {'id', 'startedAt', 'wallMs', 'cpuMs', 'awaitMs'}
+
+    raw = client.get(f"/api/admin/profiles/{summary['id']}", headers=admin)
+    assert raw.status_code == 200
+    assert raw.headers['content-disposition'] == f'attachment; filename="profile-{summary["id"]}.pstats"'
+    (tmp_path / 'profile.pstats').write_bytes(raw.content)
+    assert pstats.Stats(str(tmp_path / 'profile.pstats')).total_calls > 0
+
+    text = client.get(f"/api/admin/profiles/{summary['id']}", params={'format': 'text'}, headers=admin)
+    assert text.headers['content-type'].startswith('text/plain')
+    assert 'function calls' in text.text and 'cumulative' in text.text
+
+    assert client.get('/api/admin/profiles/999', headers=admin).status_code == 404
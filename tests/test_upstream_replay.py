@@ -0,0 +1,50 @@
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import upstream
+from fake_upstream import load_payload
+from price_sources import CachedSource
+from upstream_archive import UpstreamRecorder
+
+SESSION_START = datetime(2025, 12, 1, 7, 0)
+SESSION_MINUTES = 30
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """Half an hour of one-minute Harem responses"""
+    harem = load_payload('harem_regular_session.json')
+    path = str(tmp_path / 'session.jsonl.gz')
+    recorder = UpstreamRecorder(path)
+    for minute in range(SESSION_MINUTES):
+        t = (SESSION_START + timedelta(minutes=minute)).timestamp()
+        recorder.record('harem', 'replay://harem', 200, json.dumps({'success': True, 'data': harem['data']}, ensure_ascii=False), t)
+    recorder.close()
+    yield path
+    upstream.configure('live')
+
+
+def test_replay_follows_recorded_speed(archive):
+    replayer = upstream.configure('replay', archive, speed=1e9)
+    response = upstream.fetch('harem', 'replay://harem')
+    assert response.status_code == 200 and response.json()['success']
+    # Played back far faster than recorded, the virtual clock is already at the end of the session
+    assert response.recorded_at > replayer.start
+
+
+def test_cached_source_refreshes_during_timed_replay(archive):
+    # Ten recorded minutes per wall second
+    replayer = upstream.configure('replay', archive, speed=600)
+    source = CachedSource('harem', lambda: upstream.fetch('harem', 'replay://harem').recorded_at,
+                          ttl=0.1, max_stale=60, retry_after=0.1)
+
+    first = source.get()
+    assert first == replayer.start and source.version == 1
+    time.sleep(0.25)
+    # The replay clock moves with wall time, not only when a response is served
+    assert upstream.clock() >= replayer.start + 150
+    second = source.get()
+    assert source.version == 2 and second >= first + 120